@@ -9,6 +9,8 @@ from typing import List, Optional
 from app.database.base import get_db
 from app.models.database import Aggregation, AggregationItem, STE
 from app.models.schemas import MessageResponse, AggregationDetailResponse, STEResponse, AggregationItemResponse
+from app.services.response_cache import response_cache
+from app.utils.pagination import total_count_cache
 
 router = APIRouter(prefix="/aggregations", tags=["Редактирование агрегаций"])
 
@@ -74,6 +76,7 @@ async def add_ste_to_aggregation(
     aggregation.status = "manual"
     
     await db.commit()
+    response_cache.invalidate("aggregation", aggregation_id)
     
     return MessageResponse(message=f"СТЕ {ste_id} успешно добавлена в агрегацию {aggregation_id}")
 
@@ -119,6 +122,7 @@ async def remove_ste_from_aggregation(
     aggregation.status = "manual"
     
     await db.commit()
+    response_cache.invalidate("aggregation", aggregation_id)
     
     return MessageResponse(message=f"СТЕ успешно удалена из агрегации {aggregation_id}")
 
@@ -164,6 +168,7 @@ async def change_item_order(
     aggregation.status = "manual"
     
     await db.commit()
+    response_cache.invalidate("aggregation", aggregation_id)
     
     return MessageResponse(message=f"Порядок СТЕ успешно изменен")
 
@@ -191,6 +196,8 @@ async def save_aggregation(
     aggregation.is_saved = True
     
     await db.commit()
+    total_count_cache.invalidate("aggregations")
+    response_cache.invalidate("aggregation", aggregation_id)
     
     return MessageResponse(message=f"Агрегация {aggregation_id} успешно сохранена")
 
@@ -219,6 +226,9 @@ async def delete_aggregation(
     stmt = delete(Aggregation).where(Aggregation.id == aggregation_id)
     await db.execute(stmt)
     await db.commit()
+    total_count_cache.invalidate("aggregations")
+    response_cache.invalidate("aggregation", aggregation_id)
+    response_cache.invalidate("ratings", aggregation_id)
     
     return MessageResponse(message=f"Агрегация {aggregation_id} успешно удалена")
 
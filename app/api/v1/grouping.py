@@ -1,33 +1,152 @@
 """
 API endpoints для группировки СТЕ
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, cast, String, tuple_
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from app.database.base import get_db
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Union
+from collections import defaultdict
+from contextlib import aclosing
+from app.database.base import get_db, AsyncSessionLocal
 from app.models.database import Aggregation, AggregationItem, STE, AggregationRating
 from app.models.schemas import (
     GroupingRequest, GroupingResponse, AggregationResponse, AggregationDetailResponse,
-    RatingRequest, MessageResponse, AggregationCreate
+    AggregationSummaryResponse, RatingRequest, MessageResponse, AggregationCreate, GroupingJobResponse
 )
 from app.services.grouping_service import GroupingService
+from app.services.grouping_jobs import GroupingJobManager, GroupingJobFinishedError, get_grouping_job_manager
+from app.services.model_registry import EmbeddingModelRegistry, get_model_registry
+from app.services.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.services.response_cache import ResponseCache, get_response_cache
 from app.config import settings
-from app.models.schemas import STEResponse, AggregationItemResponse
+from app.utils.serialization import json_response, dumps, aggregation_to_dict, AGGREGATION_FIELDS
+from app.utils.pagination import TotalMode, TotalCountCache, get_total_count_cache, encode_cursor, decode_cursor
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/grouping", tags=["Группировка"])
 
 
+def get_grouping_service(
+    model_registry: EmbeddingModelRegistry = Depends(get_model_registry),
+    embedding_cache: EmbeddingCache = Depends(get_embedding_cache),
+    job_manager: GroupingJobManager = Depends(get_grouping_job_manager)
+) -> GroupingService:
+    """
+    Получить сервис группировки с моделью и кэшем embeddings процесса.
+    Вычисления идут в пуле потоков фоновых задач, чтобы не блокировать event loop.
+    """
+    return GroupingService(
+        model_registry=model_registry,
+        embedding_cache=embedding_cache,
+        executor=job_manager.executor
+    )
+
+
+# Форматы потоковой выдачи группировки: NDJSON (запись на строку) или Server-Sent Events
+GroupingStreamFormat = Literal["ndjson", "sse"]
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def format_stream_record(record_type: str, payload: Dict[str, Any], stream_format: GroupingStreamFormat) -> bytes:
+    """
+    Запись потока группировки.
+    
+    Args:
+        record_type: Тип записи: aggregation, summary или error
+        payload: Содержимое записи
+        stream_format: Формат потока
+    
+    Returns:
+        Строка NDJSON ({"type": ..., ...}) или событие SSE (event: тип, data: содержимое)
+    """
+    if stream_format == "sse":
+        return b"event: " + record_type.encode("ascii") + b"\ndata: " + dumps(payload) + b"\n\n"
+    return dumps({"type": record_type, **payload}) + b"\n"
+
+
+async def stream_grouping(
+    request: GroupingRequest,
+    grouping_service: GroupingService,
+    stream_format: GroupingStreamFormat
+) -> AsyncIterator[bytes]:
+    """
+    Группирует СТЕ и отдает каждую агрегацию, как только ее категория сгруппирована и сохранена,
+    затем итоговую запись summary (или error, если группировка прервалась).
+    
+    Поток живет дольше обработчика запроса, поэтому работает в собственной сессии БД.
+    
+    Args:
+        request: Запрос на группировку
+        grouping_service: Сервис группировки
+        stream_format: Формат потока
+    
+    Yields:
+        Записи потока
+    """
+    total_groups = 0
+    total_items = 0
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            category_results = grouping_service.iter_category_groups(
+                session=db,
+                category_id=request.category_id,
+                ste_ids=request.ste_ids,
+                similarity_threshold=settings.SIMILARITY_THRESHOLD,
+                min_group_size=settings.MIN_GROUP_SIZE,
+                max_group_size=settings.MAX_GROUP_SIZE,
+                merge_mode=request.merge_mode,
+                similarity_engine=request.similarity_engine
+            )
+            # aclosing: при отключении клиента генератор закрывается сразу (и останавливает пул процессов)
+            async with aclosing(category_results):
+                async for _, category_groups in category_results:
+                    for group_data in category_groups:
+                        aggregation = await grouping_service.materialize_group(db, group_data, request.force_regenerate)
+                        payload = aggregation_to_dict(aggregation)
+                        # Отданная агрегация больше не нужна сессии - не накапливаем ее в identity map
+                        db.expunge(aggregation)
+                        total_groups += 1
+                        total_items += payload["items_count"]
+                        yield format_stream_record("aggregation", payload, stream_format)
+        except Exception as e:
+            logger.exception("Ошибка потоковой группировки")
+            yield format_stream_record("error", {
+                "detail": str(e),
+                "total_groups": total_groups,
+                "total_items": total_items,
+            }, stream_format)
+            return
+    
+    yield format_stream_record("summary", {
+        "total_groups": total_groups,
+        "total_items": total_items,
+    }, stream_format)
+
+
 @router.post(
     "/",
     response_model=GroupingResponse,
     summary="Группировка СТЕ",
-    description="Осуществляет группировку СТЕ по значимым характеристикам"
+    description="Осуществляет группировку СТЕ по значимым характеристикам. "
+                "С stream=ndjson|sse агрегации отдаются потоком по мере обработки категорий, "
+                "последняя запись - summary с total_groups и total_items"
 )
 async def group_stes(
     request: GroupingRequest,
-    db: AsyncSession = Depends(get_db)
+    stream: Optional[GroupingStreamFormat] = Query(
+        None, description="Потоковая выдача: ndjson - запись на строку, sse - Server-Sent Events"
+    ),
+    db: AsyncSession = Depends(get_db),
+    grouping_service: GroupingService = Depends(get_grouping_service)
 ):
     """
     Группирует СТЕ по значимым характеристикам.
@@ -35,8 +154,14 @@ async def group_stes(
     Если указаны ste_ids - группирует только указанные СТЕ.
     Если указан category_id - группирует СТЕ из этой категории.
     Если указаны characteristics - использует эти характеристики для группировки.
+    Если указан stream - возвращает поток записей вместо GroupingResponse.
     """
-    grouping_service = GroupingService()
+    if stream:
+        return StreamingResponse(
+            stream_grouping(request, grouping_service, stream),
+            media_type=STREAM_MEDIA_TYPES[stream],
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
     
     # Получаем группы
     groups = await grouping_service.group_stes(
@@ -45,7 +170,9 @@ async def group_stes(
         ste_ids=request.ste_ids,
         similarity_threshold=settings.SIMILARITY_THRESHOLD,
         min_group_size=settings.MIN_GROUP_SIZE,
-        max_group_size=settings.MAX_GROUP_SIZE
+        max_group_size=settings.MAX_GROUP_SIZE,
+        merge_mode=request.merge_mode,
+        similarity_engine=request.similarity_engine
     )
     
     # Создаем агрегации из групп
@@ -53,101 +180,210 @@ async def group_stes(
     total_items = 0
     
     for group_data in groups:
-        # Если не требуется перегенерация, проверяем существующие агрегации
-        if not request.force_regenerate:
-            # Ищем существующую агрегацию
-            stmt = (
-                select(Aggregation)
-                .where(Aggregation.category_id == group_data["category_id"])
-                .where(Aggregation.grouping_characteristics == group_data["grouping_characteristics"])
-                .where(Aggregation.is_saved == False)
-                .options(selectinload(Aggregation.items).selectinload(AggregationItem.ste))
-                .limit(1)
+        aggregation = await grouping_service.materialize_group(db, group_data, request.force_regenerate)
+        aggregations.append(aggregation)
+        total_items += len(aggregation.items)
+    
+    # Формируем ответ: словари строятся один раз и не проходят повторную валидацию response_model
+    agg_responses = [aggregation_to_dict(agg) for agg in aggregations]
+    
+    return json_response({
+        "aggregations": agg_responses,
+        "total_groups": len(agg_responses),
+        "total_items": total_items,
+    })
+
+
+@router.post(
+    "/jobs",
+    response_model=GroupingJobResponse,
+    status_code=202,
+    summary="Фоновая группировка СТЕ",
+    description="Ставит группировку в очередь и сразу возвращает ID задачи. "
+                "Результат - агрегации из aggregation_ids, доступные через /grouping/aggregations/{id}"
+)
+async def start_grouping_job(
+    request: GroupingRequest,
+    job_manager: GroupingJobManager = Depends(get_grouping_job_manager)
+):
+    """
+    Запускает группировку в фоне.
+    
+    Прогресс по категориям и оценка оставшегося времени доступны через GET /grouping/jobs/{job_id}.
+    Одновременно выполняется не больше GROUPING_MAX_CONCURRENT_JOBS задач, остальные ждут в очереди.
+    """
+    job = job_manager.start(request)
+    return GroupingJobResponse(**job.to_dict())
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=GroupingJobResponse,
+    summary="Статус группировки",
+    description="Возвращает прогресс по категориям, оценку оставшегося времени и созданные агрегации"
+)
+async def get_grouping_job(
+    job_id: str,
+    job_manager: GroupingJobManager = Depends(get_grouping_job_manager)
+):
+    """
+    Получить состояние задачи группировки.
+    """
+    job = job_manager.get(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Задача группировки {job_id} не найдена")
+    
+    return GroupingJobResponse(**job.to_dict())
+
+
+@router.post(
+    "/jobs/{job_id}/cancel",
+    response_model=GroupingJobResponse,
+    summary="Отмена группировки",
+    description="Отменяет задачу в очереди или выполняющуюся; агрегации уже обработанных категорий остаются"
+)
+async def cancel_grouping_job(
+    job_id: str,
+    job_manager: GroupingJobManager = Depends(get_grouping_job_manager)
+):
+    """
+    Отменить задачу группировки.
+    
+    Выполняющаяся задача останавливается в течение обработки текущей категории:
+    статус становится cancelled, когда отмена завершена.
+    """
+    try:
+        job = job_manager.cancel(job_id)
+    except GroupingJobFinishedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Задача группировки {job_id} не найдена")
+    
+    return GroupingJobResponse(**job.to_dict())
+
+
+async def build_aggregation_summaries(
+    db: AsyncSession,
+    aggregations: List[Aggregation],
+    preview_size: int
+) -> List[Dict[str, Any]]:
+    """
+    Краткие ответы (AggregationSummaryResponse) для списка агрегаций: число СТЕ считается в SQL, из СТЕ читаются
+    только первые preview_size элементов каждой агрегации и только нужные колонки.
+    
+    Args:
+        db: Сессия БД
+        aggregations: Агрегации страницы (без загруженных items)
+        preview_size: Сколько первых СТЕ показать
+    
+    Returns:
+        Список словарей кратких ответов в порядке aggregations
+    """
+    ids = [agg.id for agg in aggregations]
+    if not ids:
+        return []
+    
+    counts_result = await db.execute(
+        select(AggregationItem.aggregation_id, func.count())
+        .where(AggregationItem.aggregation_id.in_(ids))
+        .group_by(AggregationItem.aggregation_id)
+    )
+    counts = dict(counts_result.all())
+    
+    previews = defaultdict(list)
+    if preview_size:
+        position = func.row_number().over(
+            partition_by=AggregationItem.aggregation_id,
+            order_by=(AggregationItem.order, AggregationItem.id)
+        ).label("position")
+        numbered = (
+            select(
+                AggregationItem.id, AggregationItem.aggregation_id, AggregationItem.ste_id,
+                AggregationItem.order, position
             )
-            result = await db.execute(stmt)
-            existing_agg = result.scalar_one_or_none()
-            
-            if existing_agg:
-                # Загружаем полные данные
-                stmt = (
-                    select(Aggregation)
-                    .where(Aggregation.id == existing_agg.id)
-                    .options(selectinload(Aggregation.items).selectinload(AggregationItem.ste))
-                )
-                result = await db.execute(stmt)
-                aggregation = result.scalar_one()
-                aggregations.append(aggregation)
-                total_items += len(aggregation.items)
-                continue
-        
-        # Создаем новую агрегацию
-        aggregation = await grouping_service.create_aggregation_from_group(
-            db, group_data, status="auto"
+            .where(AggregationItem.aggregation_id.in_(ids))
+            .subquery()
         )
-        
-        # Загружаем с items
-        stmt = (
-            select(Aggregation)
-            .where(Aggregation.id == aggregation.id)
-            .options(selectinload(Aggregation.items).selectinload(AggregationItem.ste))
+        preview_result = await db.execute(
+            select(
+                numbered.c.id, numbered.c.aggregation_id, numbered.c.ste_id, numbered.c.order,
+                STE.name, STE.manufacturer, STE.image_url
+            )
+            .join(STE, STE.id == numbered.c.ste_id)
+            .where(numbered.c.position <= preview_size)
+            .order_by(numbered.c.aggregation_id, numbered.c.position)
         )
-        result = await db.execute(stmt)
-        aggregation = result.scalar_one()
-        aggregations.append(aggregation)
-        total_items += len(aggregation.items)
+        for item_id, aggregation_id, ste_id, order, name, manufacturer, image_url in preview_result.all():
+            previews[aggregation_id].append({
+                "id": item_id,
+                "ste_id": ste_id,
+                "name": name,
+                "manufacturer": manufacturer,
+                "image_url": image_url,
+                "order": order,
+            })
     
-    # Формируем ответ
-    agg_responses = []
+    summaries = []
     for agg in aggregations:
-        items_response = []
-        for item in sorted(agg.items, key=lambda x: x.order):
-            items_response.append(AggregationItemResponse(
-                id=item.id,
-                ste=STEResponse.model_validate(item.ste),
-                order=item.order,
-                created_at=item.created_at
-            ))
-        
-        agg_responses.append(AggregationResponse(
-            id=agg.id,
-            name=agg.name,
-            category_id=agg.category_id,
-            grouping_characteristics=agg.grouping_characteristics,
-            status=agg.status,
-            rating=agg.rating,
-            is_saved=agg.is_saved,
-            created_at=agg.created_at,
-            updated_at=agg.updated_at,
-            items=items_response,
-            items_count=len(items_response)
-        ))
-    
-    return GroupingResponse(
-        aggregations=agg_responses,
-        total_groups=len(agg_responses),
-        total_items=total_items
-    )
+        summary = {field: getattr(agg, field) for field in AGGREGATION_FIELDS}
+        summary["items_count"] = counts.get(agg.id, 0)
+        summary["preview"] = previews[agg.id]
+        summaries.append(summary)
+    return summaries
 
 
 @router.get(
     "/aggregations",
-    response_model=List[AggregationResponse],
+    response_model=Union[List[AggregationResponse], List[AggregationSummaryResponse]],
     summary="Список агрегаций",
-    description="Возвращает список всех агрегаций"
+    description="Возвращает список всех агрегаций (view=summary - без полного состава, для списков)"
 )
 async def list_aggregations(
     category_id: Optional[str] = Query(None, description="Фильтр по категории"),
     saved_only: bool = Query(False, description="Только сохраненные"),
     limit: int = Query(100, ge=1, le=500, description="Лимит результатов"),
-    offset: int = Query(0, ge=0, description="Смещение для пагинации"),
-    db: AsyncSession = Depends(get_db)
+    offset: int = Query(0, ge=0, description="Смещение для пагинации (без cursor)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+    total_mode: TotalMode = Query(
+        "off",
+        description="Подсчет total (заголовок X-Total-Count): off, exact или estimated - до TOTAL_COUNT_LIMIT"
+    ),
+    view: Literal["full", "summary"] = Query(
+        "full",
+        description="full - все СТЕ агрегации целиком, summary - метаданные, число СТЕ и первые preview_size СТЕ"
+    ),
+    preview_size: int = Query(3, ge=0, le=50, description="Число СТЕ в preview (view=summary)"),
+    db: AsyncSession = Depends(get_db),
+    total_cache: TotalCountCache = Depends(get_total_count_cache)
 ):
     """
     Получить список агрегаций с возможностью фильтрации.
+    
+    Следующая страница запрашивается с cursor из заголовка X-Next-Cursor (его нет на последней
+    странице): страница выбирается по (created_at, id), а не смещением.
+    
+    В режиме view=summary СТЕ не загружаются целиком: полный состав агрегации
+    отдает GET /grouping/aggregations/{aggregation_id}.
     """
-    stmt = select(Aggregation).options(
-        selectinload(Aggregation.items).selectinload(AggregationItem.ste)
-    )
+    after = None
+    if cursor:
+        try:
+            values = decode_cursor(cursor)
+            if values[0] != "created" or len(values) != 3:
+                raise ValueError("Некорректный курсор")
+            after = (str(values[1]), int(values[2]))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
+        offset = 0
+    
+    # created_at сравнивается в том виде, в каком хранится в БД (строкой в SQLite),
+    # чтобы значение из курсора не теряло точность при обратном преобразовании
+    created_key = cast(Aggregation.created_at, String)
+    stmt = select(Aggregation, created_key.label("created_key"))
+    if view == "full":
+        stmt = stmt.options(selectinload(Aggregation.items).selectinload(AggregationItem.ste))
     
     if category_id:
         stmt = stmt.where(Aggregation.category_id == category_id)
@@ -155,51 +391,37 @@ async def list_aggregations(
     if saved_only:
         stmt = stmt.where(Aggregation.is_saved == True)
     
-    stmt = stmt.order_by(Aggregation.created_at.desc()).limit(limit).offset(offset)
+    total, total_exact = await total_cache.resolve(
+        db, "aggregations", (category_id or "", saved_only), stmt.with_only_columns(Aggregation.id), total_mode
+    )
+    headers = {}
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+        headers["X-Total-Exact"] = "true" if total_exact else "false"
+    
+    if after:
+        stmt = stmt.where(tuple_(created_key, Aggregation.id) < tuple_(after[0], after[1]))
+    stmt = stmt.order_by(created_key.desc(), Aggregation.id.desc()).limit(limit + 1).offset(offset)
     
     result = await db.execute(stmt)
-    aggregations = result.scalars().all()
+    rows = result.all()
+    if len(rows) > limit:
+        last_aggregation, last_created = rows[limit - 1]
+        headers["X-Next-Cursor"] = encode_cursor(["created", last_created, last_aggregation.id])
+    aggregations = [aggregation for aggregation, _ in rows[:limit]]
     
-    responses = []
-    for agg in aggregations:
-        items_response = []
-        for item in sorted(agg.items, key=lambda x: x.order):
-            items_response.append({
-                "id": item.id,
-                "ste": STEResponse.model_validate(item.ste),
-                "order": item.order,
-                "created_at": item.created_at
-            })
-        
-        responses.append(AggregationResponse(
-            id=agg.id,
-            name=agg.name,
-            category_id=agg.category_id,
-            grouping_characteristics=agg.grouping_characteristics,
-            status=agg.status,
-            rating=agg.rating,
-            is_saved=agg.is_saved,
-            created_at=agg.created_at,
-            updated_at=agg.updated_at,
-            items=items_response,
-            items_count=len(items_response)
-        ))
-    
-    return responses
+    if view == "summary":
+        return json_response(await build_aggregation_summaries(db, aggregations, preview_size), headers=headers)
+    
+    return json_response([aggregation_to_dict(agg) for agg in aggregations], headers=headers)
 
 
-@router.get(
-    "/aggregations/{aggregation_id}",
-    response_model=AggregationDetailResponse,
-    summary="Получить агрегацию",
-    description="Возвращает детальную информацию об агрегации"
-)
-async def get_aggregation(
-    aggregation_id: int,
-    db: AsyncSession = Depends(get_db)
-):
+async def build_aggregation_detail(db: AsyncSession, aggregation_id: int) -> Dict[str, Any]:
     """
-    Получить детальную информацию об агрегации.
+    Собирает ответ GET /grouping/aggregations/{aggregation_id} (AggregationDetailResponse) из БД.
+    
+    Raises:
+        HTTPException: 404, если агрегации нет
     """
     stmt = (
         select(Aggregation)
@@ -212,25 +434,27 @@ async def get_aggregation(
     if not aggregation:
         raise HTTPException(status_code=404, detail=f"Агрегация с ID {aggregation_id} не найдена")
     
-    items_response = []
-    for item in sorted(aggregation.items, key=lambda x: x.order):
-            items_response.append(AggregationItemResponse(
-                id=item.id,
-                ste=STEResponse.model_validate(item.ste),
-                order=item.order,
-                created_at=item.created_at
-            ))
-    
-    return AggregationDetailResponse(
-        id=aggregation.id,
-        name=aggregation.name,
-        category_id=aggregation.category_id,
-        grouping_characteristics=aggregation.grouping_characteristics,
-        status=aggregation.status,
-        rating=aggregation.rating,
-        is_saved=aggregation.is_saved,
-        created_at=aggregation.created_at,
-        updated_at=aggregation.updated_at,
-        items=items_response
-    )
+    return aggregation_to_dict(aggregation, with_items_count=False)
+
 
+@router.get(
+    "/aggregations/{aggregation_id}",
+    response_model=AggregationDetailResponse,
+    summary="Получить агрегацию",
+    description="Возвращает детальную информацию об агрегации",
+    responses={304: {"description": "Агрегация не изменилась (If-None-Match совпал с ETag)"}}
+)
+async def get_aggregation(
+    aggregation_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    """
+    Получить детальную информацию об агрегации.
+    
+    Ответ кэшируется и отдается с ETag; с If-None-Match возвращается 304.
+    """
+    return await cache.respond(
+        request, "aggregation", aggregation_id, lambda: build_aggregation_detail(db, aggregation_id)
+    )
@@ -1,13 +1,14 @@
 """
 API endpoints для оценки агрегаций
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 from app.database.base import get_db
 from app.models.database import Aggregation, AggregationRating
 from app.models.schemas import RatingRequest, MessageResponse
+from app.services.response_cache import ResponseCache, response_cache, get_response_cache
 
 router = APIRouter(prefix="/ratings", tags=["Оценки"])
 
@@ -55,22 +56,19 @@ async def rate_aggregation(
         aggregation.rating = round(float(avg_rating), 2)
     
     await db.commit()
+    # Средняя оценка входит и в ответ агрегации
+    response_cache.invalidate("ratings", aggregation_id)
+    response_cache.invalidate("aggregation", aggregation_id)
     
     return MessageResponse(message=f"Оценка {request.rating} успешно поставлена агрегации {aggregation_id}")
 
 
-@router.get(
-    "/aggregations/{aggregation_id}",
-    response_model=dict,
-    summary="Получить оценки агрегации",
-    description="Возвращает все оценки для агрегации"
-)
-async def get_aggregation_ratings(
-    aggregation_id: int,
-    db: AsyncSession = Depends(get_db)
-):
+async def build_aggregation_ratings(db: AsyncSession, aggregation_id: int) -> dict:
     """
-    Получить все оценки агрегации.
+    Собирает ответ GET /ratings/aggregations/{aggregation_id} из БД.
+    
+    Raises:
+        HTTPException: 404, если агрегации нет
     """
     # Проверяем существование агрегации
     stmt = select(Aggregation).where(Aggregation.id == aggregation_id)
@@ -105,3 +103,25 @@ async def get_aggregation_ratings(
         "ratings": ratings_list
     }
 
+
+@router.get(
+    "/aggregations/{aggregation_id}",
+    response_model=dict,
+    summary="Получить оценки агрегации",
+    description="Возвращает все оценки для агрегации",
+    responses={304: {"description": "Оценки не изменились (If-None-Match совпал с ETag)"}}
+)
+async def get_aggregation_ratings(
+    aggregation_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    """
+    Получить все оценки агрегации.
+    
+    Ответ кэшируется и отдается с ETag; с If-None-Match возвращается 304.
+    """
+    return await cache.respond(
+        request, "ratings", aggregation_id, lambda: build_aggregation_ratings(db, aggregation_id)
+    )
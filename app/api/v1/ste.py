@@ -1,19 +1,78 @@
 """
 API endpoints для работы со СТЕ
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, func
+from sqlalchemy import select, or_, table, column, literal_column, tuple_
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.database.base import get_db
+from app.database import search_index
+from app.config import settings
 from app.models.database import STE
-from app.models.schemas import STEResponse, SearchRequest, SearchResponse
-from app.parsers.excel_parser import parse_ste_file
+from app.models.schemas import STEResponse, SearchRequest, SearchResponse, ImportJobResponse
+from app.services.response_cache import ResponseCache, get_response_cache
+from app.services.import_jobs import ImportJobManager, ImportAlreadyRunningError, get_import_job_manager
+from app.utils.serialization import ste_to_dict
+from app.utils.pagination import (
+    TotalMode, TotalCountCache, get_total_count_cache, encode_cursor, decode_cursor, count_rows
+)
 from pathlib import Path
 
 router = APIRouter(prefix="/ste", tags=["СТЕ"])
 
+# Полнотекстовый индекс СТЕ (см. app/database/search_index.py)
+ste_fts = table("ste_fts", column("rowid"), column("rank"))
+
+
+def parse_search_cursor(cursor: Optional[str]) -> Optional[list]:
+    """
+    Разбирает курсор поиска: ["id", id] (порядок по id) или ["rank", rank, id] (по релевантности).
+    
+    Args:
+        cursor: Курсор из next_cursor
+    
+    Returns:
+        Значения курсора или None, если курсора нет
+    
+    Raises:
+        HTTPException: 400, если курсор поврежден
+    """
+    if not cursor:
+        return None
+    try:
+        values = decode_cursor(cursor)
+        if values[0] == "id" and len(values) == 2:
+            return ["id", int(values[1])]
+        if values[0] == "rank" and len(values) == 3:
+            return ["rank", float(values[1]), int(values[2])]
+    except (ValueError, TypeError):
+        pass
+    raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def build_search_page(rows: list, limit: int, total: Optional[int], total_exact: bool) -> SearchResponse:
+    """
+    Собирает страницу поиска из строк (СТЕ, ключ сортировки); строк запрашивается limit + 1,
+    лишняя означает, что есть следующая страница.
+    
+    Args:
+        rows: Пары (СТЕ, значения курсора)
+        limit: Размер страницы
+        total: Всего результатов
+        total_exact: Точное ли total
+    
+    Returns:
+        Ответ поиска
+    """
+    next_cursor = encode_cursor(rows[limit - 1][1]) if len(rows) > limit else None
+    return SearchResponse(
+        items=[STEResponse.model_validate(ste) for ste, _ in rows[:limit]],
+        total=total,
+        total_exact=total_exact,
+        next_cursor=next_cursor
+    )
+
 
 @router.get(
     "/",
@@ -25,8 +84,14 @@ async def search_ste(
     query: Optional[str] = Query(None, description="Поисковый запрос"),
     category_id: Optional[str] = Query(None, description="Фильтр по категории"),
     limit: int = Query(20, ge=1, le=100, description="Лимит результатов"),
-    offset: int = Query(0, ge=0, description="Смещение для пагинации"),
-    db: AsyncSession = Depends(get_db)
+    offset: int = Query(0, ge=0, description="Смещение для пагинации (без cursor)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor предыдущего ответа)"),
+    total_mode: TotalMode = Query(
+        "exact",
+        description="Подсчет total: exact - точно, off - не считать, estimated - до TOTAL_COUNT_LIMIT"
+    ),
+    db: AsyncSession = Depends(get_db),
+    total_cache: TotalCountCache = Depends(get_total_count_cache)
 ):
     """
     Поиск СТЕ по названию, ключевым словам и другим атрибутам.
@@ -36,7 +101,26 @@ async def search_ste(
     - Производителю
     - Модели
     - Категории
+    
+    Запрос ищется по полнотекстовому индексу: все слова обязательны, последнее - по префиксу,
+    регистр не учитывается; результаты упорядочены по релевантности.
+    
+    Для следующей страницы передается cursor из next_cursor: страница выбирается условием
+    по колонкам сортировки, поэтому глубокие страницы не медленнее первой. total точный
+    и считается один раз на запрос (кэшируется); его можно оценить (estimated) или отключить (off).
     """
+    after = parse_search_cursor(cursor)
+    if after:
+        offset = 0
+    match_query = search_index.build_match_query(query) if query else None
+    use_index = bool(match_query) and search_index.search_index_available
+    count_key = (query or "", category_id or "")
+    
+    if use_index and not category_id:
+        return await search_ste_fulltext(
+            db, total_cache, match_query, count_key, limit, offset, after, total_mode
+        )
+    
     stmt = select(STE)
     
     # Фильтр по категории
@@ -44,8 +128,11 @@ async def search_ste(
         stmt = stmt.where(STE.category_id == category_id)
     
     # Поиск по запросу
-    if query:
-        query_lower = query.lower()
+    if use_index:
+        stmt = stmt.join(ste_fts, ste_fts.c.rowid == STE.id).where(
+            literal_column("ste_fts").op("MATCH")(match_query)
+        )
+    elif query:
         search_filter = or_(
             STE.name.ilike(f"%{query}%"),
             STE.manufacturer.ilike(f"%{query}%"),
@@ -55,102 +142,188 @@ async def search_ste(
         stmt = stmt.where(search_filter)
     
     # Получаем общее количество
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    total_result = await db.execute(count_stmt)
-    total = total_result.scalar() or 0
+    total, total_exact = await total_cache.resolve(
+        db, "ste", count_key, stmt.with_only_columns(STE.id), total_mode
+    )
+    
+    # Страница: после курсора по колонкам сортировки (или со смещением)
+    kind = "rank" if use_index else "id"
+    if after and after[0] != kind:
+        raise HTTPException(status_code=400, detail="Курсор не соответствует запросу")
+    if use_index:
+        stmt = stmt.add_columns(ste_fts.c.rank).order_by(ste_fts.c.rank, STE.id)
+        if after:
+            stmt = stmt.where(tuple_(ste_fts.c.rank, STE.id) > tuple_(after[1], after[2]))
+    else:
+        stmt = stmt.order_by(STE.id)
+        if after:
+            stmt = stmt.where(STE.id > after[1])
+    
+    result = await db.execute(stmt.limit(limit + 1).offset(offset))
+    if use_index:
+        rows = [(ste, ["rank", rank, ste.id]) for ste, rank in result.all()]
+    else:
+        rows = [(ste, ["id", ste.id]) for ste in result.scalars().all()]
+    
+    return build_search_page(rows, limit, total, total_exact)
+
+
+async def search_ste_fulltext(
+    db: AsyncSession,
+    total_cache: TotalCountCache,
+    match_query: str,
+    count_key: tuple,
+    limit: int,
+    offset: int,
+    after: Optional[list],
+    total_mode: TotalMode
+) -> SearchResponse:
+    """
+    Поиск без фильтра категории целиком по индексу ste_fts: количество и страница
+    идентификаторов считаются внутри FTS5, из таблицы ste читается только страница.
+    По релевантности сортируется, если совпадений не больше settings.SEARCH_RANK_MAX_MATCHES
+    (решение принимается на первой странице и передается в курсоре).
+    
+    Args:
+        db: Сессия БД
+        total_cache: Кэш total
+        match_query: Выражение FTS5 MATCH
+        count_key: Ключ запроса в кэше total
+        limit: Лимит результатов
+        offset: Смещение
+        after: Разобранный курсор или None
+        total_mode: Режим подсчета total
+    
+    Returns:
+        Ответ поиска
+    """
+    match = literal_column("ste_fts").op("MATCH")(match_query)
+    matches = select(ste_fts.c.rowid).where(match)
     
-    # Применяем лимит и смещение
-    stmt = stmt.order_by(STE.id).limit(limit).offset(offset)
+    # total точный (кэшируется на запрос); точный count(*) по очень общему префиксу ("для*")
+    # обходит все строки индекса - клиент, которому хватит оценки, передает total_mode=estimated
+    total, total_exact = await total_cache.resolve(db, "ste", count_key, matches, total_mode)
+    if total == 0:
+        return SearchResponse(items=[], total=0)
     
+    # bm25 считается для каждого совпадения, поэтому для очень общих запросов
+    # страница берется в порядке индекса - это дешево при любом числе совпадений
+    if after:
+        ranked = after[0] == "rank"
+    elif total is not None and (total_exact or total > settings.SEARCH_RANK_MAX_MATCHES):
+        ranked = total <= settings.SEARCH_RANK_MAX_MATCHES
+    else:
+        matches_count = await count_rows(db, matches, limit=settings.SEARCH_RANK_MAX_MATCHES + 1)
+        ranked = matches_count <= settings.SEARCH_RANK_MAX_MATCHES
+    
+    if ranked:
+        ids_stmt = select(ste_fts.c.rowid, ste_fts.c.rank).where(match).order_by(
+            ste_fts.c.rank, ste_fts.c.rowid
+        )
+        if after:
+            ids_stmt = ids_stmt.where(tuple_(ste_fts.c.rank, ste_fts.c.rowid) > tuple_(after[1], after[2]))
+    else:
+        ids_stmt = select(ste_fts.c.rowid, literal_column("NULL")).where(match).order_by(ste_fts.c.rowid)
+        if after:
+            ids_stmt = ids_stmt.where(ste_fts.c.rowid > after[1])
+    ids_result = await db.execute(ids_stmt.limit(limit + 1).offset(offset))
+    ranks = dict(ids_result.all())
+    
+    result = await db.execute(select(STE).where(STE.id.in_(list(ranks))))
+    stes_by_id = {ste.id: ste for ste in result.scalars().all()}
+    
+    rows = [
+        (stes_by_id[ste_id], ["rank", rank, ste_id] if ranked else ["id", ste_id])
+        for ste_id, rank in ranks.items() if ste_id in stes_by_id
+    ]
+    return build_search_page(rows, limit, total, total_exact)
+
+
+async def build_ste_response(db: AsyncSession, ste_id: int) -> Dict[str, Any]:
+    """
+    Собирает ответ GET /ste/{ste_id} (STEResponse) из БД.
+    
+    Raises:
+        HTTPException: 404, если СТЕ нет
+    """
+    stmt = select(STE).where(STE.id == ste_id)
     result = await db.execute(stmt)
-    stes = result.scalars().all()
+    ste = result.scalar_one_or_none()
     
-    return SearchResponse(
-        items=[STEResponse.model_validate(ste) for ste in stes],
-        total=total
-    )
+    if not ste:
+        raise HTTPException(status_code=404, detail=f"СТЕ с ID {ste_id} не найдена")
+    
+    return ste_to_dict(ste)
 
 
 @router.get(
     "/{ste_id}",
     response_model=STEResponse,
     summary="Получить СТЕ по ID",
-    description="Возвращает информацию о конкретной СТЕ по её ID"
+    description="Возвращает информацию о конкретной СТЕ по её ID",
+    responses={304: {"description": "СТЕ не изменилась (If-None-Match совпал с ETag)"}}
 )
 async def get_ste(
     ste_id: int,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
     """
     Получить информацию о СТЕ по ID.
-    """
-    stmt = select(STE).where(STE.id == ste_id)
-    result = await db.execute(stmt)
-    ste = result.scalar_one_or_none()
     
-    if not ste:
-        raise HTTPException(status_code=404, detail=f"СТЕ с ID {ste_id} не найдена")
-    
-    return STEResponse.model_validate(ste)
+    Ответ кэшируется и отдается с ETag; с If-None-Match возвращается 304.
+    """
+    return await cache.respond(request, "ste", ste_id, lambda: build_ste_response(db, ste_id))
 
 
 @router.post(
     "/import",
-    response_model=dict,
+    response_model=ImportJobResponse,
+    status_code=202,
     summary="Импорт СТЕ из Excel",
-    description="Импортирует СТЕ из Excel файла в базу данных"
+    description="Запускает фоновый импорт СТЕ из Excel файла и сразу возвращает ID задачи"
 )
 async def import_ste_from_excel(
     file_path: Optional[str] = Query(None, description="Путь к Excel файлу (если не указан, используется файл по умолчанию)"),
-    db: AsyncSession = Depends(get_db)
+    job_manager: ImportJobManager = Depends(get_import_job_manager)
 ):
     """
-    Импортирует СТЕ из Excel файла.
+    Запускает импорт СТЕ из Excel файла в фоне.
     
     Если путь не указан, используется файл по умолчанию из папки data.
+    Прогресс доступен через GET /ste/import/{job_id}. Одновременно выполняется один импорт.
     """
     if not file_path:
         file_path = str(Path(__file__).parent.parent.parent.parent / "data" / "Исходные данные_Хакатон_Казань_20251128_1800.xlsx")
     
+    if not Path(file_path).exists():
+        raise HTTPException(status_code=400, detail=f"Файл не найден: {file_path}")
+    
     try:
-        # Парсим файл
-        ste_list = parse_ste_file(file_path)
-        
-        imported = 0
-        updated = 0
-        errors = []
-        
-        for ste_data in ste_list:
-            try:
-                # Проверяем, существует ли СТЕ
-                stmt = select(STE).where(STE.ste_id == ste_data["ste_id"])
-                result = await db.execute(stmt)
-                existing_ste = result.scalar_one_or_none()
-                
-                if existing_ste:
-                    # Обновляем существующую
-                    for key, value in ste_data.items():
-                        if hasattr(existing_ste, key):
-                            setattr(existing_ste, key, value)
-                    updated += 1
-                else:
-                    # Создаем новую
-                    new_ste = STE(**ste_data)
-                    db.add(new_ste)
-                    imported += 1
-            except Exception as e:
-                errors.append(f"Ошибка при импорте СТЕ {ste_data.get('ste_id', 'unknown')}: {str(e)}")
-        
-        await db.commit()
-        
-        return {
-            "message": "Импорт завершен",
-            "imported": imported,
-            "updated": updated,
-            "errors": errors[:10] if errors else []  # Показываем только первые 10 ошибок
-        }
-    
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"Ошибка при импорте: {str(e)}")
+        job = job_manager.start(file_path)
+    except ImportAlreadyRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return ImportJobResponse(**job.to_dict())
 
+
+@router.get(
+    "/import/{job_id}",
+    response_model=ImportJobResponse,
+    summary="Статус импорта",
+    description="Возвращает этап, число обработанных строк, скорость и ошибки задачи импорта"
+)
+async def get_import_job(
+    job_id: str,
+    job_manager: ImportJobManager = Depends(get_import_job_manager)
+):
+    """
+    Получить состояние задачи импорта.
+    """
+    job = job_manager.get(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Задача импорта {job_id} не найдена")
+    
+    return ImportJobResponse(**job.to_dict())
@@ -2,7 +2,7 @@
 Конфигурация приложения
 """
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -21,10 +21,74 @@ class Settings(BaseSettings):
     MIN_GROUP_SIZE: int = 2  # Минимальный размер группы
     MAX_GROUP_SIZE: int = 50  # Максимальный размер группы
     SIMILARITY_THRESHOLD: float = 0.7  # Порог схожести для группировки
+    MERGE_MODE: Literal["greedy", "ann"] = "greedy"  # Объединение групп: greedy - попарный жадный проход, ann - kNN-граф
+    SIMILARITY_ENGINE: Literal["transformer", "tfidf"] = "transformer"  # Схожесть групп: transformer - модель embeddings, tfidf - символьные n-граммы
+    
+    # Настройки TF-IDF (SIMILARITY_ENGINE=tfidf; словарь n-грамм строится по каждой категории)
+    TFIDF_NGRAM_MIN: int = 2  # Минимальная длина символьной n-граммы
+    TFIDF_NGRAM_MAX: int = 4  # Максимальная длина символьной n-граммы
+    TFIDF_DENSE_BLOCK_BYTES: int = 64 * 1024 * 1024  # Плотный срез векторов TF-IDF при расчете блока схожести (строки блока считаются частями)
+    TFIDF_SVD_COMPONENTS: int = 128  # Размерность векторов TF-IDF после TruncatedSVD для ANN-индекса (больше ANN_EXACT_MAX_GROUPS групп)
+    TFIDF_SVD_SAMPLE_SIZE: int = 50000  # Групп в выборке для обучения TruncatedSVD
+    
+    # Настройки ANN-объединения (MERGE_MODE=ann)
+    ANN_NEIGHBORS: int = 32  # Число соседей каждой группы в kNN-графе
+    ANN_EXACT_MAX_GROUPS: int = 5000  # До этого числа групп соседи ищутся точно
+    ANN_INDEX_TYPE: str = "hnsw"  # hnsw или ivf
+    ANN_HNSW_M: int = 16
+    ANN_HNSW_EF_CONSTRUCTION: int = 64
+    ANN_HNSW_EF_SEARCH: int = 64
+    ANN_IVF_LISTS_FACTOR: float = 4.0  # Число списков IVF = factor * sqrt(n)
+    ANN_IVF_NPROBE: int = 8
+    
+    # Фоновые задачи группировки (POST /grouping/jobs)
+    GROUPING_MAX_CONCURRENT_JOBS: int = 1  # Одновременно выполняемых задач; остальные ждут в очереди
+    GROUPING_WORKERS: int = 2  # Потоков для вычислений группировки (кодирование, объединение групп)
+    GROUPING_PROCESSES: int = 1  # Процессов для параллельной группировки категорий (1 - последовательно)
+    GROUPING_LOAD_BATCH_SIZE: int = 5000  # СТЕ в одной порции чтения категории (yield_per)
+    CATALOG_SNAPSHOT_ENABLED: bool = True  # Группировать по колоночному снимку каталога (собирается после импорта)
+    CATALOG_SNAPSHOT_DIR: str = "./catalog_snapshot"  # Каталог снимка (массивы .npy, открываются через mmap)
+    
+    # Настройки поиска
+    SEARCH_RANK_MAX_MATCHES: int = 2000  # Сортировать по релевантности (bm25), если совпадений не больше; иначе - порядок индекса
+    
+    # Настройки пагинации
+    TOTAL_COUNT_LIMIT: int = 10000  # total_mode=estimated (по запросу клиента): строки считаются до этого числа, дальше total - нижняя граница
+    TOTAL_CACHE_TTL: float = 60.0  # Секунд хранится посчитанный total одинакового запроса
+    TOTAL_CACHE_SIZE: int = 1024  # Максимум запросов в кэше total
+    
+    # Кэш ответов GET /ste/{id}, /grouping/aggregations/{id}, /ratings/aggregations/{id}
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000  # Максимум ответов в кэше
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Максимальный суммарный размер тел ответов
+    RESPONSE_CACHE_TTL: float = 300.0  # Секунд хранится ответ (страховка от записи в БД в обход API)
+    RESPONSE_CACHE_INVALIDATION_LOG: str = "./response_cache_invalidations.log"  # Журнал сбросов, общий для воркеров uvicorn и скриптов
+    RESPONSE_CACHE_INVALIDATION_LOG_MAX_BYTES: int = 1024 * 1024  # Размер журнала, после которого он начинается заново (воркеры сбрасывают весь кэш)
+    
+    # Настройки импорта
+    IMPORT_BATCH_SIZE: int = 1000  # Число СТЕ в одном INSERT ... ON CONFLICT и одной транзакции
+    PARSE_WORKERS: int = 1  # Процессов для параллельного парсинга листов Excel (1 - последовательно)
+    PARSE_CACHE_ENABLED: bool = True  # Кэшировать разобранный файл (повторный импорт не читает Excel)
+    PARSE_CACHE_DIR: str = "./parse_cache"  # Каталог колоночного кэша разобранных файлов
+    IMPORT_LOCK_PATH: str = "./import.lock"  # Файл блокировки: один импорт на все процессы (воркеры uvicorn, скрипты)
     
     # Настройки ML
     EMBEDDING_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     USE_CUDA: bool = False
+    PRELOAD_EMBEDDING_MODEL: bool = True  # Загружать и прогревать модель при старте
+    EMBEDDING_BATCH_SIZE: int = 256  # Размер батча при кодировании текстов
+    SIMILARITY_BLOCK_SIZE: int = 2048  # Число строк матрицы схожести, считаемых за раз
+    EMBEDDING_CACHE_ENABLED: bool = True  # Персистентный кэш embeddings
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache.db"  # Файл кэша (SQLite, векторы float32)
+    EMBEDDING_STORE_ENABLED: bool = True  # Брать векторы известных текстов из хранилища scripts/build_embeddings.py
+    EMBEDDING_STORE_DIR: str = "./embedding_store"  # Каталог хранилища (матрица float16 по STE.id в .npy)
+    EMBEDDING_BACKEND: Literal["torch", "onnx"] = "torch"  # Бэкенд модели: torch - PyTorch (sentence-transformers), onnx - onnxruntime на CPU
+    
+    # Настройки ONNX (EMBEDDING_BACKEND=onnx)
+    ONNX_MODEL_DIR: str = "./onnx_models"  # Каталог экспортированных моделей (экспорт при первой загрузке)
+    ONNX_QUANTIZE: bool = True  # Динамическое квантование весов в int8
+    ONNX_INTRA_OP_THREADS: int = 0  # Потоков внутри оператора (0 - по числу ядер)
+    ONNX_INTER_OP_THREADS: int = 1  # Потоков для параллельных операторов графа
     
     class Config:
         env_file = ".env"
@@ -3,7 +3,9 @@
 """
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import inspect, text
 from app.config import settings
+from app.database.search_index import create_search_index
 
 # Создаем асинхронный движок БД
 engine = create_async_engine(
@@ -34,8 +36,32 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def add_missing_columns(sync_conn) -> None:
+    """
+    Добавляет в существующие таблицы колонки, появившиеся в моделях позже
+    (create_all не меняет уже созданные таблицы). Новые колонки - nullable.
+    
+    Args:
+        sync_conn: Синхронное соединение (из run_sync)
+    """
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+
 async def init_db():
     """Инициализация БД - создание таблиц"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        await conn.run_sync(create_search_index)
 
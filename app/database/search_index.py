@@ -0,0 +1,122 @@
+"""
+Полнотекстовый индекс СТЕ (SQLite FTS5) для поиска
+"""
+from typing import Optional
+from sqlalchemy import text
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Поля СТЕ в индексе и их веса в bm25 (название важнее остальных)
+SEARCH_FIELDS = ("name", "manufacturer", "model", "category_name")
+SEARCH_WEIGHTS = (10.0, 2.0, 3.0, 1.0)
+
+# unicode61 приводит регистр для всех алфавитов, включая кириллицу;
+# remove_diacritics 0 - чтобы "й" не превращалась в "и"
+FTS_TOKENIZER = "unicode61 remove_diacritics 0"
+
+# Длины префиксов, для которых FTS5 хранит отдельный индекс (поиск по мере ввода).
+# Префикс длиннее последнего из них FTS5 собирает слиянием списков всех подходящих слов,
+# что на частых словах ("мужская*") стоит десятки миллисекунд
+FTS_PREFIXES = "2 3 4 5 6 7 8 9 10"
+
+# Токены запроса: буквы и цифры
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Включается в init_db, если SQLite собран с FTS5
+search_index_available = False
+
+
+def _fields(prefix: str = "") -> str:
+    """Список полей индекса через запятую (с префиксом new./old.)"""
+    return ", ".join(f"{prefix}{field}" for field in SEARCH_FIELDS)
+
+
+def _create_table_sql() -> str:
+    """CREATE VIRTUAL TABLE для ste_fts с текущими полями и настройками"""
+    return (
+        f"CREATE VIRTUAL TABLE ste_fts USING fts5("
+        f"{_fields()}, content='ste', content_rowid='id', "
+        f"tokenize='{FTS_TOKENIZER}', prefix='{FTS_PREFIXES}')"
+    )
+
+
+def create_search_index(sync_conn) -> None:
+    """
+    Создает FTS5-индекс ste_fts поверх таблицы ste и триггеры синхронизации.
+    Если индекс создается впервые (или изменилось его определение), он заполняется
+    из уже импортированных СТЕ.
+    
+    Args:
+        sync_conn: Синхронное соединение (из run_sync)
+    """
+    global search_index_available
+    
+    if sync_conn.dialect.name != "sqlite":
+        return
+    
+    tables = dict(
+        sync_conn.execute(
+            text("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ('ste', 'ste_fts')")
+        ).all()
+    )
+    if "ste" not in tables:
+        return
+    exists = tables.get("ste_fts") == _create_table_sql()
+    
+    try:
+        if not exists:
+            if "ste_fts" in tables:
+                logger.info("Определение полнотекстового индекса изменилось, индекс перестраивается")
+                sync_conn.execute(text("DROP TABLE ste_fts"))
+            sync_conn.execute(text(_create_table_sql()))
+    except Exception as e:
+        logger.warning(f"FTS5 недоступен, поиск СТЕ будет работать через LIKE: {e}")
+        search_index_available = False
+        return
+    
+    sync_conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS ste_fts_insert AFTER INSERT ON ste BEGIN "
+        f"INSERT INTO ste_fts(rowid, {_fields()}) VALUES (new.id, {_fields('new.')}); "
+        f"END"
+    ))
+    sync_conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS ste_fts_delete AFTER DELETE ON ste BEGIN "
+        f"INSERT INTO ste_fts(ste_fts, rowid, {_fields()}) VALUES ('delete', old.id, {_fields('old.')}); "
+        f"END"
+    ))
+    sync_conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS ste_fts_update AFTER UPDATE OF {_fields()} ON ste BEGIN "
+        f"INSERT INTO ste_fts(ste_fts, rowid, {_fields()}) VALUES ('delete', old.id, {_fields('old.')}); "
+        f"INSERT INTO ste_fts(rowid, {_fields()}) VALUES (new.id, {_fields('new.')}); "
+        f"END"
+    ))
+    
+    if not exists:
+        # Ранжирование по умолчанию для ORDER BY rank
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        sync_conn.execute(text(f"INSERT INTO ste_fts(ste_fts, rank) VALUES ('rank', 'bm25({weights})')"))
+        sync_conn.execute(text("INSERT INTO ste_fts(ste_fts) VALUES ('rebuild')"))
+    
+    search_index_available = True
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Строит выражение FTS5 MATCH из пользовательского запроса (поиск по мере ввода):
+    все слова обязательны, последнее ищется по префиксу, остальные - целиком.
+    
+    Args:
+        query: Поисковый запрос
+    
+    Returns:
+        Выражение MATCH или None, если в запросе нет слов
+    """
+    tokens = TOKEN_PATTERN.findall(query or "")
+    if not tokens:
+        return None
+    # Слова берутся в кавычки, чтобы операторы FTS5 (AND, NOT, NEAR) искались как текст
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
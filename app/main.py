@@ -6,6 +6,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.database.base import init_db
 from app.api.v1 import ste, grouping, aggregation_edit, rating
+from app.services.model_registry import model_registry
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_store import embedding_store
+from app.services.response_cache import response_cache
+from app.services.grouping_jobs import grouping_job_manager
+from app.services.catalog_snapshot import catalog_snapshot_store
+import asyncio
 import logging
 
 # Настройка логирования
@@ -41,6 +48,20 @@ async def startup_event():
     logger.info("Инициализация базы данных...")
     await init_db()
     logger.info("База данных инициализирована")
+    
+    if settings.PRELOAD_EMBEDDING_MODEL:
+        logger.info("Загрузка модели embeddings...")
+        try:
+            await asyncio.to_thread(model_registry.load)
+        except Exception as e:
+            # Сервис остается доступным: группировка использует запасную схожесть по словам
+            logger.error(f"Не удалось загрузить модель embeddings: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Остановка фоновых задач группировки"""
+    await grouping_job_manager.shutdown()
 
 
 @app.get("/", tags=["Главная"])
@@ -63,7 +84,13 @@ async def health_check():
     """
     return {
         "status": "healthy",
-        "version": settings.VERSION
+        "version": settings.VERSION,
+        "embedding_model": model_registry.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "grouping_jobs": grouping_job_manager.stats(),
+        "catalog_snapshot": catalog_snapshot_store.stats(),
+        "embedding_store": embedding_store.stats()
     }
 
 
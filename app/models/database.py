@@ -22,6 +22,7 @@ class STE(Base):
     category_name = Column(String, index=True, comment="Название категории")
     characteristics = Column(JSON, comment="Характеристики в виде JSON")
     characteristics_raw = Column(Text, comment="Сырые характеристики из Excel")
+    content_hash = Column(String, comment="Хэш разобранных полей (для дельта-импорта)")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -2,7 +2,7 @@
 Pydantic схемы для API
 """
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
 
@@ -106,6 +106,22 @@ class AggregationResponse(AggregationBase):
     items_count: int = 0
 
 
+class AggregationItemPreview(BaseModel):
+    """Краткое представление СТЕ в списке агрегаций"""
+    id: int = Field(..., description="ID элемента агрегации")
+    ste_id: int = Field(..., description="ID СТЕ")
+    name: str
+    manufacturer: Optional[str] = None
+    image_url: Optional[str] = None
+    order: int
+
+
+class AggregationSummaryResponse(AggregationBase):
+    """Агрегация в списке (view=summary): без характеристик СТЕ, только первые элементы"""
+    items_count: int = 0
+    preview: List[AggregationItemPreview] = []
+
+
 class AggregationDetailResponse(AggregationBase):
     """Детальный ответ об агрегации"""
     items: List[AggregationItemResponse] = []
@@ -125,6 +141,16 @@ class GroupingRequest(BaseModel):
     category_id: Optional[str] = Field(None, description="Фильтр по категории")
     characteristics: Optional[Dict[str, Any]] = Field(None, description="Характеристики для группировки")
     force_regenerate: bool = Field(False, description="Принудительно перегенерировать")
+    merge_mode: Optional[Literal["greedy", "ann"]] = Field(
+        None,
+        description="Режим объединения похожих групп: greedy - попарный жадный проход, "
+                    "ann - kNN-граф для очень больших категорий (по умолчанию из настроек)"
+    )
+    similarity_engine: Optional[Literal["transformer", "tfidf"]] = Field(
+        None,
+        description="Схожесть названий групп: transformer - модель embeddings, "
+                    "tfidf - TF-IDF по символьным n-граммам, в разы быстрее (по умолчанию из настроек)"
+    )
 
 
 class RatingRequest(BaseModel):
@@ -137,7 +163,9 @@ class RatingRequest(BaseModel):
 class SearchResponse(BaseModel):
     """Ответ на поиск"""
     items: List[STEResponse]
-    total: int
+    total: Optional[int] = Field(None, description="Всего результатов (None при total_mode=off)")
+    total_exact: bool = Field(True, description="False, если total - нижняя граница (total_mode=estimated)")
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы (None - страница последняя)")
 
 
 class GroupingResponse(BaseModel):
@@ -147,8 +175,67 @@ class GroupingResponse(BaseModel):
     total_items: int
 
 
+class GroupingJobResponse(BaseModel):
+    """Состояние задачи группировки"""
+    job_id: str
+    status: Literal["queued", "running", "completed", "failed", "cancelled"]
+    category_id: Optional[str] = Field(None, description="Фильтр по категории из запроса")
+    categories_total: Optional[int] = Field(None, description="Категорий к обработке (известно после чтения СТЕ)")
+    categories_done: int = 0
+    current_category: Optional[str] = Field(None, description="Категория, которая группируется сейчас")
+    stes_total: Optional[int] = None
+    stes_done: int = Field(0, description="СТЕ в обработанных категориях")
+    progress: Optional[float] = Field(None, description="Доля обработанных СТЕ, 0..1")
+    eta_seconds: Optional[float] = Field(None, description="Оценка оставшегося времени по скорости обработки СТЕ")
+    total_groups: int = 0
+    total_items: int = 0
+    aggregation_ids: List[int] = Field(
+        default_factory=list,
+        description="Агрегации задачи (читаются через /grouping/aggregations/{id}); "
+                    "при отмене остаются агрегации обработанных категорий"
+    )
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 class MessageResponse(BaseModel):
     """Простое сообщение"""
     message: str
     success: bool = True
 
+
+
+class ImportSheetStats(BaseModel):
+    """Статистика разбора листа Excel"""
+    file: str
+    sheet: str
+    rows: int = Field(0, description="Прочитано строк данных")
+    ste: int = Field(0, description="Разобрано СТЕ")
+    seconds: float = Field(0.0, description="Время разбора листа, секунд")
+    error: Optional[str] = None
+
+
+class ImportJobResponse(BaseModel):
+    """Состояние задачи импорта"""
+    job_id: str
+    file_path: str
+    status: Literal["queued", "running", "completed", "failed"]
+    phase: str = Field(..., description="Этап: queued, importing, categories, snapshot, characteristics, done")
+    rows_processed: int = Field(0, description="Прочитано строк СТЕ из файла")
+    imported: int = 0
+    updated: int = 0
+    unchanged: int = Field(0, description="СТЕ без изменений (не перезаписывались)")
+    removed_count: int = Field(0, description="СТЕ, которые есть в БД, но отсутствуют в файле")
+    affected_categories: List[str] = Field(default_factory=list, description="Категории с новыми или измененными СТЕ")
+    sheet_stats: List[ImportSheetStats] = Field(
+        default_factory=list,
+        description="Статистика по листам (пополняется по ходу разбора; пустая, если файл прочитан из кэша)"
+    )
+    rows_per_second: Optional[float] = None
+    errors_count: int = 0
+    errors: List[str] = Field(default_factory=list, description="Первые 10 ошибок")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -3,15 +3,130 @@
 Обрабатывает множественные листы, разные форматы характеристик и орфографические ошибки
 """
 import pandas as pd
-from typing import List, Dict, Any, Optional
+import openpyxl
+from openpyxl.cell.cell import ERROR_CODES
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from app.config import settings
+from app.parsers.parse_cache import ParsedCatalogCache
 import re
 from pathlib import Path
+import logging
+import time
 import unicodedata
 
+logger = logging.getLogger(__name__)
+
+
+# Поля СТЕ, которые читаются из колонок файла
+STE_FIELDS = (
+    'ste_id',
+    'name',
+    'image_url',
+    'model',
+    'country',
+    'manufacturer',
+    'category_id',
+    'category_name',
+    'characteristics_raw',
+)
+
+# Строка характеристик: "ключ: значение" до точки с запятой или конца строки
+CHARACTERISTICS_PATTERN = re.compile(r'([^:]+?):\s*([^;]+?)(?:;|$)')
+
+# Тот же разбор с жадными квантификаторами: ключ не может содержать ":", а значение ";",
+# поэтому границы совпадений те же (отличаться может только пробельный хвост у конца
+# строки, который убирает нормализация фрагментов), а регулярное выражение быстрее
+CHARACTERISTICS_COLUMN_PATTERN = re.compile(r'([^:]+):\s*([^;]+)(?:;|$)')
+
+# Сколько строк потокового парсера накапливать для колоночного разбора характеристик
+CHARACTERISTICS_BATCH_SIZE = 2000
+
+def collapse_whitespace(text: str) -> str:
+    """
+    Эквивалент re.sub(r'\\s+', ' ', text.strip()) без регулярного выражения:
+    str.split и \\s используют одно и то же определение пробельных символов.
+    
+    Args:
+        text: Исходный текст
+        
+    Returns:
+        Текст с единичными пробелами
+    """
+    return ' '.join(text.split())
+
+
+# Буквальная замена из normalize_text (повторяется в колоночном пути для совпадения результатов)
+LEGACY_QUOTE_LITERAL = ', "\'").replace('
+
+
+def remove_control_chars(text: str) -> str:
+    """
+    Удаляет символы Unicode категории C (кроме \\n и \\t), как normalize_text.
+    Строка без непечатаемых символов (str.isprintable) заведомо их не содержит
+    и возвращается без посимвольного цикла.
+    
+    Args:
+        text: Исходный текст
+        
+    Returns:
+        Текст без управляющих символов
+    """
+    if text.isprintable():
+        return text
+    return ''.join(char for char in text if unicodedata.category(char)[0] != 'C' or char == '\n' or char == '\t')
+
+
+def fast_normalize_text(text: str) -> str:
+    """
+    То же, что ExcelParser.normalize_text, но посимвольный цикл удаления
+    управляющих символов выполняется только для строк с непечатаемыми символами.
+    
+    Args:
+        text: Исходный текст
+        
+    Returns:
+        Нормализованный текст
+    """
+    if not text:
+        return ""
+    
+    text = collapse_whitespace(str(text))
+    text = text.replace('«', '"').replace('»', '"').replace(LEGACY_QUOTE_LITERAL, "'")
+    text = remove_control_chars(text)
+    
+    return text.strip()
+
+
+# Ключи и значения характеристик сильно повторяются между строками
+normalize_fragment = lru_cache(maxsize=200_000)(fast_normalize_text)
+
+
+@lru_cache(maxsize=200_000)
+def normalize_characteristic(pair: tuple) -> Optional[tuple]:
+    """
+    Нормализует пару (ключ, значение), найденную в строке характеристик.
+    
+    Args:
+        pair: Сырые ключ и значение
+        
+    Returns:
+        Нормализованная пара или None, если ключ или значение пустые
+    """
+    key = normalize_fragment(pair[0])
+    value = normalize_fragment(pair[1])
+    return (key, value) if key and value else None
+
 
 class ExcelParser:
     """Парсер Excel файла с СТЕ"""
     
+    def __init__(self):
+        """Инициализация парсера"""
+        # Статистика по листам последнего разбора (см. new_sheet_stats); пополняется по ходу разбора
+        self.sheet_stats: List[Dict[str, Any]] = []
+    
     @staticmethod
     def normalize_text(text: str) -> str:
         """
@@ -106,8 +221,7 @@ class ExcelParser:
         # Пробуем разные разделители - сначала точка с запятой, затем запятая
         # Используем регулярное выражение для более гибкого парсинга
         # Паттерн: ключ (может содержать пробелы и двоеточие) : значение до точки с запятой или конца строки
-        pattern = r'([^:]+?):\s*([^;]+?)(?:;|$)'
-        matches = re.findall(pattern, text)
+        matches = CHARACTERISTICS_PATTERN.findall(text)
         
         for key, value in matches:
             key = ExcelParser.normalize_text(key)
@@ -119,27 +233,117 @@ class ExcelParser:
         
         # Если не нашлось совпадений, пробуем более простой парсинг
         if not characteristics:
-            # Разбиваем по точке с запятой или запятой (если они с пробелами после)
-            parts = re.split(r'[;]\s*', text)
+            characteristics = ExcelParser.split_characteristics(text, ExcelParser.normalize_text)
+        
+        return characteristics
+    
+    @staticmethod
+    def split_characteristics(text: str, normalize=None) -> Dict[str, Any]:
+        """
+        Простой разбор нормализованной строки характеристик по ";" и первому ":"
+        (используется, когда основной паттерн ничего не нашел).
+        
+        Args:
+            text: Нормализованная строка характеристик
+            normalize: Функция нормализации ключей и значений (по умолчанию normalize_text)
             
-            for part in parts:
-                part = part.strip()
-                if not part:
-                    continue
-                
-                # Ищем разделитель ":"
-                if ':' in part:
-                    # Разбиваем по первому вхождению ":"
-                    key_value = part.split(':', 1)
-                    if len(key_value) == 2:
-                        key = ExcelParser.normalize_text(key_value[0])
-                        value = ExcelParser.normalize_text(key_value[1])
-                        
-                        if key and value:
-                            characteristics[key] = value
+        Returns:
+            Словарь характеристик
+        """
+        normalize = normalize or ExcelParser.normalize_text
+        characteristics = {}
+        
+        # Разбиваем по точке с запятой или запятой (если они с пробелами после)
+        parts = re.split(r'[;]\s*', text)
+        
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+            
+            # Ищем разделитель ":"
+            if ':' in part:
+                # Разбиваем по первому вхождению ":"
+                key_value = part.split(':', 1)
+                if len(key_value) == 2:
+                    key = normalize(key_value[0])
+                    value = normalize(key_value[1])
+                    
+                    if key and value:
+                        characteristics[key] = value
         
         return characteristics
     
+    @staticmethod
+    def normalize_text_column(texts: pd.Series) -> pd.Series:
+        """
+        Колоночный вариант normalize_text для серии строк.
+        Все шаги нормализации выполняются за один проход по колонке.
+        
+        Args:
+            texts: Серия строк
+            
+        Returns:
+            Серия нормализованных строк с тем же индексом
+        """
+        return texts.map(fast_normalize_text)
+    
+    @staticmethod
+    def clean_value_column(values: Iterable[Any]) -> List[Optional[str]]:
+        """
+        Колоночный вариант clean_value.
+        
+        Args:
+            values: Значения колонки
+            
+        Returns:
+            Список очищенных значений (None для пустых)
+        """
+        series = pd.Series(list(values), dtype=object)
+        result: List[Optional[str]] = [None] * len(series)
+        
+        texts = series[series.notna()].astype(str).str.strip()
+        texts = texts[(texts != '') & ~texts.str.lower().isin(['null', 'none', 'nan'])]
+        texts = ExcelParser.normalize_text_column(texts)
+        
+        for index, text in texts[texts != ''].items():
+            result[index] = text
+        
+        return result
+    
+    @staticmethod
+    def parse_characteristics_column(values: Iterable[Any]) -> List[Dict[str, Any]]:
+        """
+        Колоночный вариант parse_characteristics: нормализация и разбор всей колонки
+        строковыми операциями pandas, пары ключ-значение нормализуются с мемоизацией.
+        
+        Args:
+            values: Сырые строки характеристик
+            
+        Returns:
+            Список словарей характеристик в порядке входных значений
+        """
+        series = pd.Series(list(values), dtype=object)
+        result: List[Dict[str, Any]] = [{} for _ in range(len(series))]
+        
+        present = series.notna() & series.astype(bool)
+        texts = ExcelParser.normalize_text_column(series[present].astype(str))
+        texts = texts[texts != '']
+        if texts.empty:
+            return result
+        
+        for row, text, matches in zip(texts.index, texts, texts.str.findall(CHARACTERISTICS_COLUMN_PATTERN)):
+            # dict() сохраняет позицию первого вхождения ключа и последнее значение - как присваивание по ключу
+            characteristics = dict(filter(None, map(normalize_characteristic, matches)))
+            
+            # Если не нашлось совпадений, пробуем более простой парсинг
+            if not characteristics:
+                characteristics = ExcelParser.split_characteristics(text, normalize_fragment)
+            
+            result[row] = characteristics
+        
+        return result
+    
     @staticmethod
     def clean_value(value: Any) -> Optional[str]:
         """
@@ -165,6 +369,110 @@ class ExcelParser:
         
         return value_str if value_str else None
     
+    @staticmethod
+    def map_column(column: str) -> Optional[str]:
+        """
+        Определяет поле СТЕ по названию колонки
+        (на случай разных названий и орфографических ошибок).
+        
+        Args:
+            column: Название колонки
+            
+        Returns:
+            Название поля СТЕ или None, если колонка не используется
+        """
+        col_lower = column.lower().strip()
+        
+        # ID СТЕ
+        if 'id сте' in col_lower or 'id_сте' in col_lower or col_lower == 'сте_id':
+            return 'ste_id'
+        # Название СТЕ
+        elif 'название сте' in col_lower or 'название_сте' in col_lower:
+            return 'name'
+        # Ссылка на картинку
+        elif 'ссылка' in col_lower and ('картинк' in col_lower or 'изображен' in col_lower):
+            return 'image_url'
+        # Модель
+        elif col_lower == 'модель' or col_lower == 'model':
+            return 'model'
+        # Страна происхождения
+        elif 'страна' in col_lower and 'происхожд' in col_lower:
+            return 'country'
+        # Производитель
+        elif col_lower == 'производитель' or 'manufacturer' in col_lower:
+            return 'manufacturer'
+        # ID категории
+        elif 'id категори' in col_lower or 'id_категори' in col_lower:
+            return 'category_id'
+        # Название категории
+        elif 'название категори' in col_lower or 'название_категори' in col_lower:
+            return 'category_name'
+        # Характеристики
+        elif col_lower == 'характеристики' or 'characteristics' in col_lower:
+            return 'characteristics_raw'
+        
+        return None
+    
+    def build_ste_data(self, values: Dict[str, Any], with_characteristics: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Собирает словарь СТЕ из значений строки.
+        
+        Args:
+            values: Словарь {поле СТЕ: сырое значение ячейки} для доступных колонок
+            with_characteristics: Разбирать характеристики сразу; если False, в characteristics_raw
+                остается сырое значение ячейки для последующего fill_characteristics
+            
+        Returns:
+            Словарь с данными о СТЕ или None, если нет обязательных полей
+        """
+        ste_data = {field: None for field in STE_FIELDS}
+        
+        # Заполняем данные из доступных колонок
+        for key in STE_FIELDS:
+            if key in values:
+                value = values[key]
+                if key == 'characteristics_raw' and not with_characteristics:
+                    ste_data[key] = value
+                elif key == 'ste_id' or key == 'category_id':
+                    # ID должны быть строками
+                    cleaned = self.clean_value(value)
+                    ste_data[key] = str(cleaned) if cleaned else None
+                else:
+                    ste_data[key] = self.clean_value(value)
+        
+        # Пропускаем строки без обязательных полей
+        if not ste_data['ste_id'] or not ste_data['name']:
+            return None
+        
+        # Парсим характеристики (даже если они пустые или отсутствуют)
+        if with_characteristics:
+            raw_char = ste_data.get('characteristics_raw', '') or ''
+            ste_data['characteristics'] = self.parse_characteristics(raw_char)
+        else:
+            ste_data['characteristics'] = None
+        
+        return ste_data
+    
+    def fill_characteristics(self, ste_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Очищает и разбирает характеристики сразу для списка СТЕ, собранных
+        с with_characteristics=False (колоночный путь).
+        
+        Args:
+            ste_list: Список СТЕ с сырыми значениями characteristics_raw
+            
+        Returns:
+            Тот же список с заполненными characteristics_raw и characteristics
+        """
+        raw_values = self.clean_value_column(ste_data['characteristics_raw'] for ste_data in ste_list)
+        parsed = self.parse_characteristics_column(raw_values)
+        
+        for ste_data, raw_value, characteristics in zip(ste_list, raw_values, parsed):
+            ste_data['characteristics_raw'] = raw_value
+            ste_data['characteristics'] = characteristics
+        
+        return ste_list
+    
     def parse_excel_sheet(self, df: pd.DataFrame, sheet_name: str = None) -> List[Dict[str, Any]]:
         """
         Парсит один лист Excel файла.
@@ -181,147 +489,428 @@ class ExcelParser:
         # Нормализуем названия колонок (убираем пробелы, приводим к нижнему регистру для сравнения)
         df.columns = df.columns.str.strip()
         
-        # Определяем маппинг колонок (на случай разных названий и орфографических ошибок)
+        # Определяем маппинг колонок и переименовываем их
         column_mapping = {}
-        
-        # Ищем колонки по различным вариантам названий
         for col in df.columns:
-            col_lower = col.lower().strip()
-            
-            # ID СТЕ
-            if 'id сте' in col_lower or 'id_сте' in col_lower or col_lower == 'сте_id':
-                column_mapping[col] = 'ste_id'
-            # Название СТЕ
-            elif 'название сте' in col_lower or 'название_сте' in col_lower:
-                column_mapping[col] = 'name'
-            # Ссылка на картинку
-            elif 'ссылка' in col_lower and ('картинк' in col_lower or 'изображен' in col_lower):
-                column_mapping[col] = 'image_url'
-            # Модель
-            elif col_lower == 'модель' or col_lower == 'model':
-                column_mapping[col] = 'model'
-            # Страна происхождения
-            elif 'страна' in col_lower and 'происхожд' in col_lower:
-                column_mapping[col] = 'country'
-            # Производитель
-            elif col_lower == 'производитель' or 'manufacturer' in col_lower:
-                column_mapping[col] = 'manufacturer'
-            # ID категории
-            elif 'id категори' in col_lower or 'id_категори' in col_lower:
-                column_mapping[col] = 'category_id'
-            # Название категории
-            elif 'название категори' in col_lower or 'название_категори' in col_lower:
-                column_mapping[col] = 'category_name'
-            # Характеристики
-            elif col_lower == 'характеристики' or 'characteristics' in col_lower:
-                column_mapping[col] = 'characteristics_raw'
-        
-        # Переименовываем колонки
+            field = self.map_column(col)
+            if field:
+                column_mapping[col] = field
         df = df.rename(columns=column_mapping)
         
+        available_fields = [key for key in STE_FIELDS if key in df.columns]
+        
         # Парсим данные
         for index, row in df.iterrows():
             try:
-                # Получаем данные строки с обработкой разных вариантов названий колонок
-                ste_data = {
-                    'ste_id': None,
-                    'name': None,
-                    'image_url': None,
-                    'model': None,
-                    'country': None,
-                    'manufacturer': None,
-                    'category_id': None,
-                    'category_name': None,
-                    'characteristics_raw': None,
-                }
-                
-                # Заполняем данные из доступных колонок
-                for key in ste_data.keys():
-                    if key in df.columns:
-                        value = row.get(key)
-                        if key == 'ste_id' or key == 'category_id':
-                            # ID должны быть строками
-                            cleaned = self.clean_value(value)
-                            ste_data[key] = str(cleaned) if cleaned else None
-                        else:
-                            ste_data[key] = self.clean_value(value)
-                
-                # Пропускаем строки без обязательных полей
-                if not ste_data['ste_id'] or not ste_data['name']:
-                    continue
-                
-                # Парсим характеристики (даже если они пустые или отсутствуют)
-                raw_char = ste_data.get('characteristics_raw', '') or ''
-                ste_data['characteristics'] = self.parse_characteristics(raw_char)
-                
-                ste_list.append(ste_data)
+                ste_data = self.build_ste_data(
+                    {key: row.get(key) for key in available_fields},
+                    with_characteristics=False
+                )
+                if ste_data:
+                    ste_list.append(ste_data)
                 
             except Exception as e:
                 # Логируем ошибки, но продолжаем обработку
                 sheet_info = f" (лист: {sheet_name})" if sheet_name else ""
-                print(f"Ошибка при парсинге строки {index}{sheet_info}: {e}")
+                logger.warning("Ошибка при парсинге строки %s%s: %s", index, sheet_info, e)
                 continue
         
-        return ste_list
+        # Характеристики разбираем сразу для всей колонки
+        return self.fill_characteristics(ste_list)
     
-    def parse_excel(self, file_path: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def convert_cell(value: Any) -> Any:
         """
-        Парсит Excel файл (все листы) и возвращает список СТЕ.
+        Приводит значение ячейки openpyxl к тому же виду, что дает pandas.read_excel:
+        ошибки формул - пустые значения, целые числа с плавающей точкой - int.
+        
+        Args:
+            value: Значение ячейки
+            
+        Returns:
+            Приведенное значение
+        """
+        if isinstance(value, str) and value in ERROR_CODES:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+    
+    def iter_sheet_rows(
+        self,
+        worksheet,
+        sheet_name: str = None,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Потоково парсит лист openpyxl, открытый в режиме read-only.
+        Маппинг колонок и очистка значений - те же, что в parse_excel_sheet.
+        
+        Args:
+            worksheet: Лист openpyxl
+            sheet_name: Название листа (для логирования)
+            stats: Статистика листа: в rows считаются прочитанные строки
+            
+        Returns:
+            Итератор словарей с данными о СТЕ
+        """
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        
+        # Позиции колонок для каждого поля (первая подходящая колонка)
+        positions = {}
+        for position, col in enumerate(header):
+            if not isinstance(col, str):
+                continue
+            field = self.map_column(col.strip())
+            if field and field not in positions:
+                positions[field] = position
+        
+        fields = [(key, positions[key]) for key in STE_FIELDS if key in positions]
+        
+        # Характеристики разбираются колоночно по CHARACTERISTICS_BATCH_SIZE строк
+        pending = []
+        for index, row in enumerate(rows):
+            if stats is not None:
+                stats["rows"] += 1
+            try:
+                values = {
+                    key: self.convert_cell(row[position]) if position < len(row) else None
+                    for key, position in fields
+                }
+                ste_data = self.build_ste_data(values, with_characteristics=False)
+                if ste_data:
+                    pending.append(ste_data)
+            
+            except Exception as e:
+                # Логируем ошибки, но продолжаем обработку
+                sheet_info = f" (лист: {sheet_name})" if sheet_name else ""
+                logger.warning("Ошибка при парсинге строки %s%s: %s", index, sheet_info, e)
+                continue
+            
+            if len(pending) >= CHARACTERISTICS_BATCH_SIZE:
+                yield from self.fill_characteristics(pending)
+                pending = []
+        
+        if pending:
+            yield from self.fill_characteristics(pending)
+    
+    def iter_excel(self, file_path: str, batch_size: int = None) -> Iterator[Any]:
+        """
+        Потоково парсит Excel файл (все листы) через openpyxl в режиме read-only,
+        не держа в памяти лист целиком. Статистика листа появляется в self.sheet_stats
+        в начале его разбора и обновляется по ходу (seconds - без времени, пока
+        потребитель обрабатывает отданные СТЕ).
         
         Args:
             file_path: Путь к Excel файлу
+            batch_size: Если указан - отдавать списки по batch_size СТЕ вместо отдельных СТЕ
             
         Returns:
-            Список словарей с данными о СТЕ
+            Итератор словарей с данными о СТЕ (или их списков)
         """
         file_path = Path(file_path)
         
         if not file_path.exists():
             raise FileNotFoundError(f"Файл не найден: {file_path}")
         
-        all_ste_list = []
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        try:
+            logger.info("Найдено листов в файле %s: %s", file_path.name, len(workbook.sheetnames))
+            self.sheet_stats = []
+            
+            batch = []
+            for worksheet in workbook.worksheets:
+                stats = new_sheet_stats(file_path.name, worksheet.title)
+                self.sheet_stats.append(stats)
+                # Размеры листа в файле могут быть неверными - читаем до фактического конца
+                worksheet.reset_dimensions()
+                
+                resumed = time.perf_counter()
+                try:
+                    for ste_data in self.iter_sheet_rows(worksheet, worksheet.title, stats):
+                        stats["ste"] += 1
+                        stats["seconds"] += time.perf_counter() - resumed
+                        if batch_size is None:
+                            yield ste_data
+                        else:
+                            batch.append(ste_data)
+                            if len(batch) >= batch_size:
+                                yield batch
+                                batch = []
+                        resumed = time.perf_counter()
+                except Exception as e:
+                    stats["error"] = str(e)
+                    self.log_sheet_report(stats)
+                    raise
+                
+                stats["seconds"] = round(stats["seconds"] + time.perf_counter() - resumed, 3)
+                self.log_sheet_report(stats)
+            
+            if batch:
+                yield batch
+        finally:
+            workbook.close()
+    
+    def parse_excel(self, file_path: str, workers: int = None) -> List[Dict[str, Any]]:
+        """
+        Парсит Excel файл (все листы) и возвращает список СТЕ.
         
-        # Читаем все листы Excel файла
-        excel_file = pd.ExcelFile(file_path, engine='openpyxl')
-        sheet_names = excel_file.sheet_names
+        Args:
+            file_path: Путь к Excel файлу
+            workers: Число процессов для параллельного парсинга листов
+                (по умолчанию settings.PARSE_WORKERS, 1 - последовательно)
+            
+        Returns:
+            Список словарей с данными о СТЕ
+        """
+        return self.parse_files([file_path], workers)
+    
+    def parse_files(self, file_paths: List[str], workers: int = None) -> List[Dict[str, Any]]:
+        """
+        Парсит несколько Excel файлов (все листы). Листы независимы, поэтому при workers > 1
+        они распределяются по пулу процессов; результат собирается в порядке файлов и листов.
+        Статистика по листам сохраняется в self.sheet_stats.
         
-        print(f"Найдено листов в файле: {len(sheet_names)}")
+        Args:
+            file_paths: Пути к Excel файлам
+            workers: Число процессов (по умолчанию settings.PARSE_WORKERS, 1 - последовательно)
+            
+        Returns:
+            Список словарей с данными о СТЕ
+        """
+        workers = settings.PARSE_WORKERS if workers is None else workers
+        file_paths = [Path(file_path) for file_path in file_paths]
+        
+        for file_path in file_paths:
+            if not file_path.exists():
+                raise FileNotFoundError(f"Файл не найден: {file_path}")
+        
+        started = time.perf_counter()
+        results = []
+        
+        if workers > 1:
+            tasks = []
+            for file_path in file_paths:
+                with pd.ExcelFile(file_path, engine='openpyxl') as excel_file:
+                    sheet_names = excel_file.sheet_names
+                logger.info("Найдено листов в файле %s: %s", file_path.name, len(sheet_names))
+                tasks.extend((str(file_path), sheet_name) for sheet_name in sheet_names)
+            
+            with ProcessPoolExecutor(max_workers=min(workers, max(1, len(tasks)))) as pool:
+                futures = [pool.submit(parse_sheet_task, *task) for task in tasks]
+                for future in futures:
+                    results.append(future.result())
+                    self.log_sheet_report(results[-1][1])
+        else:
+            for file_path in file_paths:
+                # Файл открывается один раз для всех листов
+                with pd.ExcelFile(file_path, engine='openpyxl') as excel_file:
+                    logger.info("Найдено листов в файле %s: %s", file_path.name, len(excel_file.sheet_names))
+                    for sheet_name in excel_file.sheet_names:
+                        results.append(parse_sheet_task(excel_file, sheet_name))
+                        self.log_sheet_report(results[-1][1])
         
-        for sheet_name in sheet_names:
-            try:
-                print(f"Обработка листа: {sheet_name}")
-                df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-                
-                # Пропускаем пустые листы
-                if df.empty:
-                    print(f"  Лист '{sheet_name}' пуст, пропускаем")
-                    continue
-                
-                # Парсим лист
-                ste_list = self.parse_excel_sheet(df, sheet_name)
-                print(f"  Обработано СТЕ из листа '{sheet_name}': {len(ste_list)}")
-                
-                all_ste_list.extend(ste_list)
-                
-            except Exception as e:
-                print(f"Ошибка при обработке листа '{sheet_name}': {e}")
-                continue
+        all_ste_list = []
+        for ste_list, _ in results:
+            all_ste_list.extend(ste_list)
+        self.sheet_stats = [stats for _, stats in results]
         
-        print(f"Всего обработано СТЕ: {len(all_ste_list)}")
+        logger.info(
+            "Всего обработано СТЕ: %s (листов: %s, процессов: %s, %.2f с)",
+            len(all_ste_list), len(results), max(1, workers), time.perf_counter() - started
+        )
         
         return all_ste_list
+    
+    @staticmethod
+    def log_sheet_report(stats: Dict[str, Any]) -> None:
+        """
+        Пишет в лог строку отчета по листу.
+        
+        Args:
+            stats: Статистика листа (new_sheet_stats)
+        """
+        if stats['error']:
+            logger.error("Ошибка при обработке листа '%s': %s", stats['sheet'], stats['error'])
+        elif not stats['rows']:
+            logger.info("Лист '%s' пуст, пропускаем", stats['sheet'])
+        else:
+            logger.info(
+                "Лист '%s': строк %s, СТЕ %s, %.2f с",
+                stats['sheet'], stats['rows'], stats['ste'], stats['seconds']
+            )
+
+
+def new_sheet_stats(file_name: str, sheet_name: str) -> Dict[str, Any]:
+    """
+    Пустая статистика листа.
+    
+    Args:
+        file_name: Имя файла
+        sheet_name: Название листа
+    
+    Returns:
+        Словарь: file, sheet, rows (строк данных), ste (разобрано СТЕ), seconds, error
+    """
+    return {"file": file_name, "sheet": sheet_name, "rows": 0, "ste": 0, "seconds": 0.0, "error": None}
+
+
+def parse_sheet_task(
+    source: Union[str, pd.ExcelFile],
+    sheet_name: str
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Парсит один лист Excel файла. Функция модуля, чтобы ее можно было передать в пул процессов.
+    
+    Args:
+        source: Путь к файлу (в пуле процессов) или уже открытый pd.ExcelFile
+        sheet_name: Название листа
+        
+    Returns:
+        Кортеж (список СТЕ листа, статистика: file, sheet, rows, ste, seconds, error)
+    """
+    started = time.perf_counter()
+    stats = new_sheet_stats(Path(source if isinstance(source, str) else source.io).name, sheet_name)
+    ste_list = []
+    
+    try:
+        df = pd.read_excel(source, sheet_name=sheet_name, engine='openpyxl')
+        stats["rows"] = len(df)
+        # Пустые листы пропускаем
+        if not df.empty:
+            ste_list = ExcelParser().parse_excel_sheet(df, sheet_name)
+    except Exception as e:
+        stats["error"] = str(e)
+    
+    stats["ste"] = len(ste_list)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return ste_list, stats
 
 
-def parse_ste_file(file_path: str) -> List[Dict[str, Any]]:
+def parse_ste_file(
+    file_path: str,
+    workers: int = None,
+    use_cache: bool = None,
+    rebuild_cache: bool = False
+) -> List[Dict[str, Any]]:
     """
     Удобная функция для парсинга файла СТЕ.
     Обрабатывает все листы Excel файла.
     
     Args:
         file_path: Путь к Excel файлу
+        workers: Число процессов для параллельного парсинга листов (по умолчанию settings.PARSE_WORKERS)
+        use_cache: Использовать кэш разобранного файла (по умолчанию settings.PARSE_CACHE_ENABLED)
+        rebuild_cache: Разобрать файл заново и перезаписать кэш
         
     Returns:
         Список словарей с данными о СТЕ
     """
+    use_cache = settings.PARSE_CACHE_ENABLED if use_cache is None else use_cache
+    cache = ParsedCatalogCache()
+    
+    if use_cache and not rebuild_cache:
+        cached = cache.load(Path(file_path))
+        if cached is not None:
+            ste_list = [ste_data for batch in cached for ste_data in batch]
+            logger.info("Загружено из кэша разобранных файлов: %s СТЕ", len(ste_list))
+            return ste_list
+    
     parser = ExcelParser()
-    return parser.parse_excel(file_path)
+    ste_list = parser.parse_excel(file_path, workers)
+    
+    if use_cache:
+        cache.save(Path(file_path), ste_list)
+    
+    return ste_list
+
+
+def parse_ste_files(file_paths: List[str], workers: int = None) -> List[Dict[str, Any]]:
+    """
+    Парсинг нескольких файлов СТЕ; листы всех файлов могут обрабатываться параллельно.
+    
+    Args:
+        file_paths: Пути к Excel файлам
+        workers: Число процессов (по умолчанию settings.PARSE_WORKERS)
+        
+    Returns:
+        Список словарей с данными о СТЕ в порядке файлов и листов
+    """
+    parser = ExcelParser()
+    return parser.parse_files(file_paths, workers)
+
+
+def iter_ste_file(
+    file_path: str,
+    batch_size: int = None,
+    use_cache: bool = None,
+    rebuild_cache: bool = False,
+    parser: Optional[ExcelParser] = None
+) -> Iterator[Any]:
+    """
+    Потоковый парсинг файла СТЕ: строки читаются по одной, весь лист в память не загружается.
+    При включенном кэше повторный вызов для того же файла читает кэш вместо Excel.
+    
+    Args:
+        file_path: Путь к Excel файлу
+        batch_size: Если указан - отдавать списки по batch_size СТЕ
+        use_cache: Использовать кэш разобранного файла (по умолчанию settings.PARSE_CACHE_ENABLED)
+        rebuild_cache: Разобрать файл заново и перезаписать кэш
+        parser: Парсер, в sheet_stats которого собирается статистика по листам
+            (при чтении из кэша она остается пустой)
+        
+    Returns:
+        Итератор словарей с данными о СТЕ (или их списков)
+    """
+    parser = parser or ExcelParser()
+    use_cache = settings.PARSE_CACHE_ENABLED if use_cache is None else use_cache
+    
+    if not use_cache:
+        return parser.iter_excel(file_path, batch_size)
+    
+    return _iter_cached(parser, Path(file_path), batch_size, rebuild_cache)
+
+
+def _iter_cached(parser: ExcelParser, file_path: Path, batch_size: Optional[int], rebuild_cache: bool) -> Iterator[Any]:
+    """
+    Отдает СТЕ из кэша (пачками из mmap), а при его отсутствии - из потокового парсера,
+    дописывая кэш по пачкам; запись кэша подменяется после последней строки.
+    """
+    cache = ParsedCatalogCache()
+    cached = None if rebuild_cache else cache.load(file_path, batch_size)
+    
+    if cached is not None:
+        rows = 0
+        for batch in cached:
+            rows += len(batch)
+            if batch_size is None:
+                yield from batch
+            else:
+                yield batch
+        logger.info("Загружено из кэша разобранных файлов: %s СТЕ", rows)
+        return
+    
+    writer = cache.writer(file_path)
+    try:
+        batch = []
+        for ste_data in parser.iter_excel(file_path):
+            batch.append(ste_data)
+            if batch_size is None:
+                yield ste_data
+            if len(batch) >= (batch_size or settings.IMPORT_BATCH_SIZE):
+                writer.append(batch)
+                if batch_size is not None:
+                    yield batch
+                batch = []
+        
+        writer.append(batch)
+        if batch and batch_size is not None:
+            yield batch
+    except BaseException:
+        # Разбор прерван (ошибка или потребитель закрыл генератор) - старая запись кэша остается
+        writer.abort()
+        raise
+    writer.commit()
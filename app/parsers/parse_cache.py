@@ -0,0 +1,291 @@
+"""
+Кэш разобранного каталога: повторный импорт того же файла не читает Excel
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+from app.config import settings
+from app.utils.columnar import ColumnSpool, DictionaryEncoder, decode_byte_strings, load_array
+from app.utils.file_lock import replace_directory
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+
+
+# Версия формата и разбора: при изменении парсера старые записи кэша не используются
+PARSE_CACHE_VERSION = 2
+
+MANIFEST_NAME = "manifest.json"
+
+
+def file_content_hash(file_path: Path) -> str:
+    """
+    SHA-1 содержимого файла.
+    
+    Args:
+        file_path: Путь к файлу
+    
+    Returns:
+        Хэш (hex)
+    """
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParsedCatalogCache:
+    """
+    Колоночный кэш результата parse_ste_file.
+    
+    Запись хранится в отдельном каталоге на каждый исходный файл: колонки СТЕ -
+    пулы байт UTF-8 со смещениями, характеристики - словарно-кодированные пары
+    (ключ, значение) со смещениями строк. Запись пишется и читается пачками:
+    массивы открываются через mmap, файл целиком в памяти не держится.
+    Запись действительна, если совпадают путь, размер и содержимое файла
+    (время изменения проверяется первым, хэш - если оно отличается) и версия кэша.
+    """
+    
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Инициализация кэша.
+        
+        Args:
+            directory: Каталог кэша (по умолчанию settings.PARSE_CACHE_DIR)
+        """
+        self.directory = Path(directory or settings.PARSE_CACHE_DIR)
+    
+    def entry_dir(self, file_path: Path) -> Path:
+        """Каталог записи кэша для исходного файла"""
+        key = hashlib.sha1(str(file_path.resolve()).encode("utf-8")).hexdigest()[:16]
+        return self.directory / key
+    
+    @staticmethod
+    def _file_key(file_path: Path) -> Dict[str, Any]:
+        """Путь, размер и время изменения файла"""
+        stat = file_path.stat()
+        return {
+            "path": str(file_path.resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+    
+    def _read_manifest(self, entry: Path) -> Optional[Dict[str, Any]]:
+        """Манифест записи или None, если записи нет"""
+        try:
+            with open(entry / MANIFEST_NAME, encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+    
+    def is_valid(self, file_path: Path) -> bool:
+        """
+        Проверяет, что запись кэша соответствует текущему файлу.
+        
+        Args:
+            file_path: Путь к исходному файлу
+        
+        Returns:
+            True, если кэш можно использовать
+        """
+        manifest = self._read_manifest(self.entry_dir(file_path))
+        if not manifest or manifest.get("version") != PARSE_CACHE_VERSION:
+            return False
+        
+        key = self._file_key(file_path)
+        if manifest["path"] != key["path"] or manifest["size"] != key["size"]:
+            return False
+        if manifest["mtime_ns"] == key["mtime_ns"]:
+            return True
+        # Файл перезаписан тем же содержимым - достаточно сверить хэш
+        return manifest["content_hash"] == file_content_hash(file_path)
+    
+    def load(self, file_path: Path, batch_size: Optional[int] = None) -> Optional[Iterator[List[Dict[str, Any]]]]:
+        """
+        Открывает разобранные СТЕ из кэша. Массивы отображаются в память (mmap),
+        словари СТЕ собираются по пачкам из срезов массивов - в памяти одна пачка
+        и таблицы уникальных ключей и значений характеристик.
+        
+        Args:
+            file_path: Путь к исходному файлу
+            batch_size: Число СТЕ в пачке (по умолчанию settings.IMPORT_BATCH_SIZE)
+        
+        Returns:
+            Итератор пачек словарей СТЕ (как у parse_ste_file) или None, если кэш недействителен
+        """
+        file_path = Path(file_path)
+        if not self.is_valid(file_path):
+            return None
+        
+        entry = self.entry_dir(file_path)
+        manifest = self._read_manifest(entry)
+        try:
+            fields = manifest["fields"]
+            columns = {
+                field: (
+                    load_array(entry, f"{field}.pool"),
+                    load_array(entry, f"{field}.offsets"),
+                    load_array(entry, f"{field}.nulls"),
+                )
+                for field in fields
+            }
+            keys = decode_byte_strings(load_array(entry, "char_keys.pool"), load_array(entry, "char_keys.offsets"))
+            values = decode_byte_strings(load_array(entry, "char_values.pool"), load_array(entry, "char_values.offsets"))
+            key_codes = load_array(entry, "char_key_codes")
+            value_codes = load_array(entry, "char_value_codes")
+            row_offsets = load_array(entry, "char_row_offsets")
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        
+        return self._iter_batches(
+            fields, columns, keys, values, key_codes, value_codes, row_offsets,
+            batch_size or settings.IMPORT_BATCH_SIZE
+        )
+    
+    @staticmethod
+    def _iter_batches(
+        fields: List[str],
+        columns: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+        keys: List[str],
+        values: List[str],
+        key_codes: np.ndarray,
+        value_codes: np.ndarray,
+        row_offsets: np.ndarray,
+        batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Пачки словарей СТЕ, декодированные из срезов массивов записи"""
+        rows = len(row_offsets) - 1
+        for start in range(0, rows, batch_size):
+            stop = min(start + batch_size, rows)
+            batch_columns = [
+                decode_byte_strings(pool, offsets, nulls, start, stop)
+                for pool, offsets, nulls in (columns[field] for field in fields)
+            ]
+            pair_start, pair_stop = int(row_offsets[start]), int(row_offsets[stop])
+            pair_keys = [keys[code] for code in key_codes[pair_start:pair_stop].tolist()]
+            pair_values = [values[code] for code in value_codes[pair_start:pair_stop].tolist()]
+            bounds = (row_offsets[start:stop + 1] - pair_start).tolist()
+            
+            batch = []
+            for index in range(stop - start):
+                ste_data = {field: column[index] for field, column in zip(fields, batch_columns)}
+                ste_data['characteristics'] = dict(zip(
+                    pair_keys[bounds[index]:bounds[index + 1]], pair_values[bounds[index]:bounds[index + 1]]
+                ))
+                batch.append(ste_data)
+            yield batch
+    
+    def writer(self, file_path: Path) -> "ParsedCatalogCacheWriter":
+        """
+        Начинает запись кэша для файла: СТЕ дописываются пачками по мере разбора.
+        
+        Args:
+            file_path: Путь к исходному файлу
+        
+        Returns:
+            Объект записи (commit подменяет старую запись, abort - отменяет запись)
+        """
+        return ParsedCatalogCacheWriter(self, Path(file_path))
+    
+    def save(self, file_path: Path, ste_list: List[Dict[str, Any]]) -> None:
+        """
+        Сохраняет уже разобранные СТЕ целиком.
+        
+        Args:
+            file_path: Путь к исходному файлу
+            ste_list: Список словарей СТЕ
+        """
+        writer = self.writer(file_path)
+        try:
+            writer.append(ste_list)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+    
+    def invalidate(self, file_path: Path) -> None:
+        """Удаляет запись кэша для файла"""
+        shutil.rmtree(self.entry_dir(Path(file_path)), ignore_errors=True)
+
+
+class ParsedCatalogCacheWriter:
+    """
+    Запись кэша разобранного файла по пачкам.
+    
+    Колонки дописываются в файлы временного каталога (ColumnSpool); в памяти растут
+    только таблицы уникальных ключей и значений характеристик. commit дописывает таблицы
+    и манифест и подменяет запись целиком - до этого читатели видят старую запись.
+    """
+    
+    def __init__(self, cache: ParsedCatalogCache, file_path: Path):
+        """
+        Инициализация записи.
+        
+        Args:
+            cache: Кэш
+            file_path: Путь к исходному файлу
+        """
+        self.cache = cache
+        self.file_path = file_path
+        self.entry = cache.entry_dir(file_path)
+        self.staging = self.entry.with_name(f"{self.entry.name}.tmp{os.getpid()}")
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.columns = ColumnSpool(self.staging)
+        self.fields: Optional[List[str]] = None
+        self.rows = 0
+        self._keys = DictionaryEncoder()
+        self._values = DictionaryEncoder()
+        for name in ("char_key_codes", "char_value_codes"):
+            self.columns.append(name, np.zeros(0, dtype=np.int32))
+        self.columns.append_lengths("char_row_offsets", [])
+    
+    def append(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Дописывает пачку разобранных СТЕ.
+        
+        Args:
+            batch: Словари СТЕ
+        """
+        if not batch:
+            return
+        if self.fields is None:
+            # Строковые поля СТЕ в порядке словаря парсера; characteristics хранятся отдельно
+            self.fields = [field for field in batch[0] if field != 'characteristics']
+        for field in self.fields:
+            self.columns.append_strings(field, [ste_data.get(field) for ste_data in batch])
+        
+        characteristics = [ste_data.get('characteristics') or {} for ste_data in batch]
+        self.columns.append(
+            "char_key_codes",
+            self._keys.encode([str(key) for chars in characteristics for key in chars])
+        )
+        self.columns.append(
+            "char_value_codes",
+            self._values.encode([str(value) for chars in characteristics for value in chars.values()])
+        )
+        self.columns.append_lengths("char_row_offsets", [len(chars) for chars in characteristics])
+        self.rows += len(batch)
+    
+    def commit(self) -> None:
+        """Дописывает таблицы и манифест и подменяет старую запись кэша"""
+        self.columns.append_strings("char_keys", self._keys.values)
+        self.columns.append_strings("char_values", self._values.values)
+        self.columns.finish()
+        
+        manifest = self.cache._file_key(self.file_path)
+        manifest.update({
+            "fields": self.fields or [],
+            "version": PARSE_CACHE_VERSION,
+            "content_hash": file_content_hash(self.file_path),
+            "rows": self.rows,
+        })
+        with open(self.staging / MANIFEST_NAME, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+        replace_directory(self.staging, self.entry)
+    
+    def abort(self) -> None:
+        """Отменяет запись (разбор прерван): старая запись кэша остается"""
+        self.columns.close()
+        shutil.rmtree(self.staging, ignore_errors=True)
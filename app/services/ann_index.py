@@ -0,0 +1,94 @@
+"""
+Приближенный поиск ближайших соседей (ANN) для объединения групп
+"""
+from typing import Tuple
+from scipy import sparse
+from app.config import settings
+from app.services.lexical_similarity import tfidf_pair_similarities, tfidf_reduce, tfidf_similarity_block
+import numpy as np
+
+
+def build_knn_graph(vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Строит kNN-граф по косинусной схожести.
+    
+    Для небольшого числа векторов используется точный поиск, для больших -
+    индекс HNSW или IVF (settings.ANN_INDEX_TYPE) на CPU.
+    
+    Args:
+        vectors: L2-нормализованные векторы (n x dim)
+        k: Число соседей на вектор (включая сам вектор)
+    
+    Returns:
+        Кортеж (схожести n x k, индексы соседей n x k); отсутствующие соседи имеют индекс -1
+    """
+    import faiss
+    
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    k = max(1, min(k, n))
+    
+    if n <= settings.ANN_EXACT_MAX_GROUPS:
+        index = faiss.IndexFlatIP(dim)
+    elif settings.ANN_INDEX_TYPE == "ivf":
+        nlist = max(1, int(settings.ANN_IVF_LISTS_FACTOR * np.sqrt(n)))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        # Обучаем кластеризацию на выборке: ~40 точек на список достаточно
+        rng = np.random.default_rng(0)
+        sample_size = min(n, nlist * 40)
+        index.train(vectors[rng.choice(n, sample_size, replace=False)])
+        index.nprobe = settings.ANN_IVF_NPROBE
+    else:
+        index = faiss.IndexHNSWFlat(dim, settings.ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = settings.ANN_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = max(settings.ANN_HNSW_EF_SEARCH, k)
+    
+    index.add(vectors)
+    similarities, neighbors = index.search(vectors, k)
+    return similarities, neighbors
+
+
+def build_sparse_knn_graph(vectors: sparse.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Строит kNN-граф по косинусной схожести разреженных векторов (TF-IDF).
+    
+    До settings.ANN_EXACT_MAX_GROUPS векторов соседи ищутся точно (блоками по
+    settings.SIMILARITY_BLOCK_SIZE строк). Для большего числа точный поиск
+    квадратичен, поэтому соседи-кандидаты ищутся индексом build_knn_graph по
+    векторам, сжатым TruncatedSVD, а схожести кандидатов пересчитываются точно
+    по TF-IDF - порог применяется к той же схожести, что и при точном поиске.
+    
+    Args:
+        vectors: L2-нормализованные разреженные векторы (n x dim)
+        k: Число соседей на вектор (включая сам вектор)
+    
+    Returns:
+        Кортеж (схожести n x k, индексы соседей n x k); при точном поиске соседи
+        по убыванию схожести, отсутствующие соседи имеют индекс -1
+    """
+    n = vectors.shape[0]
+    k = max(1, min(k, n))
+    
+    if n > settings.ANN_EXACT_MAX_GROUPS:
+        _, neighbors = build_knn_graph(tfidf_reduce(vectors), k)
+        neighbors = neighbors.astype(np.int64)
+        found = neighbors >= 0
+        rows = np.repeat(np.arange(n), k).reshape(n, k)
+        similarities = np.zeros((n, k), dtype=np.float32)
+        similarities[found] = tfidf_pair_similarities(vectors, rows[found], neighbors[found])
+        return similarities, neighbors
+    similarities = np.zeros((n, k), dtype=np.float32)
+    neighbors = np.full((n, k), -1, dtype=np.int64)
+    block_size = max(1, settings.SIMILARITY_BLOCK_SIZE)
+    
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = tfidf_similarity_block(vectors, start, stop)
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        neighbors[start:stop] = np.take_along_axis(top, order, axis=1)
+        similarities[start:stop] = np.take_along_axis(scores, order, axis=1)
+    
+    return similarities, neighbors
@@ -0,0 +1,107 @@
+"""
+Легкая загрузка СТЕ для группировки: только нужные колонки, по одной категории за раз
+"""
+from typing import Any, Dict, List, NamedTuple, Optional
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.database import STE
+
+
+# Категория СТЕ без category_id
+UNKNOWN_CATEGORY = "unknown"
+
+
+class CatalogRow(NamedTuple):
+    """Поля СТЕ, нужные для анализа характеристик и группировки (вместо ORM-объекта)"""
+    id: int
+    name: Optional[str]
+    manufacturer: Optional[str]
+    model: Optional[str]
+    category_id: Optional[str]
+    category_name: Optional[str]
+    characteristics: Optional[Dict[str, Any]]
+
+
+# Колонки в порядке полей CatalogRow; characteristics_raw, image_url, даты не читаются
+CATALOG_ROW_COLUMNS = (
+    STE.id, STE.name, STE.manufacturer, STE.model, STE.category_id, STE.category_name, STE.characteristics
+)
+
+
+def category_filter(category_id: str):
+    """
+    Условие отбора СТЕ категории.
+    
+    Args:
+        category_id: ID категории; UNKNOWN_CATEGORY - СТЕ без категории
+    
+    Returns:
+        Условие WHERE
+    """
+    if category_id == UNKNOWN_CATEGORY:
+        return or_(STE.category_id.is_(None), STE.category_id.in_(["", UNKNOWN_CATEGORY]))
+    return STE.category_id == category_id
+
+
+async def count_category_rows(
+    session: AsyncSession,
+    category_id: Optional[str] = None,
+    ste_ids: Optional[List[int]] = None
+) -> Dict[str, int]:
+    """
+    Число СТЕ по категориям (по индексу category_id, без чтения строк).
+    
+    Args:
+        session: Сессия БД
+        category_id: Фильтр по категории
+        ste_ids: Фильтр по ID СТЕ
+    
+    Returns:
+        {ID категории: число СТЕ} в порядке первой СТЕ категории
+    """
+    stmt = select(STE.category_id, func.count(), func.min(STE.id)).group_by(STE.category_id)
+    if category_id:
+        stmt = stmt.where(STE.category_id == category_id)
+    if ste_ids:
+        stmt = stmt.where(STE.id.in_(ste_ids))
+    
+    result = await session.execute(stmt)
+    sizes: Dict[str, int] = {}
+    first_ids: Dict[str, int] = {}
+    for cat_id, count, first_id in result.all():
+        cat_id = cat_id or UNKNOWN_CATEGORY
+        sizes[cat_id] = sizes.get(cat_id, 0) + count
+        first_ids[cat_id] = min(first_ids.get(cat_id, first_id), first_id)
+    
+    return {cat_id: sizes[cat_id] for cat_id in sorted(sizes, key=first_ids.get)}
+
+
+async def load_category_rows(
+    session: AsyncSession,
+    category_id: str,
+    ste_ids: Optional[List[int]] = None,
+    batch_size: Optional[int] = None
+) -> List[CatalogRow]:
+    """
+    Загружает СТЕ одной категории порциями (yield_per) в виде CatalogRow.
+    
+    Args:
+        session: Сессия БД
+        category_id: ID категории (UNKNOWN_CATEGORY - СТЕ без категории)
+        ste_ids: Фильтр по ID СТЕ
+        batch_size: Строк в порции (по умолчанию settings.GROUPING_LOAD_BATCH_SIZE)
+    
+    Returns:
+        Строки категории в порядке ID
+    """
+    stmt = select(*CATALOG_ROW_COLUMNS).where(category_filter(category_id)).order_by(STE.id)
+    if ste_ids:
+        stmt = stmt.where(STE.id.in_(ste_ids))
+    stmt = stmt.execution_options(yield_per=batch_size or settings.GROUPING_LOAD_BATCH_SIZE)
+    
+    result = await session.stream(stmt)
+    rows: List[CatalogRow] = []
+    async for partition in result.partitions():
+        rows.extend(CatalogRow._make(row) for row in partition)
+    return rows
@@ -0,0 +1,566 @@
+"""
+Колоночный снимок каталога СТЕ для группировки и анализа характеристик (только чтение, mmap)
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.database import STE
+from app.services.catalog_loader import CatalogRow, count_category_rows, load_category_rows
+from app.services.exact_match import CharacteristicPairs
+from app.utils.columnar import (
+    ColumnSpool, DictionaryEncoder, encode_strings, decode_strings, decode_byte_strings, save_arrays, load_array
+)
+from app.utils.file_lock import replace_directory
+import numpy as np
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+# Версия формата: снимок другой версии не используется (группировка читает БД)
+CATALOG_SNAPSHOT_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+# Строковые колонки CatalogRow, хранимые пулом байт со смещениями
+TEXT_FIELDS = ("name", "manufacturer", "model")
+
+
+async def catalog_fingerprint(session: AsyncSession) -> Dict[str, Any]:
+    """
+    Отпечаток таблицы СТЕ: меняется при добавлении, удалении и обновлении СТЕ
+    (импорт выставляет updated_at измененным СТЕ).
+    
+    Args:
+        session: Сессия БД
+    
+    Returns:
+        Словарь count, max_id, max_updated_at
+    """
+    result = await session.execute(select(func.count(STE.id), func.max(STE.id), func.max(STE.updated_at)))
+    count, max_id, max_updated_at = result.one()
+    return {
+        "count": count,
+        "max_id": max_id,
+        "max_updated_at": str(max_updated_at) if max_updated_at is not None else None,
+    }
+
+
+class CatalogSnapshot:
+    """
+    Открытый снимок каталога.
+    
+    СТЕ упорядочены по категориям (в порядке первой СТЕ категории), внутри категории -
+    по ID, поэтому категория - непрерывный диапазон строк [category_offsets[i], category_offsets[i + 1]).
+    Все массивы отображены на файлы (mmap): процессы-воркеры uvicorn и пула группировки,
+    открывшие один снимок, делят одни и те же страницы памяти. Таблицы ключей и значений
+    характеристик декодируются в строки один раз на процесс, при первом обращении.
+    """
+    
+    def __init__(self, directory: Path, manifest: Dict[str, Any]):
+        """
+        Открывает массивы снимка.
+        
+        Args:
+            directory: Каталог снимка
+            manifest: Манифест снимка
+        
+        Raises:
+            OSError, ValueError: если файлы снимка повреждены или отсутствуют
+        """
+        self.directory = directory
+        self.manifest = manifest
+        self.build_id = manifest["build_id"]
+        self.fingerprint = manifest["fingerprint"]
+        
+        self.ste_ids = load_array(directory, "ste_ids")
+        self.category_offsets = load_array(directory, "category_offsets")
+        self.category_codes = load_array(directory, "category_codes")
+        self.category_name_codes = load_array(directory, "category_name_codes")
+        self.text_columns = {
+            field: (
+                load_array(directory, f"{field}.pool"),
+                load_array(directory, f"{field}.offsets"),
+                load_array(directory, f"{field}.nulls"),
+            )
+            for field in TEXT_FIELDS
+        }
+        self.char_row_offsets = load_array(directory, "char_row_offsets")
+        self.char_key_codes = load_array(directory, "char_key_codes")
+        self.char_value_codes = load_array(directory, "char_value_codes")
+        self.char_nulls = load_array(directory, "char_nulls")
+        
+        # Таблицы категорий небольшие - декодируются сразу
+        self.categories: List[str] = decode_strings(
+            load_array(directory, "categories.pool"), load_array(directory, "categories.offsets")
+        )
+        self.category_index = {cat_id: index for index, cat_id in enumerate(self.categories)}
+        self.category_names: List[Optional[str]] = decode_strings(
+            load_array(directory, "category_names.pool"),
+            load_array(directory, "category_names.offsets"),
+            load_array(directory, "category_names.nulls")
+        )
+        self._keys: Optional[List[str]] = None
+        self._key_index: Optional[Dict[str, int]] = None
+        self._values: Optional[List[Any]] = None
+        self._value_keys: Optional[Tuple[List[str], np.ndarray]] = None
+    
+    @property
+    def rows(self) -> int:
+        """Число СТЕ в снимке"""
+        return len(self.ste_ids)
+    
+    @property
+    def keys(self) -> List[str]:
+        """Таблица ключей характеристик (декодируется при первом обращении)"""
+        if self._keys is None:
+            self._keys = decode_strings(
+                load_array(self.directory, "char_keys.pool"), load_array(self.directory, "char_keys.offsets")
+            )
+        return self._keys
+    
+    @property
+    def key_index(self) -> Dict[str, int]:
+        """Код ключа характеристики по ключу"""
+        if self._key_index is None:
+            self._key_index = {key: code for code, key in enumerate(self.keys)}
+        return self._key_index
+    
+    @property
+    def values(self) -> List[Any]:
+        """Таблица значений характеристик (нестроковые значения хранятся в JSON)"""
+        if self._values is None:
+            values = decode_strings(
+                load_array(self.directory, "char_values.pool"), load_array(self.directory, "char_values.offsets")
+            )
+            self._values = [
+                json.loads(value) if is_json else value
+                for value, is_json in zip(values, load_array(self.directory, "char_values.json").tolist())
+            ]
+        return self._values
+    
+    @property
+    def value_keys(self) -> Tuple[List[str], np.ndarray]:
+        """Значения характеристик в записи ключа группы (f"{value}") и маска пустых значений"""
+        if self._value_keys is None:
+            values = self.values
+            self._value_keys = (
+                [value if isinstance(value, str) else f"{value}" for value in values],
+                # Последний элемент - для кода MISSING
+                np.array([not value for value in values] + [True], dtype=bool)
+            )
+        return self._value_keys
+    
+    def category_range(self, category_id: str) -> Tuple[int, int]:
+        """
+        Диапазон строк категории.
+        
+        Args:
+            category_id: ID категории (UNKNOWN_CATEGORY - СТЕ без категории)
+        
+        Returns:
+            Кортеж (первая строка, строка за последней); (0, 0), если категории нет в снимке
+        """
+        index = self.category_index.get(category_id)
+        if index is None:
+            return 0, 0
+        return int(self.category_offsets[index]), int(self.category_offsets[index + 1])
+    
+    def _select_rows(self, start: int, stop: int, ste_ids: Optional[List[int]]) -> np.ndarray:
+        """Номера строк диапазона, отфильтрованные по ID СТЕ"""
+        rows = np.arange(start, stop)
+        if ste_ids and start < stop:
+            rows = rows[np.isin(self.ste_ids[start:stop], np.asarray(ste_ids, dtype=np.int64))]
+        return rows
+    
+    def category_sizes(self, category_id: Optional[str] = None, ste_ids: Optional[List[int]] = None) -> Dict[str, int]:
+        """
+        Число СТЕ по категориям - как count_category_rows, но без обращения к БД.
+        
+        Args:
+            category_id: Фильтр по категории
+            ste_ids: Фильтр по ID СТЕ
+        
+        Returns:
+            {ID категории: число СТЕ} в порядке первой СТЕ категории (пустые категории не входят)
+        """
+        categories = [category_id] if category_id else self.categories
+        sizes: Dict[str, int] = {}
+        first_ids: Dict[str, int] = {}
+        for cat_id in categories:
+            start, stop = self.category_range(cat_id)
+            rows = self._select_rows(start, stop, ste_ids)
+            if len(rows):
+                sizes[cat_id] = len(rows)
+                first_ids[cat_id] = int(self.ste_ids[rows[0]])
+        
+        return {cat_id: sizes[cat_id] for cat_id in sorted(sizes, key=first_ids.get)}
+    
+    def category_name(self, category_id: str, ste_ids: Optional[List[int]] = None) -> Optional[str]:
+        """
+        Название категории у первой (по ID) СТЕ категории.
+        
+        Args:
+            category_id: ID категории
+            ste_ids: Фильтр по ID СТЕ
+        
+        Returns:
+            Название или None, если в категории нет СТЕ (или у СТЕ нет названия категории)
+        """
+        rows = self._select_rows(*self.category_range(category_id), ste_ids)
+        if not len(rows):
+            return None
+        return self.category_names[int(self.category_name_codes[rows[0]])]
+    
+    def category_rows(self, category_id: str, ste_ids: Optional[List[int]] = None) -> List[CatalogRow]:
+        """
+        СТЕ категории - как load_category_rows, но из снимка.
+        
+        Args:
+            category_id: ID категории (UNKNOWN_CATEGORY - СТЕ без категории)
+            ste_ids: Фильтр по ID СТЕ
+        
+        Returns:
+            Строки категории в порядке ID
+        """
+        start, stop = self.category_range(category_id)
+        if start == stop:
+            return []
+        
+        columns = {
+            field: decode_byte_strings(pool, offsets, nulls, start, stop)
+            for field, (pool, offsets, nulls) in self.text_columns.items()
+        }
+        keys, values = self.keys, self.values
+        pair_start, pair_stop = int(self.char_row_offsets[start]), int(self.char_row_offsets[stop])
+        pair_keys = [keys[code] for code in self.char_key_codes[pair_start:pair_stop].tolist()]
+        pair_values = [values[code] for code in self.char_value_codes[pair_start:pair_stop].tolist()]
+        bounds = (self.char_row_offsets[start:stop + 1] - pair_start).tolist()
+        char_nulls = self.char_nulls[start:stop].tolist()
+        
+        ids = self.ste_ids[start:stop].tolist()
+        raw_category_ids = [self.categories[code] if code >= 0 else None for code in self.category_codes[start:stop].tolist()]
+        category_names = [self.category_names[code] for code in self.category_name_codes[start:stop].tolist()]
+        
+        rows = [
+            CatalogRow(
+                ids[index],
+                columns["name"][index],
+                columns["manufacturer"][index],
+                columns["model"][index],
+                raw_category_ids[index],
+                category_names[index],
+                None if char_nulls[index] else dict(zip(
+                    pair_keys[bounds[index]:bounds[index + 1]], pair_values[bounds[index]:bounds[index + 1]]
+                )),
+            )
+            for index in range(stop - start)
+        ]
+        if ste_ids:
+            selected = set(ste_ids)
+            rows = [row for row in rows if row.id in selected]
+        return rows
+    
+    def characteristic_pairs(self, category_id: str, ste_ids: Optional[List[int]] = None) -> CharacteristicPairs:
+        """
+        Характеристики СТЕ категории в кодах снимка - для группировки по точному совпадению
+        без словарей характеристик. Порядок СТЕ - как у category_rows.
+        
+        Args:
+            category_id: ID категории
+            ste_ids: Фильтр по ID СТЕ
+        
+        Returns:
+            Пары характеристик (коды ключей и значений - общие для всего снимка)
+        """
+        start, stop = self.category_range(category_id)
+        rows = self._select_rows(start, stop, ste_ids)
+        lengths = self.char_row_offsets[rows + 1] - self.char_row_offsets[rows]
+        row_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=row_offsets[1:])
+        # Номера пар выбранных СТЕ: начало пар каждой СТЕ плюс номер пары внутри нее
+        pair_index = np.repeat(self.char_row_offsets[rows] - row_offsets[:-1], lengths) + np.arange(row_offsets[-1])
+        values, skip_values = self.value_keys
+        return CharacteristicPairs(
+            row_offsets,
+            self.char_key_codes[pair_index].astype(np.int64),
+            self.char_value_codes[pair_index].astype(np.int64),
+            self.keys,
+            self.key_index,
+            values,
+            skip_values
+        )
+    
+    def characteristic_frequency(self, category_id: str) -> Tuple[Dict[str, int], int, int]:
+        """
+        Частота ключей характеристик в категории по кодам (без сборки словарей характеристик).
+        
+        Args:
+            category_id: ID категории
+        
+        Returns:
+            Кортеж ({ключ: число СТЕ с ключом} в порядке первого появления, число СТЕ
+            с характеристиками, число СТЕ в категории)
+        """
+        start, stop = self.category_range(category_id)
+        pair_start, pair_stop = int(self.char_row_offsets[start]), int(self.char_row_offsets[stop])
+        codes = self.char_key_codes[pair_start:pair_stop]
+        # Ключи внутри словаря СТЕ уникальны: число вхождений кода - число СТЕ с ключом
+        unique_codes, first_index, counts = np.unique(codes, return_index=True, return_counts=True)
+        order = np.argsort(first_index, kind="stable")
+        keys = self.keys
+        frequency = {keys[code]: count for code, count in zip(unique_codes[order].tolist(), counts[order].tolist())}
+        stes_with_chars = int(np.count_nonzero(np.diff(self.char_row_offsets[start:stop + 1])))
+        return frequency, stes_with_chars, stop - start
+
+
+class CatalogSnapshotStore:
+    """
+    Сборка и открытие снимка каталога.
+    
+    Снимок собирается после импорта (одним проходом по категориям через catalog_loader,
+    по категории за раз) во временном каталоге и подменяет старый целиком. Процесс держит открытым
+    последний прочитанный снимок и переоткрывает его, когда меняется build_id в манифесте.
+    Снимок используется, только если отпечаток таблицы СТЕ совпадает с записанным при сборке,
+    иначе группировка и анализ читают БД.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, enabled: Optional[bool] = None):
+        """
+        Инициализация хранилища.
+        
+        Args:
+            directory: Каталог снимка (по умолчанию settings.CATALOG_SNAPSHOT_DIR)
+            enabled: Использовать снимок (по умолчанию settings.CATALOG_SNAPSHOT_ENABLED)
+        """
+        self.directory = Path(directory or settings.CATALOG_SNAPSHOT_DIR)
+        self.enabled = settings.CATALOG_SNAPSHOT_ENABLED if enabled is None else enabled
+        self._snapshot: Optional[CatalogSnapshot] = None
+    
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Манифест снимка или None, если снимка нет"""
+        try:
+            with open(self.directory / MANIFEST_NAME, encoding="utf-8") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+    
+    def open(self) -> Optional[CatalogSnapshot]:
+        """
+        Открывает снимок (без проверки актуальности).
+        
+        Returns:
+            Снимок или None, если он выключен, отсутствует или другой версии
+        """
+        if not self.enabled:
+            return None
+        manifest = self._read_manifest()
+        if not manifest or manifest.get("version") != CATALOG_SNAPSHOT_VERSION:
+            self._snapshot = None
+            return None
+        if self._snapshot is not None and self._snapshot.build_id == manifest.get("build_id"):
+            return self._snapshot
+        try:
+            self._snapshot = CatalogSnapshot(self.directory, manifest)
+        except (OSError, ValueError, KeyError):
+            # Снимок подменяется другим процессом - читаем БД
+            self._snapshot = None
+        return self._snapshot
+    
+    async def get_fresh(self, session: AsyncSession) -> Optional[CatalogSnapshot]:
+        """
+        Снимок, соответствующий текущему содержимому таблицы СТЕ.
+        
+        Args:
+            session: Сессия БД
+        
+        Returns:
+            Снимок или None (нет снимка или СТЕ изменились после его сборки)
+        """
+        snapshot = self.open()
+        if snapshot is None:
+            return None
+        if snapshot.fingerprint != await catalog_fingerprint(session):
+            logger.warning("Снимок каталога %s устарел - группировка читает БД", self.directory)
+            return None
+        return snapshot
+    
+    async def build(self, session: AsyncSession) -> Optional[CatalogSnapshot]:
+        """
+        Собирает снимок из БД и подменяет им текущий. Категории читаются и кодируются
+        по одной: в памяти - СТЕ одной категории и таблицы уникальных значений.
+        
+        Args:
+            session: Сессия БД
+        
+        Returns:
+            Открытый новый снимок (None, если снимок выключен)
+        """
+        if not self.enabled:
+            return None
+        
+        fingerprint = await catalog_fingerprint(session)
+        categories = list(await count_category_rows(session))
+        
+        writer = CatalogSnapshotWriter(self.directory, categories)
+        try:
+            for cat_id in categories:
+                rows = await load_category_rows(session, cat_id)
+                # Кодирование и запись - в рабочем потоке, чтобы не блокировать event loop
+                await asyncio.to_thread(writer.append_category, rows)
+                del rows
+            manifest = await asyncio.to_thread(writer.commit, fingerprint)
+        except BaseException:
+            writer.abort()
+            raise
+        
+        logger.info(
+            "Снимок каталога собран: СТЕ %s, категорий %s, ключей %s, значений %s",
+            manifest["rows"], manifest["categories"], manifest["characteristic_keys"], manifest["characteristic_values"]
+        )
+        return self.open()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Состояние снимка для /health"""
+        manifest = self._read_manifest() if self.enabled else None
+        return {
+            "enabled": self.enabled,
+            "rows": manifest.get("rows") if manifest else None,
+            "categories": manifest.get("categories") if manifest else None,
+        }
+
+
+class CatalogSnapshotWriter:
+    """
+    Запись снимка по категориям: колонки дописываются в файлы временного каталога
+    (ColumnSpool), в памяти растут только таблицы уникальных названий категорий,
+    ключей и значений характеристик. commit подменяет снимок целиком.
+    """
+    
+    def __init__(self, directory: Path, categories: List[str]):
+        """
+        Начинает запись.
+        
+        Args:
+            directory: Каталог снимка
+            categories: ID категорий в порядке снимка (в этом же порядке передаются их СТЕ)
+        """
+        self.directory = directory
+        self.categories = categories
+        self.category_index = {cat_id: index for index, cat_id in enumerate(categories)}
+        self.category_offsets = [0]
+        self.staging = directory.with_name(f"{directory.name}.tmp{os.getpid()}")
+        shutil.rmtree(self.staging, ignore_errors=True)
+        self.columns = ColumnSpool(self.staging)
+        self._category_names = DictionaryEncoder()
+        self._keys = DictionaryEncoder()
+        self._values = DictionaryEncoder()
+        
+        # Колонки создаются сразу - снимок пустого каталога тоже открывается
+        self.columns.append("ste_ids", np.zeros(0, dtype=np.int64))
+        for name in ("category_codes", "category_name_codes", "char_key_codes", "char_value_codes"):
+            self.columns.append(name, np.zeros(0, dtype=np.int32))
+        self.columns.append("char_nulls", np.zeros(0, dtype=bool))
+        self.columns.append_lengths("char_row_offsets", [])
+        for field in TEXT_FIELDS:
+            self.columns.append_strings(field, [])
+    
+    @property
+    def rows(self) -> int:
+        """Число записанных СТЕ"""
+        return self.category_offsets[-1]
+    
+    def append_category(self, rows: List[CatalogRow]) -> None:
+        """
+        Кодирует и дописывает СТЕ очередной категории.
+        
+        Args:
+            rows: СТЕ категории в порядке ID
+        """
+        columns = self.columns
+        columns.append("ste_ids", np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)))
+        # Исходный category_id СТЕ - код в таблице категорий; -1 - пустой (категория unknown)
+        columns.append("category_codes", np.fromiter(
+            (self.category_index.get(row.category_id, -1) if row.category_id else -1 for row in rows),
+            dtype=np.int32,
+            count=len(rows)
+        ))
+        columns.append("category_name_codes", self._category_names.encode([row.category_name for row in rows]))
+        for field in TEXT_FIELDS:
+            columns.append_strings(field, [getattr(row, field) for row in rows])
+        
+        characteristics = [row.characteristics if isinstance(row.characteristics, dict) else None for row in rows]
+        columns.append("char_key_codes", self._keys.encode([
+            str(key) for chars in characteristics if chars for key in chars
+        ]))
+        # Нестроковые значения (числа, списки) сохраняются в JSON, чтобы вернуть их без изменений;
+        # первый символ - вид значения: s - строка, j - JSON
+        columns.append("char_value_codes", self._values.encode([
+            "s" + value if isinstance(value, str) else "j" + json.dumps(value, ensure_ascii=False)
+            for chars in characteristics if chars for value in chars.values()
+        ]))
+        columns.append_lengths("char_row_offsets", [len(chars) if chars else 0 for chars in characteristics])
+        columns.append("char_nulls", np.fromiter((chars is None for chars in characteristics), dtype=bool, count=len(rows)))
+        self.category_offsets.append(self.rows + len(rows))
+    
+    def commit(self, fingerprint: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Дописывает таблицы и манифест и подменяет снимок.
+        
+        Args:
+            fingerprint: Отпечаток таблицы СТЕ на момент начала сборки
+        
+        Returns:
+            Манифест нового снимка
+        """
+        self.columns.finish()
+        
+        category_names = self._category_names.values
+        keys = self._keys.values
+        values = self._values.values
+        arrays: Dict[str, np.ndarray] = {"category_offsets": np.array(self.category_offsets, dtype=np.int64)}
+        arrays["categories.pool"], arrays["categories.offsets"], _ = encode_strings(self.categories)
+        (
+            arrays["category_names.pool"], arrays["category_names.offsets"], arrays["category_names.nulls"]
+        ) = encode_strings(category_names)
+        arrays["char_keys.pool"], arrays["char_keys.offsets"], _ = encode_strings(keys)
+        arrays["char_values.json"] = np.fromiter((value[0] == "j" for value in values), dtype=bool, count=len(values))
+        arrays["char_values.pool"], arrays["char_values.offsets"], _ = encode_strings([value[1:] for value in values])
+        save_arrays(self.staging, arrays)
+        
+        manifest = {
+            "version": CATALOG_SNAPSHOT_VERSION,
+            "build_id": uuid.uuid4().hex,
+            "fingerprint": fingerprint,
+            "rows": self.rows,
+            "categories": len(self.categories),
+            "characteristic_keys": len(keys),
+            "characteristic_values": len(values),
+        }
+        with open(self.staging / MANIFEST_NAME, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+        
+        # Процессы, открывшие старый снимок, дочитывают его: файлы удаляются после закрытия mmap
+        replace_directory(self.staging, self.directory)
+        return manifest
+    
+    def abort(self) -> None:
+        """Отменяет сборку: текущий снимок остается"""
+        self.columns.close()
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+# Снимок каталога процесса
+catalog_snapshot_store = CatalogSnapshotStore()
+
+
+def get_catalog_snapshot_store() -> CatalogSnapshotStore:
+    """Получить хранилище снимка каталога процесса"""
+    return catalog_snapshot_store
@@ -1,11 +1,12 @@
 """
 Сервис для определения значимых характеристик категорий
 """
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Set, Iterable, Optional
 from collections import Counter
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models.database import STE, Category
+from app.config import settings
 import re
 
 
@@ -117,7 +118,9 @@ class CharacteristicAnalyzer:
         self,
         session: AsyncSession,
         category_id: str,
-        min_frequency: float = 0.3
+        min_frequency: float = 0.3,
+        rows: Optional[Iterable[Any]] = None,
+        snapshot: Optional[Any] = None
     ) -> List[str]:
         """
         Анализирует характеристики СТЕ в категории и определяет значимые.
@@ -126,42 +129,95 @@ class CharacteristicAnalyzer:
             session: Сессия БД
             category_id: ID категории
             min_frequency: Минимальная частота (0-1) для значимой характеристики
+            rows: Уже загруженные СТЕ всей категории (объекты с characteristics, например CatalogRow);
+                если не переданы - из БД читается только колонка characteristics
+            snapshot: Актуальный снимок каталога (CatalogSnapshot) - частоты считаются по кодам
+                ключей, без словарей характеристик и без обращения к БД
             
         Returns:
             Список значимых характеристик
         """
-        # Получаем все СТЕ категории
-        stmt = select(STE).where(STE.category_id == category_id)
-        result = await session.execute(stmt)
-        stes = result.scalars().all()
+        if snapshot is not None:
+            frequency, stes_with_chars, total_stes = snapshot.characteristic_frequency(category_id)
+            return self.select_by_frequency(frequency, stes_with_chars, total_stes, min_frequency)
+        
+        if rows is not None:
+            characteristics = [row.characteristics for row in rows]
+        else:
+            # Получаем характеристики всех СТЕ категории
+            stmt = (
+                select(STE.characteristics)
+                .where(STE.category_id == category_id)
+                .execution_options(yield_per=settings.GROUPING_LOAD_BATCH_SIZE)
+            )
+            result = await session.stream_scalars(stmt)
+            characteristics = [value async for value in result]
+        
+        return self.select_significant_characteristics(characteristics, min_frequency)
+    
+    def select_significant_characteristics(
+        self,
+        characteristics: List[Optional[Dict[str, Any]]],
+        min_frequency: float = 0.3
+    ) -> List[str]:
+        """
+        Определяет значимые характеристики по характеристикам всех СТЕ категории.
         
-        if not stes:
+        Args:
+            characteristics: Характеристики каждой СТЕ категории (None или пустой словарь - нет характеристик)
+            min_frequency: Минимальная частота (0-1) для значимой характеристики
+            
+        Returns:
+            Список значимых характеристик
+        """
+        if not characteristics:
             return []
         
         # Собираем все характеристики
         all_characteristics = []
         stes_with_chars = 0
-        for ste in stes:
-            if ste.characteristics and isinstance(ste.characteristics, dict) and len(ste.characteristics) > 0:
-                all_characteristics.append(ste.characteristics)
+        for ste_characteristics in characteristics:
+            if ste_characteristics and isinstance(ste_characteristics, dict) and len(ste_characteristics) > 0:
+                all_characteristics.append(ste_characteristics)
                 stes_with_chars += 1
         
+        # Подсчитываем частоту
+        frequency = self.calculate_characteristic_frequency(all_characteristics)
+        
+        return self.select_by_frequency(frequency, stes_with_chars, len(characteristics), min_frequency)
+    
+    def select_by_frequency(
+        self,
+        frequency: Dict[str, int],
+        stes_with_chars: int,
+        total_stes: int,
+        min_frequency: float = 0.3
+    ) -> List[str]:
+        """
+        Определяет значимые характеристики по частоте ключей в категории.
+        
+        Args:
+            frequency: {ключ: число СТЕ с этим ключом} в порядке первого появления
+            stes_with_chars: Число СТЕ с непустыми характеристиками
+            total_stes: Число СТЕ в категории
+            min_frequency: Минимальная частота (0-1) для значимой характеристики
+            
+        Returns:
+            Список значимых характеристик
+        """
         # Если у большинства СТЕ нет характеристик, возвращаем пустой список
         # или используем альтернативные признаки (название, производитель)
-        if not all_characteristics:
+        if not stes_with_chars:
             return []
         
         # Если характеристики есть менее чем у 50% СТЕ, понижаем порог
-        char_coverage = stes_with_chars / len(stes) if stes else 0
+        char_coverage = stes_with_chars / total_stes
         if char_coverage < 0.5:
             # Используем более низкий порог для значимости
             min_frequency = max(0.1, min_frequency * char_coverage)
         
-        # Подсчитываем частоту
-        frequency = self.calculate_characteristic_frequency(all_characteristics)
-        
         # Определяем порог (минимум 30% СТЕ должны иметь характеристику)
-        threshold = max(1, int(len(all_characteristics) * min_frequency))
+        threshold = max(1, int(stes_with_chars * min_frequency))
         
         # Фильтруем по частоте
         significant_chars = [
@@ -189,7 +245,10 @@ class CharacteristicAnalyzer:
         session: AsyncSession,
         category_id: str,
         category_name: str,
-        min_frequency: float = 0.3
+        min_frequency: float = 0.3,
+        refresh: bool = False,
+        rows: Optional[Iterable[Any]] = None,
+        snapshot: Optional[Any] = None
     ) -> List[str]:
         """
         Получает или создает список значимых характеристик для категории.
@@ -199,6 +258,9 @@ class CharacteristicAnalyzer:
             category_id: ID категории
             category_name: Название категории
             min_frequency: Минимальная частота
+            refresh: Пересчитать, даже если список уже сохранен (СТЕ категории изменились)
+            rows: Уже загруженные СТЕ всей категории (чтобы не читать категорию повторно)
+            snapshot: Актуальный снимок каталога (анализ по нему, без чтения СТЕ)
             
         Returns:
             Список значимых характеристик
@@ -208,12 +270,12 @@ class CharacteristicAnalyzer:
         result = await session.execute(stmt)
         category = result.scalar_one_or_none()
         
-        if category and category.significant_characteristics:
+        if category and category.significant_characteristics and not refresh:
             return category.significant_characteristics
         
         # Анализируем характеристики
         significant_chars = await self.analyze_category_characteristics(
-            session, category_id, min_frequency
+            session, category_id, min_frequency, rows=rows, snapshot=snapshot
         )
         
         # Сохраняем в БД
@@ -230,4 +292,38 @@ class CharacteristicAnalyzer:
         await session.commit()
         
         return significant_chars
+    
+    async def refresh_categories(
+        self,
+        session: AsyncSession,
+        category_ids: Iterable[str],
+        categories: Dict[str, str],
+        snapshot: Optional[Any] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Пересчитывает значимые характеристики категорий после импорта.
+        
+        Args:
+            session: Сессия БД
+            category_ids: Категории с новыми или измененными СТЕ
+            categories: Словарь {category_id: название} категорий из файла; категории,
+                из которых СТЕ только ушли, пропускаются
+            snapshot: Актуальный снимок каталога (анализ по нему, без чтения СТЕ)
+        
+        Returns:
+            Словарь {category_id: текст ошибки или None} по обработанным категориям
+        """
+        results: Dict[str, Optional[str]] = {}
+        for cat_id in category_ids:
+            if cat_id not in categories:
+                continue
+            try:
+                await self.get_or_create_category_significant_characteristics(
+                    session, cat_id, categories[cat_id], refresh=True, snapshot=snapshot
+                )
+                results[cat_id] = None
+            except Exception as e:
+                await session.rollback()
+                results[cat_id] = str(e)
+        return results
 
@@ -0,0 +1,251 @@
+"""
+Персистентный кэш embeddings текстов (названия СТЕ, представители групп)
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pathlib import Path
+from app.config import settings
+from app.services.embedding_store import EmbeddingStore, embedding_store as default_embedding_store
+import numpy as np
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+
+# Максимальное число параметров в одном запросе к SQLite
+LOOKUP_CHUNK_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    Кэш векторов в отдельном файле SQLite.
+    
+    Ключ - хэш нормализованного текста и названия модели, вектор хранится
+    в float32 без округления: векторы из кэша совпадают с только что посчитанными,
+    и решения объединения те же, что без кэша. Записи старого формата (float16)
+    не проходят проверку размерности и перезаписываются как промахи.
+    """
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        read_only: bool = False,
+        store: Optional[EmbeddingStore] = None
+    ):
+        """
+        Инициализация кэша.
+        
+        Args:
+            path: Путь к файлу кэша (по умолчанию settings.EMBEDDING_CACHE_PATH)
+            enabled: Включен ли кэш (по умолчанию settings.EMBEDDING_CACHE_ENABLED)
+            read_only: Не писать новые векторы в файл, а накапливать их в pending
+                (процессы-воркеры отдают их одному писателю через take_pending)
+            store: Хранилище векторов СТЕ, посчитанных заранее: найденные в нем тексты
+                не ищутся в кэше и не кодируются (None - не использовать). Векторы
+                хранилища округлены до float16 - решения у самого порога могут отличаться
+        """
+        self.path = path or settings.EMBEDDING_CACHE_PATH
+        self.enabled = settings.EMBEDDING_CACHE_ENABLED if enabled is None else enabled
+        self.read_only = read_only
+        self.store = store
+        self.pending: List[Tuple[List[bytes], np.ndarray, str]] = []
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """
+        Нормализует текст перед хэшированием и кодированием.
+        
+        Args:
+            text: Исходный текст
+        
+        Returns:
+            Текст в NFC с единичными пробелами
+        """
+        return " ".join(unicodedata.normalize("NFC", text or "").split())
+    
+    @staticmethod
+    def make_key(text: str, model_name: str) -> bytes:
+        """
+        Ключ кэша для уже нормализованного текста.
+        
+        Args:
+            text: Нормализованный текст
+            model_name: Название модели
+        
+        Returns:
+            SHA-1 от модели и текста
+        """
+        return hashlib.sha1(f"{model_name}\x00{text}".encode("utf-8")).digest()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает файл кэша при первом обращении"""
+        if self._connection is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key BLOB PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Батчевый поиск векторов по ключам.
+        
+        Args:
+            keys: Ключи кэша
+        
+        Returns:
+            Словарь {ключ: вектор float32} для найденных ключей
+        """
+        found = {}
+        if not keys:
+            return found
+        
+        with self._lock:
+            connection = self._connect()
+            for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+                chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for key, dim, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    if vector.shape[0] == dim:
+                        found[key] = vector
+        
+        return found
+    
+    def put_many(self, keys: List[bytes], vectors: np.ndarray, model_name: str) -> None:
+        """
+        Батчевая запись векторов.
+        
+        Args:
+            keys: Ключи кэша
+            vectors: Матрица векторов (len(keys) x dim)
+            model_name: Название модели
+        """
+        if not keys:
+            return
+        
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.read_only:
+            self.pending.append((list(keys), vectors, model_name))
+            return
+        
+        rows = [
+            (key, model_name, int(vector.shape[0]), vector.tobytes())
+            for key, vector in zip(keys, vectors)
+        ]
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            connection.commit()
+    
+    def take_pending(self) -> List[Tuple[List[bytes], np.ndarray, str]]:
+        """
+        Забирает векторы, накопленные в режиме read_only.
+        
+        Returns:
+            Список (ключи, векторы float32, модель) для put_many
+        """
+        pending, self.pending = self.pending, []
+        return pending
+    
+    def encode(
+        self,
+        texts: List[str],
+        model_name: str,
+        encoder: Callable[[List[str]], np.ndarray],
+        ste_ids: Optional[List[Optional[int]]] = None
+    ) -> np.ndarray:
+        """
+        Возвращает векторы текстов: из хранилища векторов, затем из кэша;
+        моделью кодируются только тексты, которых нет ни там, ни там.
+        
+        Args:
+            texts: Тексты
+            model_name: Название модели (часть ключа)
+            encoder: Функция батчевого кодирования списка текстов
+            ste_ids: ID СТЕ, если текст - название одной СТЕ (вектор читается
+                из хранилища по ID), иначе None; по одному на texts
+        
+        Returns:
+            Матрица векторов float32 (len(texts) x dim)
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        normalized = [self.normalize_text(text) for text in texts]
+        
+        if not self.enabled and self.store is None:
+            return np.asarray(encoder(normalized), dtype=np.float32)
+        
+        # Уникальные тексты в порядке первого появления
+        unique_keys: Dict[bytes, str] = {}
+        text_keys = []
+        for text in normalized:
+            key = self.make_key(text, model_name)
+            text_keys.append(key)
+            unique_keys.setdefault(key, text)
+        
+        vectors: Dict[bytes, np.ndarray] = {}
+        if self.store is not None:
+            if ste_ids is not None:
+                vectors = self.store.get_by_ids(ste_ids, text_keys, model_name)
+            vectors.update(self.store.get_many([key for key in unique_keys if key not in vectors], model_name))
+        missing = [key for key in unique_keys if key not in vectors]
+        if self.enabled:
+            vectors.update(self.get_many(missing))
+            cached = len(missing)
+            missing = [key for key in missing if key not in vectors]
+            self.hits += cached - len(missing)
+            self.misses += len(missing)
+        
+        if missing:
+            encoded = np.asarray(
+                encoder([unique_keys[key] for key in missing]), dtype=np.float32
+            )
+            if self.enabled:
+                self.put_many(missing, encoded, model_name)
+            vectors.update(zip(missing, encoded))
+        
+        return np.stack([vectors[key] for key in text_keys]).astype(np.float32)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша для /health"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+# Кэш процесса (с хранилищем векторов СТЕ из scripts/build_embeddings.py)
+embedding_cache = EmbeddingCache(store=default_embedding_store)
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Получить кэш embeddings процесса"""
+    return embedding_cache
@@ -0,0 +1,352 @@
+"""
+Хранилище векторов названий СТЕ, посчитанных заранее (scripts/build_embeddings.py): матрица float16,
+выровненная по STE.id, в файлах .npy, которые сервис открывает через mmap
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from app.config import settings
+import numpy as np
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+# Версия формата: хранилище другой версии не используется и пересобирается
+EMBEDDING_STORE_VERSION = 2
+
+MANIFEST_NAME = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+KEYS_FILE = "keys.npy"
+LOOKUP_KEYS_FILE = "lookup_keys.npy"
+LOOKUP_ROWS_FILE = "lookup_rows.npy"
+
+# Ключ текста - SHA-1 (EmbeddingCache.make_key); пустой ключ - у строки нет вектора
+KEY_DTYPE = "S20"
+
+def _lookup(sorted_keys: np.ndarray, sorted_rows: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    Строки хранилища по ключам текстов (бинарный поиск по отсортированным ключам).
+    
+    Returns:
+        Номер строки для каждого ключа, -1 - ключа нет
+    """
+    if not len(sorted_keys) or not len(keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_keys, keys)
+    clipped = np.minimum(positions, len(sorted_keys) - 1)
+    found = (positions < len(sorted_keys)) & (sorted_keys[clipped] == keys)
+    return np.where(found, sorted_rows[clipped], -1)
+
+
+class EmbeddingStore:
+    """
+    Векторы СТЕ в каталоге EMBEDDING_STORE_DIR.
+    
+    Строка i матриц vectors.npy и keys.npy соответствует СТЕ с id = i: вектор ее названия
+    и ключ названия, по которому он посчитан (пустой - вектора нет). Группировка читает
+    векторы групп из одной СТЕ по ее id (get_by_ids), остальные тексты ищутся по ключу
+    (get_many: отсортированные ключи и номера их строк). Тексты групп из нескольких СТЕ
+    (первые названия через пробел) в хранилище не попадают - их векторы дает кэш embeddings.
+    Скрипт сборки пишет векторы на месте и отмечает в manifest.json незавершенную сборку -
+    сервис в это время хранилищем не пользуется.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, enabled: Optional[bool] = None):
+        """
+        Инициализация хранилища.
+        
+        Args:
+            directory: Каталог хранилища (по умолчанию settings.EMBEDDING_STORE_DIR)
+            enabled: Использовать ли хранилище (по умолчанию settings.EMBEDDING_STORE_ENABLED)
+        """
+        self.directory = Path(directory or settings.EMBEDDING_STORE_DIR)
+        self.enabled = settings.EMBEDDING_STORE_ENABLED if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._build_id: Optional[str] = None
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self.hits = 0
+    
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Манифест хранилища или None, если хранилища нет или оно другой версии"""
+        try:
+            with open(self.directory / MANIFEST_NAME, encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != EMBEDDING_STORE_VERSION:
+            return None
+        return manifest
+    
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        """Атомарно подменяет manifest.json"""
+        staging = self.directory / f"{MANIFEST_NAME}.tmp{os.getpid()}"
+        with open(staging, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+        os.replace(staging, self.directory / MANIFEST_NAME)
+    
+    def _open_lookup(self, model_name: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Массивы для поиска: отсортированные ключи, их строки, векторы и ключи строк.
+        Открываются заново, если с прошлого обращения хранилище пересобрано.
+        
+        Returns:
+            Кортеж массивов mmap или None, если хранилища нет, оно собирается
+            или посчитано другой моделью
+        """
+        manifest = self._read_manifest()
+        if manifest is None or not manifest.get("complete") or manifest.get("model") != model_name:
+            return None
+        
+        with self._lock:
+            if self._build_id != manifest["build_id"]:
+                try:
+                    self._arrays = (
+                        np.load(self.directory / LOOKUP_KEYS_FILE, mmap_mode="r"),
+                        np.load(self.directory / LOOKUP_ROWS_FILE, mmap_mode="r"),
+                        np.load(self.directory / VECTORS_FILE, mmap_mode="r"),
+                        np.load(self.directory / KEYS_FILE, mmap_mode="r"),
+                    )
+                except (OSError, ValueError) as e:
+                    logger.warning("Не удалось открыть хранилище векторов %s: %s", self.directory, e)
+                    return None
+                self._build_id = manifest["build_id"]
+            return self._arrays
+    
+    def get_many(self, keys: List[bytes], model_name: str) -> Dict[bytes, np.ndarray]:
+        """
+        Векторы текстов по ключам кэша embeddings (EmbeddingCache.make_key).
+        
+        Args:
+            keys: Ключи текстов
+            model_name: Название модели (вектора другой модели не отдаются)
+        
+        Returns:
+            Словарь {ключ: вектор float16} для найденных ключей
+        """
+        if not self.enabled or not keys:
+            return {}
+        arrays = self._open_lookup(model_name)
+        if arrays is None:
+            return {}
+        
+        lookup_keys, lookup_rows, vectors, _ = arrays
+        rows = _lookup(lookup_keys, lookup_rows, np.array(keys, dtype=KEY_DTYPE))
+        found = np.flatnonzero(rows >= 0)
+        matrix = np.asarray(vectors[rows[found]])
+        self.hits += len(found)
+        return dict(zip((keys[index] for index in found.tolist()), matrix))
+    
+    def get_by_ids(self, ste_ids: List[Optional[int]], keys: List[bytes], model_name: str) -> Dict[bytes, np.ndarray]:
+        """
+        Векторы названий СТЕ по их ID - строки матрицы без поиска по ключу.
+        Вектор отдается, только если ключ строки совпадает с ключом текста
+        (название не менялось после сборки хранилища).
+        
+        Args:
+            ste_ids: ID СТЕ, чье название - текст (None - текст не название одной СТЕ)
+            keys: Ключи текстов (EmbeddingCache.make_key), по одному на ste_ids
+            model_name: Название модели
+        
+        Returns:
+            Словарь {ключ: вектор float16} для найденных текстов
+        """
+        if not self.enabled or not keys:
+            return {}
+        arrays = self._open_lookup(model_name)
+        if arrays is None:
+            return {}
+        
+        _, _, vectors, row_keys = arrays
+        positions = [
+            index for index, ste_id in enumerate(ste_ids)
+            if ste_id is not None and 0 <= ste_id < len(row_keys)
+        ]
+        if not positions:
+            return {}
+        rows = np.array([ste_ids[index] for index in positions], dtype=np.int64)
+        wanted = np.array([keys[index] for index in positions], dtype=KEY_DTYPE)
+        found = np.flatnonzero(np.asarray(row_keys[rows]) == wanted)
+        matrix = np.asarray(vectors[rows[found]])
+        self.hits += len(found)
+        return dict(zip((keys[positions[index]] for index in found.tolist()), matrix))
+    
+    def prepare(
+        self,
+        model_name: str,
+        dimension: int,
+        capacity: int,
+        rebuild: bool = False
+    ) -> "EmbeddingStoreWriter":
+        """
+        Открывает хранилище для записи (скрипт сборки). Хранилище другой модели или размерности
+        собирается заново; если СТЕ с большими ID не помещаются - матрицы растут.
+        До finalize сервис хранилищем не пользуется.
+        
+        Args:
+            model_name: Название модели (как в ключах кэша embeddings)
+            dimension: Размерность векторов
+            capacity: Нужное число строк (максимальный ID СТЕ + 1)
+            rebuild: Собрать заново, даже если хранилище подходит
+        
+        Returns:
+            Объект записи векторов
+        """
+        manifest = self._read_manifest()
+        compatible = (
+            manifest is not None and not rebuild
+            and manifest.get("model") == model_name
+            and manifest.get("dimension") == dimension
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if compatible:
+            manifest["complete"] = False
+            self._write_manifest(manifest)
+        else:
+            # Сначала отмечаем хранилище незавершенным, затем удаляем старые матрицы
+            manifest = {
+                "version": EMBEDDING_STORE_VERSION,
+                "model": model_name,
+                "dimension": dimension,
+                "dtype": "float16",
+                "complete": False,
+            }
+            self._write_manifest(manifest)
+            for name in (VECTORS_FILE, KEYS_FILE):
+                (self.directory / name).unlink(missing_ok=True)
+        
+        vectors_path = self.directory / VECTORS_FILE
+        keys_path = self.directory / KEYS_FILE
+        if not vectors_path.exists() or not keys_path.exists():
+            np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float16, shape=(capacity, dimension)).flush()
+            np.lib.format.open_memmap(keys_path, mode="w+", dtype=KEY_DTYPE, shape=(capacity,)).flush()
+        else:
+            stored_rows = np.load(keys_path, mmap_mode="r").shape[0]
+            if stored_rows < capacity:
+                self._grow(vectors_path, (capacity, dimension), np.float16)
+                self._grow(keys_path, (capacity,), KEY_DTYPE)
+        
+        return EmbeddingStoreWriter(self, manifest)
+    
+    @staticmethod
+    def _grow(path: Path, shape: Tuple[int, ...], dtype: Any) -> None:
+        """Копирует матрицу в файл большего размера (новые строки нулевые) и подменяет ее"""
+        old = np.load(path, mmap_mode="r")
+        staging = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        new = np.lib.format.open_memmap(staging, mode="w+", dtype=dtype, shape=shape)
+        new[:old.shape[0]] = old
+        new.flush()
+        del new, old
+        os.replace(staging, path)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Состояние хранилища для /health"""
+        manifest = self._read_manifest() if self.enabled else None
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.directory),
+            "model": manifest.get("model") if manifest else None,
+            "complete": manifest.get("complete") if manifest else None,
+            "vectors": manifest.get("vectors") if manifest else None,
+            "hits": self.hits,
+        }
+
+
+class EmbeddingStoreWriter:
+    """Запись векторов в открытое на запись хранилище (scripts/build_embeddings.py)"""
+    
+    def __init__(self, store: EmbeddingStore, manifest: Dict[str, Any]):
+        self.store = store
+        self.manifest = manifest
+        self.vectors = np.load(store.directory / VECTORS_FILE, mmap_mode="r+")
+        self.keys = np.load(store.directory / KEYS_FILE, mmap_mode="r+")
+    
+    def pending(self, ste_ids: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """
+        Маска СТЕ, вектор которых нужно посчитать: новых, с измененным текстом
+        или не дописанных прерванной сборкой.
+        
+        Args:
+            ste_ids: ID СТЕ
+            keys: Ключи их текстов (пустой - текста нет)
+        
+        Returns:
+            Маска по ste_ids
+        """
+        return (keys != b"") & (self.keys[ste_ids] != keys)
+    
+    def find(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Строки, где уже есть вектор текста с таким ключом (одинаковые названия у разных СТЕ).
+        
+        Returns:
+            Номер строки для каждого ключа, -1 - такого текста еще нет
+        """
+        rows = np.flatnonzero(self.keys != b"")
+        stored = np.asarray(self.keys[rows])
+        order = np.argsort(stored, kind="stable")
+        return _lookup(stored[order], rows[order], keys)
+    
+    def write(self, ste_ids: np.ndarray, keys: np.ndarray, vectors: np.ndarray) -> None:
+        """
+        Записывает векторы строк. Ключи сбрасываются на диск после векторов: строка,
+        прерванная посередине, при следующем запуске считается заново.
+        
+        Args:
+            ste_ids: ID СТЕ (строки)
+            keys: Ключи их текстов
+            vectors: Векторы (len(ste_ids) x dim)
+        """
+        self.vectors[ste_ids] = np.asarray(vectors, dtype=np.float16)
+        self.vectors.flush()
+        self.keys[ste_ids] = keys
+        self.keys.flush()
+    
+    def finalize(self, ste_ids: np.ndarray) -> Dict[str, Any]:
+        """
+        Завершает сборку: стирает векторы удаленных СТЕ, сохраняет индекс поиска по тексту
+        и отмечает хранилище готовым.
+        
+        Args:
+            ste_ids: ID всех СТЕ каталога
+        
+        Returns:
+            Манифест хранилища
+        """
+        removed = np.ones(len(self.keys), dtype=bool)
+        removed[ste_ids] = False
+        removed &= self.keys != b""
+        if removed.any():
+            self.keys[removed] = b""
+            self.keys.flush()
+        
+        rows = np.flatnonzero(self.keys != b"")
+        stored = np.asarray(self.keys[rows])
+        order = np.argsort(stored, kind="stable")
+        directory = self.store.directory
+        for name, array in ((LOOKUP_KEYS_FILE, stored[order]), (LOOKUP_ROWS_FILE, rows[order].astype(np.int64))):
+            staging = directory / f"{name}.tmp{os.getpid()}.npy"
+            np.save(staging, array)
+            os.replace(staging, directory / name)
+        
+        self.manifest.update({
+            "complete": True,
+            "build_id": uuid.uuid4().hex,
+            "rows": int(len(self.keys)),
+            "vectors": int(len(rows)),
+            "removed": int(removed.sum()),
+        })
+        self.store._write_manifest(self.manifest)
+        return self.manifest
+
+
+# Хранилище процесса
+embedding_store = EmbeddingStore()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """Получить хранилище векторов процесса"""
+    return embedding_store
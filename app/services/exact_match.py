@@ -0,0 +1,224 @@
+"""
+Группировка СТЕ по точному совпадению ключа на целочисленных кодах значений
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+
+# Нет значения признака в ключе СТЕ
+MISSING = -1
+
+# Словарь характеристик для СТЕ без характеристик
+_EMPTY: Dict[str, Any] = {}
+
+
+class CharacteristicPairs(NamedTuple):
+    """Характеристики СТЕ в кодах: пары (ключ, значение) всех СТЕ подряд"""
+    row_offsets: np.ndarray  # Границы пар каждой СТЕ (длина n + 1)
+    key_codes: np.ndarray  # Код ключа каждой пары
+    value_codes: np.ndarray  # Код значения каждой пары
+    keys: List[str]  # Ключ по коду
+    key_index: Dict[str, int]  # Код по ключу
+    values: List[str]  # Значение по коду в записи ключа группы (f"{value}")
+    skip_values: np.ndarray  # По коду: значение пустое и не входит в ключ
+
+
+def _object_array(items: Sequence[Any]) -> np.ndarray:
+    """
+    Одномерный массив объектов: каждый элемент присваивается отдельно, поэтому
+    значения-списки (в том числе одной длины или пустые) остаются элементами, а не измерениями.
+    """
+    return np.fromiter(items, dtype=object, count=len(items))
+
+
+def _factorize(values: Sequence[Optional[Any]]) -> Tuple[np.ndarray, list]:
+    """
+    Коды значений колонки в порядке первого появления.
+    
+    Args:
+        values: Значения (None - нет значения)
+    
+    Returns:
+        Кортеж (коды int64, MISSING для None; уникальные значения)
+    """
+    if not isinstance(values, np.ndarray):
+        values = _object_array(values)
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    return codes.astype(np.int64, copy=False), list(uniques)
+
+
+def _combine(group_ids: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """
+    Номер сочетания (группа, код): группы нумеруются в порядке первого появления,
+    значения остаются меньше n * (число кодов + 1) и не переполняют int64.
+    """
+    combined = group_ids * (int(codes.max(initial=MISSING)) + 2) + (codes + 1)
+    return pd.factorize(combined)[0]
+
+
+def characteristic_pairs(stes: Sequence[Any]) -> CharacteristicPairs:
+    """
+    Кодирует характеристики СТЕ: пары всех СТЕ разворачиваются в плоские списки
+    одним проходом, ключи и значения кодируются целиком.
+    
+    Args:
+        stes: СТЕ с characteristics (не словарь - нет характеристик)
+    
+    Returns:
+        Пары характеристик в кодах
+    """
+    dicts = [
+        ste.characteristics if ste.characteristics and isinstance(ste.characteristics, dict) else _EMPTY
+        for ste in stes
+    ]
+    row_offsets = np.zeros(len(dicts) + 1, dtype=np.int64)
+    np.cumsum([len(char_dict) for char_dict in dicts], out=row_offsets[1:])
+    keys = _object_array(list(chain.from_iterable(char_dict.keys() for char_dict in dicts)))
+    values = _object_array(list(chain.from_iterable(char_dict.values() for char_dict in dicts)))
+    
+    if len(values) and pd.api.types.infer_dtype(values, skipna=False) != "string":
+        # Значение входит в ключ как f"{value}"; ложные нестроковые значения (0, [], None) не входят
+        values = _object_array(
+            [value if value.__class__ is str else (f"{value}" if value else None) for value in values]
+        )
+    value_codes, value_table = _factorize(values)
+    key_codes, key_table = _factorize(keys)
+    # Код MISSING (None) указывает на последний элемент skip_values
+    skip_values = np.array([value == "" for value in value_table] + [True], dtype=bool)
+    key_index = {key: code for code, key in enumerate(key_table)}
+    return CharacteristicPairs(row_offsets, key_codes, value_codes, key_table, key_index, value_table, skip_values)
+
+
+def _characteristic_columns(pairs: CharacteristicPairs, significant_chars: List[str], n: int) -> List[np.ndarray]:
+    """
+    Коды значений значимых характеристик каждой СТЕ: пары раскладываются по колонкам операциями numpy.
+    
+    Args:
+        pairs: Пары характеристик в кодах
+        significant_chars: Значимые характеристики
+        n: Число СТЕ
+    
+    Returns:
+        Колонка кодов значений на каждую значимую характеристику (MISSING - нет значения или оно пустое)
+    """
+    char_codes = [pairs.key_index.get(char, MISSING) for char in significant_chars]
+    # Номер колонки по коду ключа (повторы характеристики в списке читают одну колонку)
+    column_of_key = np.full(len(pairs.keys) + 1, MISSING, dtype=np.int64)
+    for column, code in reversed(list(enumerate(char_codes))):
+        if code != MISSING:
+            column_of_key[code] = column
+    
+    matrix = np.full((n, max(len(significant_chars), 1)), MISSING, dtype=np.int64)
+    pair_rows = np.repeat(np.arange(n), np.diff(pairs.row_offsets))
+    pair_columns = column_of_key[pairs.key_codes]
+    selected = (pair_columns != MISSING) & ~pairs.skip_values[pairs.value_codes]
+    matrix[pair_rows[selected], pair_columns[selected]] = pairs.value_codes[selected]
+    
+    return [
+        matrix[:, column_of_key[code]] if code != MISSING else np.full(n, MISSING, dtype=np.int64)
+        for code in char_codes
+    ]
+
+
+def group_by_exact_match(
+    stes: Sequence[Any],
+    significant_chars: List[str],
+    pairs: Optional[CharacteristicPairs] = None
+) -> Dict[str, List[Any]]:
+    """
+    Группирует СТЕ по ключу из значимых характеристик - то же, что ключ
+    GroupingService._extract_grouping_key для каждой СТЕ, но без сборки строк на каждую СТЕ.
+    
+    Значения каждой характеристики и запасных признаков (производитель, модель,
+    начало названия - для СТЕ, у которых меньше двух значимых характеристик)
+    кодируются целыми числами, СТЕ группируются по сочетанию кодов. Строковый ключ
+    собирается один раз на группу; группы с совпавшими строками (например, 1 и "1")
+    объединяются, поэтому результат совпадает с группировкой по строковому ключу.
+    
+    Args:
+        stes: СТЕ (CatalogRow или объекты с name, manufacturer, model, characteristics)
+        significant_chars: Значимые характеристики
+        pairs: Характеристики stes в кодах (например, из снимка каталога);
+            если не переданы - кодируются из словарей characteristics
+    
+    Returns:
+        Словарь {ключ_группы: [СТЕ]} в порядке первой СТЕ группы; СТЕ внутри группы - в исходном порядке
+    """
+    n = len(stes)
+    if n == 0:
+        return {}
+    if pairs is None:
+        pairs = characteristic_pairs(stes)
+    
+    # Части ключа в порядке: характеристики, manufacturer, model, name_prefix
+    labels: List[str] = list(significant_chars)
+    columns = _characteristic_columns(pairs, significant_chars, n)
+    tables: List[List[str]] = [pairs.values] * len(columns)
+    
+    parts_count = np.zeros(n, dtype=np.int64)
+    for codes in columns:
+        parts_count += codes != MISSING
+    
+    # Запасные признаки - только у СТЕ, где значимых характеристик меньше двух
+    fallback = parts_count < 2
+    fallback_rows = np.flatnonzero(fallback).tolist()
+    for field in ("manufacturer", "model"):
+        codes = np.full(n, MISSING, dtype=np.int64)
+        table: List[str] = []
+        if fallback_rows:
+            codes[fallback_rows], table = _factorize([getattr(stes[index], field) or None for index in fallback_rows])
+        parts_count += codes != MISSING
+        labels.append(field)
+        columns.append(codes)
+        tables.append(table)
+    
+    name_rows = np.flatnonzero(fallback & (parts_count < 2)).tolist()
+    name_codes = np.full(n, MISSING, dtype=np.int64)
+    name_table: List[str] = []
+    if name_rows:
+        prefixes = []
+        for index in name_rows:
+            name = stes[index].name
+            # Первые слова названия (до 3 слов)
+            prefixes.append(" ".join(name.split()[:3]) or None if name else None)
+        name_codes[name_rows], name_table = _factorize(prefixes)
+    labels.append("name_prefix")
+    columns.append(name_codes)
+    tables.append(name_table)
+    
+    # Номер группы - сочетание кодов всех частей ключа
+    group_ids = np.zeros(n, dtype=np.int64)
+    for codes in columns:
+        group_ids = _combine(group_ids, codes)
+    
+    order = np.argsort(group_ids, kind="stable")
+    bounds = np.zeros(int(group_ids.max()) + 2, dtype=np.int64)
+    np.cumsum(np.bincount(group_ids), out=bounds[1:])
+    
+    # Строка ключа - по первой СТЕ каждой группы
+    first_codes = np.column_stack(columns)[order[bounds[:-1]]].tolist()
+    parts = list(zip(labels, tables))
+    
+    groups: Dict[str, List[int]] = {}
+    merged = False
+    for group, codes in enumerate(first_codes):
+        key_parts = [
+            f"{label}={table[code]}"
+            for (label, table), code in zip(parts, codes)
+            if code != MISSING
+        ]
+        key = ";".join(sorted(key_parts)) if key_parts else "no_characteristics"
+        members = order[bounds[group]:bounds[group + 1]].tolist()
+        if key in groups:
+            groups[key].extend(members)
+            merged = True
+        else:
+            groups[key] = members
+    
+    if merged:
+        # Совпавшие строки ключей разных сочетаний кодов: восстанавливаем исходный порядок СТЕ
+        groups = {key: sorted(members) for key, members in groups.items()}
+    
+    return {key: [stes[index] for index in members] for key, members in groups.items()}
@@ -0,0 +1,345 @@
+"""
+Фоновые задачи группировки СТЕ с отчетом о прогрессе и отменой
+"""
+from typing import Any, Dict, List, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from datetime import datetime
+from app.config import settings
+from app.database.base import AsyncSessionLocal
+from app.models.schemas import GroupingRequest
+from app.services.grouping_service import GroupingService
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Сколько завершенных задач хранить для GET /grouping/jobs/{job_id}
+MAX_FINISHED_JOBS = 50
+
+
+class GroupingJobFinishedError(Exception):
+    """Задача уже завершена и не может быть отменена"""
+    
+    def __init__(self, job_id: str, status: str):
+        super().__init__(f"Задача группировки {job_id} уже завершена (статус {status})")
+        self.job_id = job_id
+        self.status = status
+
+
+class GroupingJob:
+    """Состояние одной задачи группировки"""
+    
+    def __init__(self, request: GroupingRequest):
+        """
+        Инициализация задачи.
+        
+        Args:
+            request: Параметры группировки
+        """
+        self.job_id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.categories: List[str] = []
+        self.category_sizes: Dict[str, int] = {}
+        self.categories_done = 0
+        self._done_categories: Set[str] = set()
+        self.stes_total: Optional[int] = None
+        self.stes_done = 0
+        self.total_items = 0
+        self.aggregation_ids: List[int] = []
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started: Optional[float] = None
+    
+    @property
+    def is_finished(self) -> bool:
+        """Завершена ли задача (успешно, с ошибкой или отменена)"""
+        return self.status in ("completed", "failed", "cancelled")
+    
+    @property
+    def current_category(self) -> Optional[str]:
+        """Первая по порядку категория, которая еще группируется"""
+        if self.status != "running":
+            return None
+        return next((category_id for category_id in self.categories if category_id not in self._done_categories), None)
+    
+    @property
+    def progress(self) -> Optional[float]:
+        """Доля обработанных СТЕ"""
+        if self.status == "completed":
+            return 1.0
+        if not self.stes_total:
+            return None
+        return round(self.stes_done / self.stes_total, 4)
+    
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Оценка оставшегося времени по средней скорости обработки СТЕ"""
+        if self.status != "running" or self._started is None or not self.stes_done or self.stes_total is None:
+            return None
+        elapsed = time.perf_counter() - self._started
+        return round(elapsed / self.stes_done * (self.stes_total - self.stes_done), 1)
+    
+    def start(self) -> None:
+        """Отмечает начало выполнения"""
+        self.status = "running"
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+    
+    def set_categories(self, category_sizes: Dict[str, int]) -> None:
+        """
+        Запоминает категории к обработке и число СТЕ в них.
+        
+        Args:
+            category_sizes: {ID категории: число СТЕ}
+        """
+        self.category_sizes = category_sizes
+        self.categories = list(category_sizes)
+        self.stes_total = sum(category_sizes.values())
+    
+    def category_done(self, category_id: str) -> None:
+        """Отмечает категорию обработанной (при параллельной группировке - в любом порядке)"""
+        self._done_categories.add(category_id)
+        self.categories_done += 1
+        self.stes_done += self.category_sizes.get(category_id, 0)
+    
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        """
+        Отмечает завершение.
+        
+        Args:
+            status: completed, failed или cancelled
+            error: Текст ошибки (для failed)
+        """
+        self.status = status
+        self.error = error
+        self.finished_at = datetime.now()
+        if self.stes_total is None and status == "completed":
+            self.stes_total = 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Состояние задачи для API"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "category_id": self.request.category_id,
+            "categories_total": len(self.categories) if self.stes_total is not None else None,
+            "categories_done": self.categories_done,
+            "current_category": self.current_category,
+            "stes_total": self.stes_total,
+            "stes_done": self.stes_done,
+            "progress": self.progress,
+            "eta_seconds": self.eta_seconds,
+            "total_groups": len(self.aggregation_ids),
+            "total_items": self.total_items,
+            "aggregation_ids": self.aggregation_ids,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class GroupingJobManager:
+    """
+    Запускает группировку в фоне и хранит состояние задач процесса.
+    
+    Вычисления (кодирование текстов моделью, объединение групп) идут в пуле
+    потоков, поэтому event loop продолжает обслуживать остальные запросы.
+    Одновременно выполняется не больше settings.GROUPING_MAX_CONCURRENT_JOBS задач,
+    остальные ждут в очереди. Агрегации сохраняются по мере обработки категорий.
+    """
+    
+    def __init__(
+        self,
+        session_factory=None,
+        max_concurrent_jobs: Optional[int] = None,
+        workers: Optional[int] = None
+    ):
+        """
+        Инициализация менеджера.
+        
+        Args:
+            session_factory: Фабрика сессий БД (по умолчанию AsyncSessionLocal)
+            max_concurrent_jobs: Максимум одновременно выполняемых задач
+                (по умолчанию settings.GROUPING_MAX_CONCURRENT_JOBS)
+            workers: Потоков в пуле вычислений (по умолчанию settings.GROUPING_WORKERS)
+        """
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.max_concurrent_jobs = max_concurrent_jobs or settings.GROUPING_MAX_CONCURRENT_JOBS
+        self.workers = workers or settings.GROUPING_WORKERS
+        self.jobs: Dict[str, GroupingJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Пул потоков для вычислений группировки (создается при первой задаче)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="grouping")
+        return self._executor
+    
+    def get(self, job_id: str) -> Optional[GroupingJob]:
+        """Получить задачу по ID"""
+        return self.jobs.get(job_id)
+    
+    def start(self, request: GroupingRequest) -> GroupingJob:
+        """
+        Создает задачу группировки и ставит ее в очередь.
+        Должен вызываться из работающего event loop.
+        
+        Args:
+            request: Параметры группировки
+        
+        Returns:
+            Созданная задача
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+        
+        job = GroupingJob(request)
+        self.jobs[job.job_id] = job
+        self._forget_old_jobs()
+        
+        task = asyncio.create_task(self._run(job))
+        # Храним ссылку на задачу, чтобы ее не собрал сборщик мусора
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+    
+    def cancel(self, job_id: str) -> Optional[GroupingJob]:
+        """
+        Отменяет задачу. Задача в очереди снимается сразу; выполняющаяся - на ближайшей
+        точке ожидания (вычисление текущей категории в пуле дорабатывает, но его результат
+        не сохраняется; до его окончания задача занимает слот очереди).
+        Агрегации уже обработанных категорий остаются.
+        
+        Args:
+            job_id: ID задачи
+        
+        Returns:
+            Задача или None, если не найдена
+        
+        Raises:
+            GroupingJobFinishedError: если задача уже завершена
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job.is_finished:
+            raise GroupingJobFinishedError(job.job_id, job.status)
+        
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return job
+    
+    def _forget_old_jobs(self) -> None:
+        """Удаляет самые старые завершенные задачи сверх MAX_FINISHED_JOBS"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+    
+    async def _run(self, job: GroupingJob) -> None:
+        """
+        Выполняет задачу: ждет слот очереди и группирует категории.
+        
+        Args:
+            job: Задача группировки
+        """
+        try:
+            async with self._semaphore:
+                job.start()
+                service = GroupingService(executor=self.executor)
+                try:
+                    await self._group(job, service)
+                finally:
+                    # Отмена не прерывает вычисление текущей категории в пуле:
+                    # слот очереди освобождается, только когда оно закончится
+                    await service.wait_computations()
+            
+            job.finish("completed")
+            logger.info(
+                "Группировка %s завершена: агрегаций %s, СТЕ %s",
+                job.job_id, len(job.aggregation_ids), job.total_items
+            )
+        except asyncio.CancelledError:
+            job.finish("cancelled")
+            logger.info(
+                "Группировка %s отменена: обработано категорий %s, агрегаций %s",
+                job.job_id, job.categories_done, len(job.aggregation_ids)
+            )
+            raise
+        except Exception as e:
+            job.finish("failed", error=str(e))
+            logger.error(f"Группировка {job.job_id} завершилась ошибкой: {e}")
+    
+    async def _group(self, job: GroupingJob, service: GroupingService) -> None:
+        """
+        Группирует категории по очереди, агрегации каждой категории сохраняются сразу.
+        
+        Args:
+            job: Задача группировки
+            service: Сервис группировки задачи
+        """
+        request = job.request
+        async with self.session_factory() as session:
+            # aclosing: при отмене генератор закрывается сразу (и останавливает пул процессов)
+            category_results = service.iter_category_groups(
+                session,
+                category_id=request.category_id,
+                ste_ids=request.ste_ids,
+                similarity_threshold=settings.SIMILARITY_THRESHOLD,
+                min_group_size=settings.MIN_GROUP_SIZE,
+                max_group_size=settings.MAX_GROUP_SIZE,
+                merge_mode=request.merge_mode,
+                similarity_engine=request.similarity_engine,
+                on_categories=job.set_categories
+            )
+            async with aclosing(category_results):
+                async for category_id, category_groups in category_results:
+                    for group_data in category_groups:
+                        aggregation = await service.materialize_group(
+                            session, group_data, request.force_regenerate
+                        )
+                        job.aggregation_ids.append(aggregation.id)
+                        job.total_items += len(aggregation.items)
+                        # Результат читается через API - в сессии агрегация больше не нужна
+                        session.expunge(aggregation)
+                    job.category_done(category_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики задач для /health"""
+        statuses = [job.status for job in self.jobs.values()]
+        return {
+            "max_concurrent_jobs": self.max_concurrent_jobs,
+            "workers": self.workers,
+            "running": statuses.count("running"),
+            "queued": statuses.count("queued"),
+        }
+    
+    async def shutdown(self) -> None:
+        """Отменяет незавершенные задачи и останавливает пул"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Менеджер задач группировки процесса
+grouping_job_manager = GroupingJobManager()
+
+
+def get_grouping_job_manager() -> GroupingJobManager:
+    """Получить менеджер задач группировки процесса"""
+    return grouping_job_manager
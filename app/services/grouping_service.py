@@ -1,34 +1,107 @@
 """
 Сервис группировки СТЕ по значимым характеристикам
 """
-from typing import List, Dict, Any, Set, Tuple
+from typing import List, Dict, Any, Set, Tuple, AsyncIterator, Callable, Optional
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
-from app.models.database import STE, Aggregation, AggregationItem
+from app.models.database import Aggregation, AggregationItem
+from app.services.catalog_loader import CatalogRow, UNKNOWN_CATEGORY, count_category_rows, load_category_rows
+from app.services.catalog_snapshot import (
+    CatalogSnapshot, CatalogSnapshotStore, catalog_snapshot_store as default_catalog_snapshot_store
+)
 from app.services.characteristic_analyzer import CharacteristicAnalyzer
-from sentence_transformers import SentenceTransformer
+from app.services.model_registry import EmbeddingModelRegistry, model_registry as default_model_registry
+from app.services.embedding_cache import EmbeddingCache, embedding_cache as default_embedding_cache
+from app.services.embedding_store import EmbeddingStore
+from app.services.ann_index import build_knn_graph, build_sparse_knn_graph
+from app.services.lexical_similarity import tfidf_similarity_block, tfidf_vectors
+from app.services.exact_match import CharacteristicPairs, group_by_exact_match
+from app.utils.pagination import total_count_cache
+from app.config import settings
 import numpy as np
+import asyncio
+import sys
 from collections import defaultdict
 
 
+# Допуск, в пределах которого матричная схожесть перепроверяется попарно
+SIMILARITY_TIE_TOLERANCE = 1e-5
+
+# С этого числа СТЕ в категории точное совпадение по кодам снимка быстрее строковых ключей
+EXACT_MATCH_CODES_MIN_ROWS = 256
+
+
 class GroupingService:
     """Сервис для группировки СТЕ"""
     
-    def __init__(self):
-        """Инициализация сервиса"""
+    def __init__(
+        self,
+        model_registry: EmbeddingModelRegistry = None,
+        embedding_cache: EmbeddingCache = None,
+        executor: Optional[Executor] = None,
+        processes: Optional[int] = None,
+        snapshot_store: CatalogSnapshotStore = None
+    ):
+        """
+        Инициализация сервиса.
+        
+        Args:
+            model_registry: Реестр моделей (по умолчанию - общий реестр процесса)
+            embedding_cache: Кэш embeddings (по умолчанию - общий кэш процесса)
+            executor: Пул для вычислений группировки (кодирование, объединение групп);
+                None - вычисления выполняются в event loop
+            processes: Процессов для параллельной группировки категорий
+                (по умолчанию settings.GROUPING_PROCESSES, 1 - в текущем процессе)
+            snapshot_store: Снимок каталога (по умолчанию - общий снимок процесса);
+                СТЕ читаются из него, если он соответствует БД, иначе - из БД
+        """
         self.characteristic_analyzer = CharacteristicAnalyzer()
-        # Инициализируем модель для вычисления схожести (легковесная)
+        self.model_registry = model_registry or default_model_registry
+        self.embedding_cache = embedding_cache or default_embedding_cache
+        self.executor = executor
+        self.processes = settings.GROUPING_PROCESSES if processes is None else processes
+        self.snapshot_store = snapshot_store or default_catalog_snapshot_store
+        # Модель для вычисления схожести берется из реестра при первом обращении
         self.embedding_model = None
+        # Вычисления, отправленные в пулы и еще не завершенные (отмена их не прерывает)
+        self._computations: Set[Future] = set()
+    
+    def _submit(self, executor: Executor, fn: Callable[[], Any]) -> asyncio.Future:
+        """
+        Запускает вычисление в пуле и запоминает его до завершения.
+        
+        Args:
+            executor: Пул потоков или процессов
+            fn: Вычисление без аргументов
+        
+        Returns:
+            Future для ожидания в event loop
+        """
+        future = executor.submit(fn)
+        self._computations.add(future)
+        future.add_done_callback(self._computations.discard)
+        return asyncio.wrap_future(future)
+    
+    async def wait_computations(self) -> None:
+        """
+        Ждет вычисления, запущенные в пулах этим сервисом. При отмене группировки
+        вычисление текущей категории дорабатывает в пуле: тот, кто ограничивает
+        число одновременных группировок, освобождает слот только после него.
+        """
+        pending = [future for future in list(self._computations) if not future.done()]
+        if pending:
+            await asyncio.wait([asyncio.wrap_future(future) for future in pending])
     
     def _get_embedding_model(self):
-        """Ленивая загрузка модели embeddings"""
+        """Получение модели embeddings из реестра процесса"""
         if self.embedding_model is None:
-            from app.config import settings
-            self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            self.embedding_model = self.model_registry.get_model()
         return self.embedding_model
     
-    def _extract_grouping_key(self, ste: STE, significant_chars: List[str]) -> str:
+    def _extract_grouping_key(self, ste: CatalogRow, significant_chars: List[str]) -> str:
         """
         Извлекает ключ группировки для СТЕ на основе значимых характеристик.
         Если характеристик нет или их мало, использует альтернативные признаки.
@@ -67,6 +140,23 @@ class GroupingService:
         
         return ";".join(sorted(key_parts)) if key_parts else "no_characteristics"
     
+    @staticmethod
+    def _cosine_similarity(vector1: np.ndarray, vector2: np.ndarray) -> float:
+        """
+        Косинусная схожесть двух векторов, ограниченная отрезком [0, 1].
+        
+        Args:
+            vector1: Первый вектор
+            vector2: Второй вектор
+            
+        Returns:
+            Коэффициент схожести от 0 до 1
+        """
+        similarity = np.dot(vector1, vector2) / (
+            np.linalg.norm(vector1) * np.linalg.norm(vector2)
+        )
+        return float(max(0.0, min(1.0, similarity)))
+    
     def _calculate_similarity(self, text1: str, text2: str) -> float:
         """
         Вычисляет схожесть между двумя текстами.
@@ -84,10 +174,7 @@ class GroupingService:
         try:
             model = self._get_embedding_model()
             embeddings = model.encode([text1, text2])
-            similarity = np.dot(embeddings[0], embeddings[1]) / (
-                np.linalg.norm(embeddings[0]) * np.linalg.norm(embeddings[1])
-            )
-            return float(max(0.0, min(1.0, similarity)))
+            return self._cosine_similarity(embeddings[0], embeddings[1])
         except Exception:
             # В случае ошибки возвращаем простую схожесть по словам
             words1 = set(text1.lower().split())
@@ -100,19 +187,29 @@ class GroupingService:
     
     def _group_by_exact_match(
         self,
-        stes: List[STE],
-        significant_chars: List[str]
-    ) -> Dict[str, List[STE]]:
+        stes: List[CatalogRow],
+        significant_chars: List[str],
+        pairs: Optional[CharacteristicPairs] = None
+    ) -> Dict[str, List[CatalogRow]]:
         """
         Группирует СТЕ по точному совпадению значений значимых характеристик.
         
+        Если характеристики уже в кодах (снимок каталога) и категория не мала, СТЕ
+        группируются по сочетаниям кодов, а строка ключа собирается один раз на группу
+        (см. exact_match). Иначе ключ строится для каждой СТЕ: кодирование словарей
+        характеристик обходится дороже самих строковых ключей. Группы в обоих случаях одинаковы.
+        
         Args:
             stes: Список СТЕ
             significant_chars: Значимые характеристики
+            pairs: Характеристики stes в кодах снимка каталога
             
         Returns:
             Словарь {ключ_группы: [СТЕ]}
         """
+        if pairs is not None and len(stes) >= EXACT_MATCH_CODES_MIN_ROWS:
+            return group_by_exact_match(stes, significant_chars, pairs)
+        
         groups = defaultdict(list)
         
         for ste in stes:
@@ -121,17 +218,102 @@ class GroupingService:
         
         return dict(groups)
     
+    def _representative_text(self, group_stes: List[CatalogRow]) -> str:
+        """
+        Формирует текст-представитель группы для сравнения схожести.
+        
+        Args:
+            group_stes: СТЕ группы
+            
+        Returns:
+            Первые 3 названия СТЕ группы через пробел
+        """
+        return " ".join(ste.name for ste in group_stes[:3])
+    
+    @staticmethod
+    def _representative_ids(groups: Dict[str, List[CatalogRow]], group_keys: List[str]) -> List[Optional[int]]:
+        """ID СТЕ для групп из одной СТЕ (их текст - название этой СТЕ), для остальных - None"""
+        return [groups[key][0].id if len(groups[key]) == 1 else None for key in group_keys]
+    
+    def _encode_texts(self, texts: List[str], ste_ids: Optional[List[Optional[int]]] = None) -> np.ndarray:
+        """
+        Возвращает векторы текстов: сначала из хранилища и кэша, модель кодирует только промахи.
+        
+        Args:
+            texts: Список текстов
+            ste_ids: ID СТЕ для текстов-названий одной СТЕ (см. _representative_ids)
+            
+        Returns:
+            Матрица векторов (len(texts) x dim)
+        """
+        return self.embedding_cache.encode(
+            texts, self.model_registry.cache_model_name, self._encode_with_model, ste_ids
+        )
+    
+    def _encode_with_model(self, texts: List[str]) -> np.ndarray:
+        """
+        Кодирует тексты моделью батчами.
+        
+        Args:
+            texts: Список текстов
+            
+        Returns:
+            Матрица векторов (len(texts) x dim)
+        """
+        model = self._get_embedding_model()
+        embeddings = model.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    @staticmethod
+    def _jaccard_similarity_block(
+        word_sets: List[Set[str]],
+        start: int,
+        stop: int
+    ) -> np.ndarray:
+        """
+        Считает блок матрицы схожести по словам (запасной вариант без модели).
+        
+        Args:
+            word_sets: Множества слов текстов
+            start: Первая строка блока
+            stop: Строка, следующая за последней строкой блока
+            
+        Returns:
+            Матрица схожести (stop - start) x len(word_sets)
+        """
+        block = np.zeros((stop - start, len(word_sets)), dtype=np.float32)
+        for row, i in enumerate(range(start, stop)):
+            words1 = word_sets[i]
+            if not words1:
+                continue
+            for j, words2 in enumerate(word_sets):
+                if words2:
+                    block[row, j] = len(words1 & words2) / len(words1 | words2)
+        return block
+    
     def _merge_similar_groups(
         self,
-        groups: Dict[str, List[STE]],
-        similarity_threshold: float = 0.7
-    ) -> Dict[str, List[STE]]:
+        groups: Dict[str, List[CatalogRow]],
+        similarity_threshold: float = 0.7,
+        similarity_engine: str = None
+    ) -> Dict[str, List[CatalogRow]]:
         """
         Объединяет похожие группы на основе схожести названий СТЕ.
         
+        Тексты-представители всех групп кодируются один раз батчами,
+        косинусная схожесть считается матрично блоками строк. Решения
+        об объединении совпадают с жадным попарным проходом: группа i
+        поглощает все еще не занятые группы j > i со схожестью не ниже порога.
+        
         Args:
             groups: Словарь групп
             similarity_threshold: Порог схожести
+            similarity_engine: Схожесть текстов: transformer или tfidf (по умолчанию settings.SIMILARITY_ENGINE)
             
         Returns:
             Объединенные группы
@@ -140,36 +322,169 @@ class GroupingService:
             return {}
         
         group_keys = list(groups.keys())
+        texts = [self._representative_text(groups[key]) for key in group_keys]
+        has_text = np.array([bool(text) for text in texts], dtype=bool)
+        
+        embeddings = None
+        word_sets = None
+        tfidf = None
+        if (similarity_engine or settings.SIMILARITY_ENGINE) == "tfidf":
+            tfidf = tfidf_vectors(texts)
+        else:
+            try:
+                embeddings = self._encode_texts(texts, self._representative_ids(groups, group_keys))
+                norms = np.linalg.norm(embeddings, axis=1)
+                norms[norms == 0] = 1.0
+            except Exception:
+                # В случае ошибки используем простую схожесть по словам
+                embeddings = None
+                word_sets = [set(text.lower().split()) for text in texts]
+        
+        n = len(group_keys)
+        used = np.zeros(n, dtype=bool)
         merged = {}
-        used_keys = set()
+        block_size = max(1, settings.SIMILARITY_BLOCK_SIZE)
         
-        for i, key1 in enumerate(group_keys):
-            if key1 in used_keys:
-                continue
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            
+            if embeddings is not None:
+                # Как и при попарном сравнении: скалярное произведение / произведение норм
+                similarities = embeddings[start:stop] @ embeddings.T
+                similarities /= np.outer(norms[start:stop], norms)
+                np.clip(similarities, 0.0, 1.0, out=similarities)
+            elif tfidf is not None:
+                similarities = tfidf_similarity_block(tfidf, start, stop)
+            else:
+                similarities = self._jaccard_similarity_block(word_sets, start, stop)
             
-            merged_group = groups[key1].copy()
+            # Пустые тексты ни на что не похожи
+            similarities[:, ~has_text] = 0.0
+            similarities[~has_text[start:stop]] = 0.0
             
-            # Ищем похожие группы
-            for j, key2 in enumerate(group_keys):
-                if i >= j or key2 in used_keys:
+            for i in range(start, stop):
+                if used[i]:
                     continue
                 
-                # Проверяем схожесть по среднему названию СТЕ в группах
-                names1 = [ste.name for ste in groups[key1]]
-                names2 = [ste.name for ste in groups[key2]]
+                row = similarities[i - start]
+                candidates = (row >= similarity_threshold) & ~used
+                candidates[:i + 1] = False
                 
-                avg_name1 = " ".join(names1[:3])  # Берем первые 3 для скорости
-                avg_name2 = " ".join(names2[:3])
+                if embeddings is not None and has_text[i]:
+                    # Пары у самого порога пересчитываем так же, как попарное сравнение,
+                    # чтобы погрешность матричного умножения не меняла решения
+                    borderline = (np.abs(row - similarity_threshold) < SIMILARITY_TIE_TOLERANCE) & ~used
+                    borderline[:i + 1] = False
+                    borderline &= has_text
+                    for j in np.flatnonzero(borderline):
+                        candidates[j] = self._cosine_similarity(
+                            embeddings[i], embeddings[j]
+                        ) >= similarity_threshold
                 
-                similarity = self._calculate_similarity(avg_name1, avg_name2)
+                merged_group = groups[group_keys[i]].copy()
+                for j in np.flatnonzero(candidates):
+                    merged_group.extend(groups[group_keys[j]])
                 
-                if similarity >= similarity_threshold:
-                    merged_group.extend(groups[key2])
-                    used_keys.add(key2)
+                used[candidates] = True
+                used[i] = True
+                merged[group_keys[i]] = merged_group
+        
+        return merged
+    
+    def _merge_similar_groups_ann(
+        self,
+        groups: Dict[str, List[CatalogRow]],
+        similarity_threshold: float = 0.7,
+        max_group_size: int = None,
+        similarity_engine: str = None
+    ) -> Dict[str, List[CatalogRow]]:
+        """
+        Объединяет похожие группы через kNN-граф и union-find.
+        
+        Для каждой группы ищутся ближайшие соседи в ANN-индексе. Ребра со
+        схожестью не ниже порога обходятся от самых похожих к менее похожим
+        и объединяют группы (в отличие от жадного прохода - транзитивно).
+        Объединение, после которого в группе оказалось бы больше
+        max_group_size СТЕ, пропускается, чтобы цепочки соседей не склеивали
+        категорию в одну группу, которая затем будет отброшена по размеру.
+        Ключ объединенной группы - ключ её первой группы.
+        
+        Args:
+            groups: Словарь групп
+            similarity_threshold: Порог схожести
+            max_group_size: Максимальный размер объединенной группы (None - без ограничения)
+            similarity_engine: Схожесть текстов: transformer или tfidf (по умолчанию settings.SIMILARITY_ENGINE)
             
-            if merged_group:
-                merged[key1] = merged_group
-                used_keys.add(key1)
+        Returns:
+            Объединенные группы
+        """
+        if not groups:
+            return {}
+        
+        group_keys = list(groups.keys())
+        texts = [self._representative_text(groups[key]) for key in group_keys]
+        has_text = np.array([bool(text) for text in texts], dtype=bool)
+        n = len(group_keys)
+        
+        if (similarity_engine or settings.SIMILARITY_ENGINE) == "tfidf":
+            # Точные соседи по разреженным векторам: строки уже L2-нормализованы
+            similarities, neighbors = build_sparse_knn_graph(tfidf_vectors(texts), settings.ANN_NEIGHBORS)
+        else:
+            try:
+                embeddings = self._encode_texts(texts, self._representative_ids(groups, group_keys))
+            except Exception:
+                # Без модели ANN-индекс строить не по чему - используем жадный проход
+                return self._merge_similar_groups(groups, similarity_threshold, similarity_engine)
+            
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings = embeddings / norms
+            similarities, neighbors = build_knn_graph(embeddings, settings.ANN_NEIGHBORS)
+        
+        # Ребра выше порога без петель и дублей (i, j) / (j, i)
+        rows = np.repeat(np.arange(n), neighbors.shape[1])
+        cols = neighbors.ravel().astype(np.int64)
+        scores = similarities.ravel()
+        mask = (cols >= 0) & (scores >= similarity_threshold)
+        rows, cols, scores = rows[mask], cols[mask], scores[mask]
+        mask = (rows != cols) & has_text[rows] & has_text[cols]
+        rows, cols, scores = rows[mask], cols[mask], scores[mask]
+        rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+        order = np.lexsort((cols, rows, -scores))
+        rows, cols = rows[order], cols[order]
+        _, first = np.unique(rows * n + cols, return_index=True)
+        first.sort()
+        rows, cols = rows[first].tolist(), cols[first].tolist()
+        
+        # Union-find; корень компоненты - группа с наименьшим индексом
+        parent = list(range(n))
+        sizes = [len(groups[key]) for key in group_keys]
+        
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        
+        for a, b in zip(rows, cols):
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b:
+                continue
+            if max_group_size is not None and sizes[root_a] + sizes[root_b] > max_group_size:
+                continue
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+            sizes[root_a] += sizes[root_b]
+        
+        # Компоненты в порядке первой группы, группы внутри - в исходном порядке
+        merged = {}
+        for i, key in enumerate(group_keys):
+            root = find(i)
+            if root == i:
+                merged[key] = groups[key].copy()
+            else:
+                merged[group_keys[root]].extend(groups[key])
         
         return merged
     
@@ -180,7 +495,9 @@ class GroupingService:
         ste_ids: List[int] = None,
         similarity_threshold: float = 0.7,
         min_group_size: int = 2,
-        max_group_size: int = 50
+        max_group_size: int = 50,
+        merge_mode: str = None,
+        similarity_engine: str = None
     ) -> List[Dict[str, Any]]:
         """
         Группирует СТЕ по значимым характеристикам.
@@ -192,87 +509,361 @@ class GroupingService:
             similarity_threshold: Порог схожести
             min_group_size: Минимальный размер группы
             max_group_size: Максимальный размер группы
+            merge_mode: Режим объединения групп: greedy или ann (по умолчанию settings.MERGE_MODE)
+            similarity_engine: Схожесть названий групп: transformer или tfidf (по умолчанию settings.SIMILARITY_ENGINE)
             
         Returns:
             Список групп СТЕ
         """
-        # Получаем СТЕ
-        stmt = select(STE)
+        category_order: Dict[str, int] = {}
+        results = []
+        async for cat_id, category_groups in self.iter_category_groups(
+            session,
+            category_id=category_id,
+            ste_ids=ste_ids,
+            similarity_threshold=similarity_threshold,
+            min_group_size=min_group_size,
+            max_group_size=max_group_size,
+            merge_mode=merge_mode,
+            similarity_engine=similarity_engine,
+            on_categories=lambda sizes: category_order.update({cat_id: i for i, cat_id in enumerate(sizes)})
+        ):
+            results.append((cat_id, category_groups))
+        
+        # При параллельной группировке категории завершаются в произвольном порядке
+        results.sort(key=lambda result: category_order[result[0]])
+        return [group for _, category_groups in results for group in category_groups]
+    
+    async def iter_category_groups(
+        self,
+        session: AsyncSession,
+        category_id: str = None,
+        ste_ids: List[int] = None,
+        similarity_threshold: float = 0.7,
+        min_group_size: int = 2,
+        max_group_size: int = 50,
+        merge_mode: str = None,
+        similarity_engine: str = None,
+        on_categories: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Группирует СТЕ по категориям, отдавая группы каждой категории сразу после ее обработки
+        (для потоковой выдачи и отчета о прогрессе). Параметры - как у group_stes.
         
-        if category_id:
-            stmt = stmt.where(STE.category_id == category_id)
+        При processes > 1 категории распределяются по пулу процессов (см. _iter_category_groups_parallel)
+        и отдаются по мере готовности.
         
-        if ste_ids:
-            stmt = stmt.where(STE.id.in_(ste_ids))
+        Args:
+            on_categories: Вызывается до группировки с числом СТЕ в каждой категории
+                (в порядке категорий последовательной группировки)
         
-        result = await session.execute(stmt)
-        stes = result.scalars().all()
+        Yields:
+            Кортеж (ID категории, список ее групп - возможно, пустой)
+        """
+        merge_mode = merge_mode or settings.MERGE_MODE
+        similarity_engine = similarity_engine or settings.SIMILARITY_ENGINE
         
-        if not stes:
-            return []
+        # Размеры категорий; сами СТЕ читаются по одной категории (только нужные колонки),
+        # поэтому в памяти одновременно находится не больше одной категории.
+        # Если снимок каталога актуален, категории и СТЕ берутся из него, а не из БД
+        snapshot = await self.snapshot_store.get_fresh(session)
+        if snapshot is not None:
+            categories = snapshot.category_sizes(category_id, ste_ids)
+        else:
+            categories = await count_category_rows(session, category_id, ste_ids)
         
-        # Группируем по категориям
-        categories = {}
-        for ste in stes:
-            cat_id = ste.category_id or "unknown"
-            if cat_id not in categories:
-                categories[cat_id] = []
-            categories[cat_id].append(ste)
+        if not categories:
+            return
         
-        all_groups = []
+        if on_categories is not None:
+            on_categories(dict(categories))
+        
+        if self.processes > 1 and len(categories) > 1:
+            async for cat_id, category_groups in self._iter_category_groups_parallel(
+                session, categories, ste_ids, similarity_threshold, min_group_size, max_group_size, merge_mode,
+                snapshot, similarity_engine
+            ):
+                yield cat_id, category_groups
+            return
         
         # Для каждой категории
-        for cat_id, cat_stes in categories.items():
-            # Получаем значимые характеристики
-            if cat_id != "unknown" and cat_stes:
-                cat_name = cat_stes[0].category_name or "Неизвестная категория"
-                significant_chars = await self.characteristic_analyzer.get_or_create_category_significant_characteristics(
-                    session, cat_id, cat_name
-                )
-            else:
-                significant_chars = []
+        for cat_id in categories:
+            cat_stes = await self._load_category(session, cat_id, ste_ids, snapshot)
+            # Со снимком характеристики для точного совпадения берутся уже в кодах
+            pairs = snapshot.characteristic_pairs(cat_id, ste_ids) if snapshot is not None else None
+            category_groups = await self._group_category(
+                session, cat_id, cat_stes, similarity_threshold, min_group_size, max_group_size, merge_mode,
+                full_category=not ste_ids, snapshot=snapshot, pairs=pairs, similarity_engine=similarity_engine
+            )
+            yield cat_id, category_groups
+    
+    @staticmethod
+    async def _load_category(
+        session: AsyncSession,
+        cat_id: str,
+        ste_ids: Optional[List[int]],
+        snapshot: Optional[CatalogSnapshot]
+    ) -> List[CatalogRow]:
+        """СТЕ категории из снимка каталога или, если снимка нет, из БД"""
+        if snapshot is not None:
+            return snapshot.category_rows(cat_id, ste_ids)
+        return await load_category_rows(session, cat_id, ste_ids)
+    
+    async def _group_category(
+        self,
+        session: AsyncSession,
+        cat_id: str,
+        cat_stes: List[CatalogRow],
+        similarity_threshold: float,
+        min_group_size: int,
+        max_group_size: int,
+        merge_mode: str,
+        full_category: bool = True,
+        snapshot: Optional[CatalogSnapshot] = None,
+        pairs: Optional[CharacteristicPairs] = None,
+        similarity_engine: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Группирует СТЕ одной категории.
+        
+        Args:
+            session: Сессия БД
+            cat_id: ID категории ("unknown" - без категории)
+            cat_stes: СТЕ категории
+            similarity_threshold: Порог схожести
+            min_group_size: Минимальный размер группы
+            max_group_size: Максимальный размер группы
+            merge_mode: Режим объединения групп
+            full_category: cat_stes - вся категория (анализ характеристик использует их же)
+            snapshot: Актуальный снимок каталога (анализ характеристик идет по нему)
+            pairs: Характеристики cat_stes в кодах снимка
+            similarity_engine: Схожесть названий групп
             
-            # Группируем по точному совпадению
-            exact_groups = self._group_by_exact_match(cat_stes, significant_chars)
+        Returns:
+            Список групп СТЕ категории
+        """
+        significant_chars = await self._significant_characteristics(
+            session, cat_id, cat_stes, full_category, snapshot
+        )
+        
+        if self.executor is None:
+            return self._build_category_groups(
+                cat_id, cat_stes, significant_chars, similarity_threshold, min_group_size, max_group_size, merge_mode,
+                pairs, similarity_engine
+            )
+        
+        # Кодирование и объединение групп не блокируют event loop
+        return await self._submit(self.executor, partial(
+            self._build_category_groups,
+            cat_id, cat_stes, significant_chars, similarity_threshold, min_group_size, max_group_size, merge_mode,
+            pairs, similarity_engine
+        ))
+    
+    async def _significant_characteristics(
+        self,
+        session: AsyncSession,
+        cat_id: str,
+        cat_stes: Optional[List[CatalogRow]],
+        full_category: bool = True,
+        snapshot: Optional[CatalogSnapshot] = None,
+        ste_ids: Optional[List[int]] = None
+    ) -> List[str]:
+        """
+        Значимые характеристики категории (из БД или посчитанные и сохраненные).
+        
+        Args:
+            session: Сессия БД
+            cat_id: ID категории ("unknown" - без категории)
+            cat_stes: СТЕ категории (None - при группировке по снимку СТЕ не загружались)
+            full_category: cat_stes - вся категория; иначе (фильтр ste_ids) анализатор читает категорию сам
+            snapshot: Актуальный снимок каталога: анализатор считает частоты по кодам ключей в нем
+            ste_ids: Фильтр по ID СТЕ (для названия категории, если cat_stes не загружались)
             
-            # Объединяем похожие группы
-            merged_groups = self._merge_similar_groups(exact_groups, similarity_threshold)
+        Returns:
+            Список значимых характеристик
+        """
+        if cat_id == UNKNOWN_CATEGORY or (not cat_stes and snapshot is None):
+            return []
+        if cat_stes:
+            cat_name = cat_stes[0].category_name
+        else:
+            # Параллельная группировка по снимку: СТЕ категории читает воркер
+            cat_name = snapshot.category_name(cat_id, ste_ids)
+        cat_name = cat_name or "Неизвестная категория"
+        return await self.characteristic_analyzer.get_or_create_category_significant_characteristics(
+            session, cat_id, cat_name,
+            rows=cat_stes if full_category and snapshot is None else None,
+            snapshot=snapshot
+        )
+    
+    async def _iter_category_groups_parallel(
+        self,
+        session: AsyncSession,
+        categories: Dict[str, int],
+        ste_ids: Optional[List[int]],
+        similarity_threshold: float,
+        min_group_size: int,
+        max_group_size: int,
+        merge_mode: str,
+        snapshot: Optional[CatalogSnapshot] = None,
+        similarity_engine: str = None
+    ) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Группирует категории в пуле процессов.
+        
+        Категории запускаются от самой большой к самой маленькой, чтобы крупные не
+        оказались в хвосте. Без снимка каталога СТЕ категории (CatalogRow) читаются текущим
+        процессом и передаются воркеру вместе с задачей; со снимком воркер читает категорию
+        из того же снимка сам (общие страницы mmap), и в задаче передается только ее ID.
+        В работе или в очереди пула одновременно не больше двух категорий на процесс,
+        поэтому память ограничена несколькими категориями.
+        Воркеры читают кэш embeddings без записи. Все записи идут через текущий процесс:
+        значимые характеристики и агрегации - через session, новые векторы - в self.embedding_cache.
+        
+        Args:
+            session: Сессия БД
+            categories: Число СТЕ по категориям
+            ste_ids: Фильтр по ID СТЕ
+            similarity_threshold: Порог схожести
+            min_group_size: Минимальный размер группы
+            max_group_size: Максимальный размер группы
+            merge_mode: Режим объединения групп
+            snapshot: Актуальный снимок каталога
+            similarity_engine: Схожесть названий групп
+        
+        Yields:
+            Кортеж (ID категории, список ее групп) в порядке завершения
+        """
+        order = sorted(categories, key=categories.get, reverse=True)
+        workers = min(self.processes, len(categories))
+        max_in_flight = 2 * workers
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_grouping_worker,
+            initargs=(
+                self.embedding_cache.path,
+                self.embedding_cache.enabled,
+                str(snapshot.directory) if snapshot is not None else None,
+                snapshot.build_id if snapshot is not None else None,
+                str(self.embedding_cache.store.directory) if self.embedding_cache.store is not None else None
+            )
+        )
+        
+        def collect(future: asyncio.Future) -> Tuple[str, List[Dict[str, Any]]]:
+            cat_id, category_groups, pending_vectors = future.result()
+            for keys, vectors, model_name in pending_vectors:
+                self.embedding_cache.put_many(keys, vectors, model_name)
+            return cat_id, category_groups
+        
+        try:
+            pending = set()
+            for cat_id in order:
+                cat_stes = None if snapshot is not None else await load_category_rows(session, cat_id, ste_ids)
+                significant_chars = await self._significant_characteristics(
+                    session, cat_id, cat_stes, full_category=not ste_ids, snapshot=snapshot, ste_ids=ste_ids
+                )
+                pending.add(self._submit(pool, partial(
+                    group_category_task,
+                    cat_id, cat_stes, significant_chars, similarity_threshold, min_group_size, max_group_size, merge_mode,
+                    ste_ids, similarity_engine
+                )))
+                del cat_stes
+                
+                # Готовые категории отдаются, не дожидаясь запуска остальных
+                if len(pending) >= max_in_flight:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    done = {future for future in pending if future.done()}
+                    pending -= done
+                for future in done:
+                    yield collect(future)
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield collect(future)
+        finally:
+            # При отмене категории из очереди пула снимаются; уже начатые дорабатывают
+            # (их ждет wait_computations), после чего процессы пула завершаются
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _build_category_groups(
+        self,
+        cat_id: str,
+        cat_stes: List[CatalogRow],
+        significant_chars: List[str],
+        similarity_threshold: float,
+        min_group_size: int,
+        max_group_size: int,
+        merge_mode: str,
+        pairs: Optional[CharacteristicPairs] = None,
+        similarity_engine: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Вычислительная часть группировки категории (без обращений к БД).
+        
+        Args:
+            cat_id: ID категории
+            cat_stes: СТЕ категории (с загруженными колонками)
+            significant_chars: Значимые характеристики категории
+            similarity_threshold: Порог схожести
+            min_group_size: Минимальный размер группы
+            max_group_size: Максимальный размер группы
+            merge_mode: Режим объединения групп
+            pairs: Характеристики cat_stes в кодах снимка
+            similarity_engine: Схожесть названий групп: transformer или tfidf
             
-            # Фильтруем по размеру групп
-            for key, group_stes in merged_groups.items():
-                if min_group_size <= len(group_stes) <= max_group_size:
-                    # Формируем характеристики группировки
-                    grouping_chars = {}
-                    if group_stes:
-                        # Берем общие характеристики или альтернативные признаки
-                        first_ste = group_stes[0]
-                        if first_ste.characteristics and isinstance(first_ste.characteristics, dict):
-                            # Используем характеристики, если они есть
-                            for char in significant_chars:
-                                if char in first_ste.characteristics:
-                                    grouping_chars[char] = first_ste.characteristics[char]
-                        else:
-                            # Если характеристик нет, используем альтернативные признаки
-                            if first_ste.manufacturer:
-                                grouping_chars["производитель"] = first_ste.manufacturer
-                            if first_ste.model:
-                                grouping_chars["модель"] = first_ste.model
-                            if first_ste.name:
-                                # Берем первые слова названия
-                                name_words = first_ste.name.split()[:3]
-                                if name_words:
-                                    grouping_chars["название_префикс"] = " ".join(name_words)
-                    
-                    all_groups.append({
-                        "category_id": cat_id,
-                        "category_name": cat_stes[0].category_name if cat_stes else None,
-                        "grouping_key": key,
-                        "grouping_characteristics": grouping_chars,
-                        "stes": group_stes,
-                        "size": len(group_stes)
-                    })
-        
-        return all_groups
+        Returns:
+            Список групп СТЕ категории
+        """
+        # Группируем по точному совпадению
+        exact_groups = self._group_by_exact_match(cat_stes, significant_chars, pairs)
+        
+        # Объединяем похожие группы
+        if merge_mode == "ann":
+            merged_groups = self._merge_similar_groups_ann(
+                exact_groups, similarity_threshold, max_group_size, similarity_engine
+            )
+        else:
+            merged_groups = self._merge_similar_groups(exact_groups, similarity_threshold, similarity_engine)
+        
+        category_groups = []
+        
+        # Фильтруем по размеру групп
+        for key, group_stes in merged_groups.items():
+            if min_group_size <= len(group_stes) <= max_group_size:
+                # Формируем характеристики группировки
+                grouping_chars = {}
+                if group_stes:
+                    # Берем общие характеристики или альтернативные признаки
+                    first_ste = group_stes[0]
+                    if first_ste.characteristics and isinstance(first_ste.characteristics, dict):
+                        # Используем характеристики, если они есть
+                        for char in significant_chars:
+                            if char in first_ste.characteristics:
+                                grouping_chars[char] = first_ste.characteristics[char]
+                    else:
+                        # Если характеристик нет, используем альтернативные признаки
+                        if first_ste.manufacturer:
+                            grouping_chars["производитель"] = first_ste.manufacturer
+                        if first_ste.model:
+                            grouping_chars["модель"] = first_ste.model
+                        if first_ste.name:
+                            # Берем первые слова названия
+                            name_words = first_ste.name.split()[:3]
+                            if name_words:
+                                grouping_chars["название_префикс"] = " ".join(name_words)
+                
+                category_groups.append({
+                    "category_id": cat_id,
+                    "category_name": cat_stes[0].category_name if cat_stes else None,
+                    "grouping_key": key,
+                    "grouping_characteristics": grouping_chars,
+                    "stes": group_stes,
+                    "size": len(group_stes)
+                })
+        
+        return category_groups
     
     async def create_aggregation_from_group(
         self,
@@ -324,6 +915,129 @@ class GroupingService:
         
         await session.commit()
         await session.refresh(aggregation)
+        total_count_cache.invalidate("aggregations")
         
         return aggregation
+    
+    async def materialize_group(
+        self,
+        session: AsyncSession,
+        group_data: Dict[str, Any],
+        force_regenerate: bool = False
+    ) -> Aggregation:
+        """
+        Агрегация для группы: существующая несохраненная с теми же характеристиками
+        (если не force_regenerate) или новая.
+        
+        Args:
+            session: Сессия БД
+            group_data: Данные группы
+            force_regenerate: Всегда создавать новую агрегацию
+            
+        Returns:
+            Агрегация с загруженными items и их СТЕ
+        """
+        # Если не требуется перегенерация, проверяем существующие агрегации
+        if not force_regenerate:
+            stmt = (
+                select(Aggregation.id)
+                .where(Aggregation.category_id == group_data["category_id"])
+                .where(Aggregation.grouping_characteristics == group_data["grouping_characteristics"])
+                .where(Aggregation.is_saved == False)
+                .limit(1)
+            )
+            result = await session.execute(stmt)
+            aggregation_id = result.scalar_one_or_none()
+        else:
+            aggregation_id = None
+        
+        # Создаем новую агрегацию
+        if aggregation_id is None:
+            aggregation = await self.create_aggregation_from_group(session, group_data, status="auto")
+            aggregation_id = aggregation.id
+        
+        # Загружаем с items
+        stmt = (
+            select(Aggregation)
+            .where(Aggregation.id == aggregation_id)
+            .options(selectinload(Aggregation.items).selectinload(AggregationItem.ste))
+        )
+        result = await session.execute(stmt)
+        return result.scalar_one()
+
+
+# Сервис процесса-воркера параллельной группировки и снимок каталога (создаются init_grouping_worker)
+_worker_service: Optional[GroupingService] = None
+_worker_snapshot: Optional[CatalogSnapshot] = None
 
+
+def init_grouping_worker(
+    cache_path: str,
+    cache_enabled: bool,
+    snapshot_dir: Optional[str] = None,
+    snapshot_build_id: Optional[str] = None,
+    store_dir: Optional[str] = None
+) -> None:
+    """
+    Инициализация процесса-воркера: сервис с кэшем embeddings только для чтения
+    и снимок каталога, по которому группирует родительский процесс.
+    
+    Args:
+        cache_path: Путь к файлу кэша embeddings
+        cache_enabled: Включен ли кэш
+        snapshot_dir: Каталог снимка каталога (None - СТЕ передаются в задачах)
+        snapshot_build_id: build_id снимка, проверенного родительским процессом
+        store_dir: Каталог хранилища векторов СТЕ (None - не использовать)
+    
+    Raises:
+        RuntimeError: если снимок успели пересобрать после запуска группировки
+    """
+    global _worker_service, _worker_snapshot
+    # Каждый процесс считает в один поток: параллелизм дают сами процессы
+    # (и OpenMP не зависает после fork процесса, уже использовавшего потоки)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+    default_model_registry.set_num_threads(1)
+    _worker_service = GroupingService(
+        embedding_cache=EmbeddingCache(
+            path=cache_path,
+            enabled=cache_enabled,
+            read_only=True,
+            store=EmbeddingStore(store_dir, enabled=True) if store_dir is not None else None
+        ),
+        processes=1
+    )
+    if snapshot_dir is not None:
+        _worker_snapshot = CatalogSnapshotStore(snapshot_dir, enabled=True).open()
+        if _worker_snapshot is None or _worker_snapshot.build_id != snapshot_build_id:
+            raise RuntimeError(f"Снимок каталога {snapshot_dir} изменился во время группировки")
+
+
+def group_category_task(
+    cat_id: str,
+    cat_stes: Optional[List[CatalogRow]],
+    significant_chars: List[str],
+    similarity_threshold: float,
+    min_group_size: int,
+    max_group_size: int,
+    merge_mode: str,
+    ste_ids: Optional[List[int]] = None,
+    similarity_engine: str = None
+) -> Tuple[str, List[Dict[str, Any]], list]:
+    """
+    Группирует одну категорию в процессе-воркере. Функция модуля, чтобы ее можно было передать в пул процессов.
+    Если cat_stes не переданы, СТЕ категории (с фильтром ste_ids) читаются из снимка каталога воркера.
+    
+    Returns:
+        Кортеж (ID категории, группы, новые векторы для кэша embeddings)
+    """
+    pairs = None
+    if cat_stes is None:
+        cat_stes = _worker_snapshot.category_rows(cat_id, ste_ids)
+        pairs = _worker_snapshot.characteristic_pairs(cat_id, ste_ids)
+    category_groups = _worker_service._build_category_groups(
+        cat_id, cat_stes, significant_chars,
+        similarity_threshold, min_group_size, max_group_size, merge_mode, pairs, similarity_engine
+    )
+    return cat_id, category_groups, _worker_service.embedding_cache.take_pending()
@@ -0,0 +1,250 @@
+"""
+Фоновые задачи импорта СТЕ с отчетом о прогрессе
+"""
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime
+from app.config import settings
+from app.database.base import AsyncSessionLocal
+from app.parsers.excel_parser import ExcelParser, iter_ste_file
+from app.services.catalog_snapshot import catalog_snapshot_store
+from app.services.characteristic_analyzer import CharacteristicAnalyzer
+from app.services.import_service import STEImportService
+from app.services.response_cache import response_cache
+from app.utils.file_lock import FileLock
+from app.utils.pagination import total_count_cache
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Сколько завершенных задач хранить для GET /ste/import/{job_id}
+MAX_FINISHED_JOBS = 50
+
+
+class ImportAlreadyRunningError(Exception):
+    """Импорт уже выполняется"""
+    
+    def __init__(self, job_id: str):
+        super().__init__(f"Импорт уже выполняется (задача {job_id})")
+        self.job_id = job_id
+
+
+class ImportJob:
+    """Состояние одной задачи импорта"""
+    
+    def __init__(self, file_path: str):
+        """
+        Инициализация задачи.
+        
+        Args:
+            file_path: Путь к Excel файлу
+        """
+        self.job_id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.status = "queued"
+        self.phase = "queued"
+        self.rows_processed = 0
+        self.report: Dict[str, Any] = STEImportService.new_report()
+        self.parser = ExcelParser()
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started: Optional[float] = None
+        self._elapsed: Optional[float] = None
+    
+    @property
+    def is_finished(self) -> bool:
+        """Завершена ли задача (успешно или с ошибкой)"""
+        return self.status in ("completed", "failed")
+    
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        """Скорость обработки строк"""
+        if self._started is None:
+            return None
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else None
+    
+    def start(self) -> None:
+        """Отмечает начало выполнения"""
+        self.status = "running"
+        self.phase = "importing"
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+    
+    def finish(self, status: str) -> None:
+        """
+        Отмечает завершение.
+        
+        Args:
+            status: completed или failed
+        """
+        self.status = status
+        self.phase = "done"
+        self.finished_at = datetime.now()
+        if self._started is not None:
+            self._elapsed = time.perf_counter() - self._started
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Состояние задачи для API"""
+        errors = self.report["errors"]
+        return {
+            "job_id": self.job_id,
+            "file_path": self.file_path,
+            "status": self.status,
+            "phase": self.phase,
+            "rows_processed": self.rows_processed,
+            "imported": self.report["imported"],
+            "updated": self.report["updated"],
+            "unchanged": self.report["unchanged"],
+            "removed_count": len(self.report.get("removed", [])),
+            "affected_categories": sorted(self.report["affected_categories"]),
+            "sheet_stats": [dict(stats) for stats in self.parser.sheet_stats],
+            "rows_per_second": self.rows_per_second,
+            "errors_count": len(errors),
+            "errors": errors[:10],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ImportJobManager:
+    """
+    Запускает импорт в фоне и хранит состояние задач процесса.
+    
+    Файл парсится в рабочем потоке (по пачке за раз, следующая пачка читается,
+    пока пишется текущая), запись идет пачками через STEImportService.
+    Одновременно выполняется не больше одного импорта - во всех процессах, работающих
+    с БД: задача держит файловую блокировку IMPORT_LOCK_PATH до завершения.
+    """
+    
+    def __init__(self, session_factory=None, lock_path: Optional[str] = None):
+        """
+        Инициализация менеджера.
+        
+        Args:
+            session_factory: Фабрика сессий БД (по умолчанию AsyncSessionLocal)
+            lock_path: Файл блокировки импорта (по умолчанию settings.IMPORT_LOCK_PATH)
+        """
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.lock = FileLock(lock_path or settings.IMPORT_LOCK_PATH)
+        self.jobs: Dict[str, ImportJob] = {}
+        self.current: Optional[ImportJob] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        """Получить задачу по ID"""
+        return self.jobs.get(job_id)
+    
+    def start(self, file_path: str) -> ImportJob:
+        """
+        Создает задачу импорта и запускает ее в фоне.
+        Должен вызываться из работающего event loop.
+        
+        Args:
+            file_path: Путь к Excel файлу
+        
+        Returns:
+            Созданная задача
+        
+        Raises:
+            ImportAlreadyRunningError: если импорт уже выполняется (в этом или другом процессе)
+        """
+        if self.current is not None and not self.current.is_finished:
+            raise ImportAlreadyRunningError(self.current.job_id)
+        
+        job = ImportJob(file_path)
+        if not self.lock.acquire(blocking=False, owner=job.job_id):
+            # Импорт идет в другом воркере или скрипте: в файле блокировки - ID его задачи
+            raise ImportAlreadyRunningError(self.lock.owner() or "в другом процессе")
+        self.jobs[job.job_id] = job
+        self.current = job
+        self._forget_old_jobs()
+        
+        task = asyncio.create_task(self._run(job))
+        # Храним ссылку на задачу, чтобы ее не собрал сборщик мусора
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+    
+    def _forget_old_jobs(self) -> None:
+        """Удаляет самые старые завершенные задачи сверх MAX_FINISHED_JOBS"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+    
+    async def _run(self, job: ImportJob) -> None:
+        """
+        Выполняет импорт: парсинг в рабочем потоке, запись пачками, затем снимок каталога
+        и пересчет значимых характеристик затронутых категорий.
+        
+        Args:
+            job: Задача импорта
+        """
+        service = STEImportService()
+        job.start()
+        try:
+            batches: Iterator[List[Dict[str, Any]]] = iter_ste_file(
+                job.file_path, service.batch_size, parser=job.parser
+            )
+            
+            async with self.session_factory() as session:
+                next_batch = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+                while True:
+                    batch = await next_batch
+                    if batch is None:
+                        break
+                    # Следующая пачка парсится, пока пишется текущая
+                    next_batch = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+                    job.rows_processed += len(batch)
+                    await service.import_chunk(session, batch, job.report)
+                
+                job.phase = "categories"
+                await service.finish(session, job.report)
+                
+                job.phase = "snapshot"
+                try:
+                    snapshot = await catalog_snapshot_store.build(session)
+                except Exception as e:
+                    # Импорт выполнен: без снимка группировка читает СТЕ из БД
+                    snapshot = None
+                    logger.error(f"Не удалось собрать снимок каталога после импорта {job.job_id}: {e}")
+                
+                # Сохраненные значимые характеристики измененных категорий устарели
+                job.phase = "characteristics"
+                results = await CharacteristicAnalyzer().refresh_categories(
+                    session, job.report["affected_categories"], job.report["categories"], snapshot=snapshot
+                )
+                for cat_id, error in results.items():
+                    if error:
+                        job.report["errors"].append(f"Ошибка при анализе характеристик категории {cat_id}: {error}")
+            
+            job.finish("completed")
+            logger.info(
+                "Импорт %s завершен: добавлено %s, обновлено %s, без изменений %s, ошибок %s",
+                job.job_id, job.report["imported"], job.report["updated"], job.report["unchanged"],
+                len(job.report["errors"])
+            )
+        except Exception as e:
+            job.report["errors"].append(f"Ошибка при импорте: {str(e)}")
+            job.finish("failed")
+            logger.error(f"Импорт {job.job_id} завершился ошибкой: {e}")
+        finally:
+            self.lock.release()
+            # СТЕ могли измениться (в т.ч. при частичном импорте): сбрасываются total поиска
+            # и ответы со СТЕ - сами СТЕ и агрегации, в которые они входят
+            total_count_cache.invalidate("ste")
+            response_cache.invalidate("ste")
+            response_cache.invalidate("aggregation")
+
+
+# Менеджер задач импорта процесса
+import_job_manager = ImportJobManager()
+
+
+def get_import_job_manager() -> ImportJobManager:
+    """Получить менеджер задач импорта процесса"""
+    return import_job_manager
@@ -0,0 +1,291 @@
+"""
+Сервис массового импорта СТЕ в базу данных
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models.database import STE, Category
+from app.config import settings
+from itertools import islice
+import hashlib
+import json
+
+
+# Поля СТЕ, которые приходят из парсера и записываются в БД
+STE_IMPORT_FIELDS = (
+    "ste_id",
+    "name",
+    "image_url",
+    "model",
+    "country",
+    "manufacturer",
+    "category_id",
+    "category_name",
+    "characteristics",
+    "characteristics_raw",
+)
+
+
+def content_hash(ste_data: Dict[str, Any]) -> str:
+    """
+    Хэш разобранных полей СТЕ: по нему повторный импорт пропускает неизмененные строки.
+    
+    Args:
+        ste_data: Словарь СТЕ из парсера
+    
+    Returns:
+        SHA-1 (hex) от значений STE_IMPORT_FIELDS
+    """
+    payload = json.dumps(
+        [ste_data.get(field) for field in STE_IMPORT_FIELDS],
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Разбивает поток на списки фиксированного размера.
+    
+    Args:
+        items: Исходный поток
+        size: Размер списка
+    
+    Returns:
+        Итератор списков (последний может быть короче)
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class STEImportService:
+    """
+    Импорт СТЕ пачками через INSERT ... ON CONFLICT(ste_id) DO UPDATE.
+    
+    Записываются только новые СТЕ и СТЕ, у которых изменился content_hash;
+    отчет содержит затронутые категории и ste_id, пропавшие из файла.
+    """
+    
+    def __init__(self, batch_size: int = None):
+        """
+        Инициализация сервиса.
+        
+        Args:
+            batch_size: Размер пачки (по умолчанию settings.IMPORT_BATCH_SIZE)
+        """
+        self.batch_size = max(1, batch_size or settings.IMPORT_BATCH_SIZE)
+    
+    @staticmethod
+    def _upsert_statement():
+        """Оператор upsert СТЕ по ste_id"""
+        stmt = sqlite_insert(STE.__table__)
+        update_fields = {
+            field: stmt.excluded[field]
+            for field in STE_IMPORT_FIELDS + ("content_hash",)
+            if field != "ste_id"
+        }
+        update_fields["updated_at"] = func.now()
+        return stmt.on_conflict_do_update(index_elements=["ste_id"], set_=update_fields)
+    
+    async def _existing_rows(self, session: AsyncSession, ste_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """Возвращает {ste_id: (content_hash, category_id)} для ste_id из списка, которые уже есть в БД"""
+        result = await session.execute(
+            select(STE.ste_id, STE.content_hash, STE.category_id).where(STE.ste_id.in_(ste_ids))
+        )
+        return {ste_id: (row_hash, category_id) for ste_id, row_hash, category_id in result.all()}
+    
+    async def _write_rows(
+        self,
+        session: AsyncSession,
+        rows: List[Dict[str, Any]],
+        errors: List[str]
+    ) -> set:
+        """
+        Записывает пачку одним executemany и фиксирует транзакцию.
+        Если пачка не записалась целиком, повторяет построчно, чтобы найти ошибочные строки.
+        
+        Args:
+            session: Сессия БД
+            rows: Строки для записи
+            errors: Список ошибок импорта (дополняется на месте)
+        
+        Returns:
+            Множество ste_id, которые не удалось записать
+        """
+        stmt = self._upsert_statement()
+        try:
+            await session.execute(stmt, rows)
+            await session.commit()
+            return set()
+        except Exception:
+            await session.rollback()
+        
+        failed = set()
+        for row in rows:
+            try:
+                await session.execute(stmt, [row])
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                failed.add(row["ste_id"])
+                errors.append(f"Ошибка при импорте СТЕ {row['ste_id']}: {str(e)}")
+        return failed
+    
+    @staticmethod
+    def new_report() -> Dict[str, Any]:
+        """
+        Пустой отчет импорта.
+        
+        Returns:
+            Словарь: imported, updated, unchanged, errors, categories {category_id: название},
+            affected_categories (множество), seen_ste_ids (множество ste_id из файла)
+        """
+        return {
+            "imported": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "errors": [],
+            "categories": {},
+            "affected_categories": set(),
+            "seen_ste_ids": set(),
+        }
+    
+    async def import_chunk(
+        self,
+        session: AsyncSession,
+        chunk: List[Dict[str, Any]],
+        report: Dict[str, Any]
+    ) -> None:
+        """
+        Импортирует одну пачку СТЕ и обновляет отчет.
+        
+        Args:
+            session: Сессия БД
+            chunk: Пачка словарей СТЕ из парсера
+            report: Отчет импорта из new_report (изменяется на месте)
+        """
+        rows: Dict[str, Dict[str, Any]] = {}
+        for ste_data in chunk:
+            if not ste_data.get("ste_id") or not ste_data.get("name"):
+                report["errors"].append(
+                    f"Ошибка при импорте СТЕ {ste_data.get('ste_id', 'unknown')}: нет ID или названия"
+                )
+                continue
+            
+            cat_id = ste_data.get("category_id")
+            if cat_id and ste_data.get("category_name"):
+                report["categories"].setdefault(cat_id, ste_data["category_name"])
+            
+            # Повтор ste_id в пачке перезаписывает предыдущую строку, как и при построчном обновлении
+            rows[ste_data["ste_id"]] = {field: ste_data.get(field) for field in STE_IMPORT_FIELDS}
+        
+        if not rows:
+            return
+        
+        report["seen_ste_ids"].update(rows)
+        existing = await self._existing_rows(session, list(rows))
+        
+        # Пишем только новые и измененные строки
+        changed = []
+        for ste_id, row in rows.items():
+            row["content_hash"] = content_hash(row)
+            old_hash, old_category_id = existing.get(ste_id, (None, None))
+            if old_hash == row["content_hash"]:
+                report["unchanged"] += 1
+                continue
+            changed.append(row)
+            for cat_id in (row["category_id"], old_category_id):
+                if cat_id:
+                    report["affected_categories"].add(cat_id)
+        
+        if not changed:
+            return
+        
+        failed = await self._write_rows(session, changed, report["errors"])
+        for row in changed:
+            if row["ste_id"] in failed:
+                continue
+            if row["ste_id"] in existing:
+                report["updated"] += 1
+            else:
+                report["imported"] += 1
+    
+    async def upsert_categories(self, session: AsyncSession, categories: Dict[str, str]) -> None:
+        """
+        Создает отсутствующие категории.
+        
+        Args:
+            session: Сессия БД
+            categories: Словарь {category_id: название}
+        """
+        rows = [
+            {"category_id": cat_id, "name": cat_name, "significant_characteristics": []}
+            for cat_id, cat_name in categories.items()
+        ]
+        for chunk in iter_chunks(rows, self.batch_size):
+            stmt = sqlite_insert(Category.__table__).on_conflict_do_nothing(
+                index_elements=["category_id"]
+            )
+            await session.execute(stmt, chunk)
+        await session.commit()
+    
+    async def find_removed(self, session: AsyncSession, seen_ste_ids: set) -> List[str]:
+        """
+        Находит СТЕ, которые есть в БД, но отсутствуют в импортированном файле.
+        
+        Args:
+            session: Сессия БД
+            seen_ste_ids: ste_id из файла
+        
+        Returns:
+            Отсортированный список пропавших ste_id
+        """
+        result = await session.execute(select(STE.ste_id))
+        return sorted(set(result.scalars().all()) - seen_ste_ids)
+    
+    async def finish(self, session: AsyncSession, report: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Завершает импорт: создает категории и дополняет отчет пропавшими СТЕ.
+        
+        Args:
+            session: Сессия БД
+            report: Отчет импорта из new_report
+        
+        Returns:
+            Отчет, в котором seen_ste_ids заменен на removed (список ste_id),
+            а affected_categories - отсортированный список
+        """
+        await self.upsert_categories(session, report["categories"])
+        report["removed"] = await self.find_removed(session, report.pop("seen_ste_ids"))
+        report["affected_categories"] = sorted(report["affected_categories"])
+        return report
+    
+    async def import_stes(
+        self,
+        session: AsyncSession,
+        ste_iter: Iterable[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Импортирует поток СТЕ пачками, фиксируя транзакцию после каждой пачки.
+        
+        Args:
+            session: Сессия БД
+            ste_iter: Поток словарей СТЕ из парсера
+        
+        Returns:
+            Отчет: imported, updated, unchanged, errors, categories {category_id: название},
+            affected_categories (категории с новыми или измененными СТЕ) и removed (ste_id, пропавшие из файла)
+        """
+        report = self.new_report()
+        
+        for chunk in iter_chunks(ste_iter, self.batch_size):
+            await self.import_chunk(session, chunk, report)
+        
+        return await self.finish(session, report)
@@ -0,0 +1,115 @@
+"""
+Лексическая схожесть текстов: TF-IDF по символьным n-граммам (без модели embeddings)
+"""
+from typing import List
+from scipy import sparse
+from app.config import settings
+import numpy as np
+
+
+def tfidf_vectors(texts: List[str]) -> sparse.csr_matrix:
+    """
+    Векторы TF-IDF по символьным n-граммам внутри слов, обученные на самих текстах
+    (представителях групп одной категории: веса n-грамм отражают ее словарь).
+    Строки L2-нормализованы - скалярное произведение равно косинусной схожести.
+    
+    Args:
+        texts: Тексты
+    
+    Returns:
+        Разреженная матрица (len(texts) x число n-грамм)
+    """
+    # scikit-learn импортируется только при выборе tfidf: импорт занимает секунды на старте сервиса
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    
+    vectorizer = TfidfVectorizer(
+        analyzer="char_wb",
+        ngram_range=(settings.TFIDF_NGRAM_MIN, settings.TFIDF_NGRAM_MAX),
+        lowercase=True,
+        sublinear_tf=True,
+        dtype=np.float32
+    )
+    try:
+        return vectorizer.fit_transform(texts).tocsr()
+    except ValueError:
+        # Все тексты пустые или короче n-граммы - словарь пуст
+        return sparse.csr_matrix((len(texts), 1), dtype=np.float32)
+
+
+def tfidf_similarity_block(vectors: sparse.csr_matrix, start: int, stop: int) -> np.ndarray:
+    """
+    Блок матрицы косинусной схожести: строки [start, stop) против всех текстов.
+    
+    Args:
+        vectors: Векторы из tfidf_vectors
+        start: Первая строка блока
+        stop: Строка, следующая за последней строкой блока
+    
+    Returns:
+        Матрица схожести (stop - start) x len(vectors), значения в [0, 1]
+    """
+    block = np.empty((stop - start, vectors.shape[0]), dtype=np.float32)
+    # Разреженная матрица на плотный срез: результат все равно плотный, а произведение
+    # двух разреженных матриц в scipy в разы медленнее. Срез (число n-грамм x строки)
+    # растет со словарем, поэтому строки блока берутся частями не больше TFIDF_DENSE_BLOCK_BYTES
+    step = max(1, settings.TFIDF_DENSE_BLOCK_BYTES // (4 * max(1, vectors.shape[1])))
+    for part_start in range(start, stop, step):
+        part_stop = min(part_start + step, stop)
+        dense = vectors[part_start:part_stop].T.toarray()
+        block[part_start - start:part_stop - start] = (vectors @ dense).T
+    np.clip(block, 0.0, 1.0, out=block)
+    return block
+
+
+def tfidf_pair_similarities(vectors: sparse.csr_matrix, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+    Точная косинусная схожесть заданных пар текстов.
+    
+    Args:
+        vectors: Векторы из tfidf_vectors
+        rows: Индексы первых текстов пар
+        cols: Индексы вторых текстов пар
+    
+    Returns:
+        Схожести пар float32, значения в [0, 1]
+    """
+    similarities = np.empty(len(rows), dtype=np.float32)
+    chunk = max(1, settings.SIMILARITY_BLOCK_SIZE) * 32
+    for start in range(0, len(rows), chunk):
+        stop = min(start + chunk, len(rows))
+        products = vectors[rows[start:stop]].multiply(vectors[cols[start:stop]])
+        similarities[start:stop] = np.asarray(products.sum(axis=1)).ravel()
+    np.clip(similarities, 0.0, 1.0, out=similarities)
+    return similarities
+
+
+def tfidf_reduce(vectors: sparse.csr_matrix, components: int = None) -> np.ndarray:
+    """
+    Плотные векторы для ANN-индекса: проекция TF-IDF через TruncatedSVD,
+    обученный на выборке текстов, с L2-нормализацией строк.
+    
+    Args:
+        vectors: Векторы из tfidf_vectors
+        components: Размерность (по умолчанию settings.TFIDF_SVD_COMPONENTS)
+    
+    Returns:
+        Матрица float32 (len(vectors) x components)
+    """
+    from sklearn.decomposition import TruncatedSVD
+    
+    components = components or settings.TFIDF_SVD_COMPONENTS
+    n, vocabulary = vectors.shape
+    if vocabulary <= components:
+        # Словарь меньше размерности - проецировать не нужно
+        reduced = vectors.toarray()
+    else:
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, min(n, settings.TFIDF_SVD_SAMPLE_SIZE), replace=False))
+        svd = TruncatedSVD(n_components=components, random_state=0).fit(vectors[sample])
+        reduced = svd.transform(vectors)
+    
+    reduced = np.ascontiguousarray(reduced, dtype=np.float32)
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    reduced /= norms
+    return reduced
@@ -0,0 +1,168 @@
+"""
+Реестр ML-моделей процесса: модель embeddings загружается один раз при старте
+"""
+from typing import Any, Dict, Optional
+from app.config import settings
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _current_rss_mb() -> Optional[float]:
+    """
+    Возвращает резидентную память процесса в МБ.
+    
+    Returns:
+        RSS в МБ или None, если /proc недоступен
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class EmbeddingModelRegistry:
+    """Реестр модели embeddings, общий для всех запросов процесса"""
+    
+    def __init__(self, model_name: Optional[str] = None, device: Optional[str] = None, backend: Optional[str] = None):
+        """
+        Инициализация реестра.
+        
+        Args:
+            model_name: Название модели (по умолчанию settings.EMBEDDING_MODEL)
+            device: Устройство (по умолчанию cuda при USE_CUDA, иначе cpu)
+            backend: Бэкенд модели: torch или onnx (по умолчанию settings.EMBEDDING_BACKEND)
+        """
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.backend = backend or settings.EMBEDDING_BACKEND
+        self.device = device or ("cuda" if settings.USE_CUDA else "cpu")
+        if self.backend == "onnx":
+            self.device = "cpu"
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_time_seconds: Optional[float] = None
+        self.warmup_time_seconds: Optional[float] = None
+        self.parameters_memory_mb: Optional[float] = None
+        self.rss_delta_mb: Optional[float] = None
+        self.last_error: Optional[str] = None
+    
+    @property
+    def is_loaded(self) -> bool:
+        """Загружена ли модель"""
+        return self._model is not None
+    
+    @property
+    def cache_model_name(self) -> str:
+        """Название модели в ключах кэша embeddings: векторы квантованной модели ONNX отличаются от PyTorch"""
+        if self.backend == "onnx":
+            return f"{self.model_name}@onnx-{'int8' if settings.ONNX_QUANTIZE else 'fp32'}"
+        return self.model_name
+    
+    def _create_model(self) -> Any:
+        """Создает модель выбранного бэкенда (PyTorch импортируется только для бэкенда torch и экспорта ONNX)"""
+        if self.backend == "onnx":
+            from app.services.onnx_embedding import load_onnx_model
+            return load_onnx_model(
+                self.model_name,
+                settings.ONNX_MODEL_DIR,
+                quantize=settings.ONNX_QUANTIZE,
+                intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+                inter_op_threads=settings.ONNX_INTER_OP_THREADS
+            )
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name, device=self.device)
+    
+    def load(self, warmup: bool = True) -> Any:
+        """
+        Загружает и прогревает модель. Повторные вызовы возвращают уже загруженную.
+        
+        Args:
+            warmup: Выполнить пробный encode, чтобы первый запрос не платил за инициализацию
+        
+        Returns:
+            Загруженная модель
+        """
+        if self._model is not None:
+            return self._model
+        
+        with self._lock:
+            if self._model is not None:
+                return self._model
+            
+            rss_before = _current_rss_mb()
+            started = time.perf_counter()
+            try:
+                model = self._create_model()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.load_time_seconds = round(time.perf_counter() - started, 3)
+            
+            if warmup:
+                started = time.perf_counter()
+                model.encode(["прогрев модели"], show_progress_bar=False)
+                self.warmup_time_seconds = round(time.perf_counter() - started, 3)
+            
+            rss_after = _current_rss_mb()
+            if rss_before is not None and rss_after is not None:
+                self.rss_delta_mb = round(rss_after - rss_before, 1)
+            if self.backend == "onnx":
+                self.parameters_memory_mb = round(model.model_size_mb, 1)
+            else:
+                self.parameters_memory_mb = round(
+                    sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024), 1
+                )
+            self.last_error = None
+            self._model = model
+            
+            logger.info(
+                "Модель %s (%s) загружена за %.2f с (параметры: %s МБ)",
+                self.model_name, self.backend, self.load_time_seconds, self.parameters_memory_mb
+            )
+        
+        return self._model
+    
+    def get_model(self) -> Any:
+        """Возвращает модель, загружая её при первом обращении"""
+        if self._model is None:
+            return self.load()
+        return self._model
+    
+    def set_num_threads(self, threads: int) -> None:
+        """
+        Пересоздает сессию уже загруженной модели ONNX с другим числом потоков
+        (сессия onnxruntime, унаследованная процессом-воркером при fork, не используется как есть).
+        
+        Args:
+            threads: Потоков внутри оператора
+        """
+        if self.backend == "onnx" and self._model is not None and hasattr(self._model, "set_num_threads"):
+            self._model.set_num_threads(threads, settings.ONNX_INTER_OP_THREADS)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Состояние реестра для /health"""
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "device": self.device,
+            "loaded": self.is_loaded,
+            "load_time_seconds": self.load_time_seconds,
+            "warmup_time_seconds": self.warmup_time_seconds,
+            "parameters_memory_mb": self.parameters_memory_mb,
+            "rss_delta_mb": self.rss_delta_mb,
+            "last_error": self.last_error,
+        }
+
+
+# Реестр процесса
+model_registry = EmbeddingModelRegistry()
+
+
+def get_model_registry() -> EmbeddingModelRegistry:
+    """Получить реестр моделей процесса"""
+    return model_registry
@@ -0,0 +1,261 @@
+"""
+Модель embeddings в ONNX: однократный экспорт из sentence-transformers, int8-квантование
+и инференс через onnxruntime на CPU (без импорта PyTorch)
+"""
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+from app.utils.file_lock import FileLock, replace_directory
+import numpy as np
+import json
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+
+# Версия формата: каталог другой версии экспортируется заново
+ONNX_EXPORT_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+# Версия набора операторов ONNX при экспорте
+ONNX_OPSET = 17
+
+
+def model_directory(root: str, model_name: str) -> Path:
+    """Каталог экспорта модели внутри root (имя модели с "/" - путь на Hugging Face)"""
+    return Path(root) / model_name.replace("/", "__")
+
+
+def _read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    """Манифест экспорта или None, если экспорта нет или он другой версии"""
+    try:
+        with open(directory / MANIFEST_NAME, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != ONNX_EXPORT_VERSION:
+        return None
+    return manifest
+
+
+def export_onnx_model(model_name: str, directory: Path, quantize: bool = True) -> Dict[str, Any]:
+    """
+    Экспортирует модель sentence-transformers в ONNX целиком - трансформер вместе с
+    pooling и нормализацией, выход графа - готовый вектор предложения.
+    Требует PyTorch и sentence-transformers; каталог подменяется атомарно
+    (replace_directory), поэтому процессы, уже загрузившие модель, не затрагиваются.
+    
+    Args:
+        model_name: Название модели sentence-transformers (или путь к ней)
+        directory: Каталог экспорта
+        quantize: Дополнительно сохранить модель с весами int8 (динамическое квантование)
+    
+    Returns:
+        Манифест экспорта
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+    tokenizer = model.tokenizer
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in tokenizer.model_input_names
+    ]
+    
+    class SentenceEmbedding(torch.nn.Module):
+        """Модель sentence-transformers с позиционными входами - для трассировки"""
+        
+        def __init__(self):
+            super().__init__()
+            self.model = model
+        
+        def forward(self, *inputs):
+            return self.model(dict(zip(input_names, inputs)))["sentence_embedding"]
+    
+    staging = directory.with_name(f"{directory.name}.tmp{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    
+    sample = tokenizer(["пример названия товара", "товар"], padding=True, return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            SentenceEmbedding(),
+            tuple(sample[name] for name in input_names),
+            str(staging / MODEL_FILE),
+            input_names=input_names,
+            output_names=["sentence_embedding"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "sentence_embedding": {0: "batch"},
+            },
+            opset_version=ONNX_OPSET,
+            dynamo=False
+        )
+    
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        # Вывод форм и слияние узлов перед квантованием: больше MatMul получают веса int8
+        prepared = staging / "model.prepared.onnx"
+        quant_pre_process(str(staging / MODEL_FILE), str(prepared), skip_symbolic_shape=True)
+        quantize_dynamic(str(prepared), str(staging / QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+        prepared.unlink()
+    
+    tokenizer.backend_tokenizer.save(str(staging / TOKENIZER_FILE))
+    manifest = {
+        "version": ONNX_EXPORT_VERSION,
+        "model": model_name,
+        "input_names": input_names,
+        "max_seq_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "quantized": quantize,
+    }
+    with open(staging / MANIFEST_NAME, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=2)
+    
+    replace_directory(staging, directory)
+    logger.info("Модель %s экспортирована в ONNX: %s (int8: %s)", model_name, directory, quantize)
+    return manifest
+
+
+class OnnxEmbeddingModel:
+    """Модель embeddings на onnxruntime с интерфейсом encode, как у SentenceTransformer"""
+    
+    def __init__(
+        self,
+        directory: Path,
+        quantized: bool = True,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 1
+    ):
+        """
+        Загружает экспортированную модель.
+        
+        Args:
+            directory: Каталог экспорта (export_onnx_model)
+            quantized: Использовать модель с весами int8
+            intra_op_threads: Потоков внутри оператора (0 - по умолчанию onnxruntime, по числу ядер)
+            inter_op_threads: Потоков для параллельных операторов графа
+        
+        Raises:
+            FileNotFoundError: если экспорта нет или в нем нет модели int8
+        """
+        from tokenizers import Tokenizer
+        
+        self.directory = Path(directory)
+        manifest = _read_manifest(self.directory)
+        if manifest is None:
+            raise FileNotFoundError(f"Нет экспорта модели ONNX в {self.directory}")
+        if quantized and not manifest.get("quantized"):
+            raise FileNotFoundError(f"В {self.directory} нет модели int8")
+        self.manifest = manifest
+        self.model_path = self.directory / (QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+        self.input_names: List[str] = manifest["input_names"]
+        
+        self.tokenizer = Tokenizer.from_file(str(self.directory / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=manifest["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=manifest["pad_token_id"], pad_token=manifest["pad_token"])
+        
+        self.session = None
+        self.set_num_threads(intra_op_threads, inter_op_threads)
+    
+    @property
+    def model_size_mb(self) -> float:
+        """Размер файла модели в МБ (веса int8 или float32)"""
+        return self.model_path.stat().st_size / (1024 * 1024)
+    
+    def set_num_threads(self, intra_op_threads: int, inter_op_threads: int = 1) -> None:
+        """
+        Пересоздает сессию onnxruntime с другим числом потоков
+        (например, в процессе-воркере, где параллелизм дают сами процессы).
+        """
+        import onnxruntime
+        
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(self.model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+    
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Кодирует тексты батчами. Как и sentence-transformers, тексты сортируются по длине,
+        чтобы в батче было меньше паддинга.
+        
+        Args:
+            sentences: Тексты
+            batch_size: Размер батча
+        
+        Returns:
+            Матрица векторов float32 (len(sentences) x dim) в исходном порядке текстов
+        """
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        embeddings = np.zeros((len(sentences), self.manifest["dimension"]), dtype=np.float32)
+        order = np.argsort([-len(text) for text in sentences], kind="stable")
+        
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([sentences[index] for index in batch])
+            inputs = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            (vectors,) = self.session.run(None, {name: inputs[name] for name in self.input_names})
+            embeddings[batch] = vectors
+        
+        return embeddings
+
+
+def load_onnx_model(
+    model_name: str,
+    root: str,
+    quantize: bool = True,
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 1
+) -> OnnxEmbeddingModel:
+    """
+    Загружает модель из каталога экспорта, при первой загрузке экспортируя ее.
+    
+    Args:
+        model_name: Название модели sentence-transformers
+        root: Каталог экспортированных моделей
+        quantize: Использовать модель с весами int8
+        intra_op_threads: Потоков внутри оператора (0 - по числу ядер)
+        inter_op_threads: Потоков для параллельных операторов графа
+    
+    Returns:
+        Модель на onnxruntime
+    """
+    directory = model_directory(root, model_name)
+    
+    def exported() -> bool:
+        manifest = _read_manifest(directory)
+        return manifest is not None and manifest.get("model") == model_name and (not quantize or manifest.get("quantized"))
+    
+    if not exported():
+        # Воркеры uvicorn стартуют одновременно: экспортирует первый, захвативший блокировку,
+        # остальные дожидаются его и загружают готовый экспорт
+        with FileLock(directory.with_name(f"{directory.name}.export.lock")):
+            if not exported():
+                export_onnx_model(model_name, directory, quantize=quantize)
+    return OnnxEmbeddingModel(directory, quantize, intra_op_threads, inter_op_threads)
@@ -0,0 +1,354 @@
+"""
+Кэш готовых ответов GET-эндпоинтов (LRU с временем жизни) и проверка ETag
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from pathlib import Path
+from fastapi import Request, Response
+from app.config import settings
+from app.utils.file_lock import FileLock
+from app.utils.serialization import dumps
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    """Сериализованный ответ"""
+    body: bytes
+    etag: str
+    stored_at: float
+
+
+class InvalidationLog:
+    """
+    Журнал сбросов кэша ответов в файле, общий для всех процессов.
+    
+    Сброс дописывается строкой JSON [вид, идентификатор]; каждый процесс помнит,
+    до какого места прочитал журнал, и перед обращением к кэшу применяет новые строки
+    (проверка - один stat файла). Переполненный журнал заменяется пустым файлом:
+    процесс, заметивший смену файла, не знает пропущенных сбросов и очищает кэш целиком.
+    """
+    
+    def __init__(self, path, max_bytes: Optional[int] = None):
+        """
+        Инициализация журнала.
+        
+        Args:
+            path: Путь к файлу журнала
+            max_bytes: Размер, после которого журнал начинается заново
+                (по умолчанию settings.RESPONSE_CACHE_INVALIDATION_LOG_MAX_BYTES)
+        """
+        self.path = Path(path)
+        self.max_bytes = settings.RESPONSE_CACHE_INVALIDATION_LOG_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = FileLock(self.path.with_name(f"{self.path.name}.lock"))
+        # Сбросы, записанные до создания кэша, не нужны: читаем с текущего конца журнала
+        stat = self._stat()
+        self._inode: Optional[int] = stat.st_ino if stat is not None else None
+        self._offset = stat.st_size if stat is not None else 0
+    
+    def _stat(self) -> Optional[os.stat_result]:
+        """stat файла журнала (None, если его нет)"""
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            return None
+    
+    def append(self, kind: str, key: Optional[Hashable]) -> None:
+        """
+        Дописывает сброс в журнал.
+        
+        Args:
+            kind: Вид ответа
+            key: Идентификатор (JSON-совместимый); None - все ответы вида
+        """
+        line = (json.dumps([kind, key], ensure_ascii=False) + "\n").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stat = self._stat()
+            if stat is not None and stat.st_size + len(line) > self.max_bytes:
+                # Новый файл (другой inode): остальные процессы очистят кэш целиком
+                staging = self.path.with_name(f"{self.path.name}.tmp{os.getpid()}")
+                staging.write_bytes(line)
+                os.replace(staging, self.path)
+                return
+            with open(self.path, "ab") as log_file:
+                log_file.write(line)
+    
+    def read_new(self) -> Optional[List[Tuple[str, Optional[Hashable]]]]:
+        """
+        Сбросы, дописанные с прошлого вызова.
+        
+        Returns:
+            Список (вид, идентификатор) или None, если журнал начат заново
+            или удален - кэш нужно очистить целиком
+        """
+        stat = self._stat()
+        if stat is None:
+            if self._inode is None:
+                return []
+            # Журнал удален - какие сбросы пропущены, неизвестно
+            self._inode, self._offset = None, 0
+            return None
+        if stat.st_ino != self._inode:
+            if self._inode is not None:
+                # Журнал начат заново другим процессом
+                self._inode, self._offset = stat.st_ino, stat.st_size
+                return None
+            # Журнал создан после запуска процесса - читаем его с начала
+            self._inode, self._offset = stat.st_ino, 0
+        if stat.st_size <= self._offset:
+            return []
+        
+        with open(self.path, "rb") as log_file:
+            log_file.seek(self._offset)
+            data = log_file.read(stat.st_size - self._offset)
+        # Строку, которую другой процесс еще дописывает, прочитаем в следующий раз
+        complete = data.rfind(b"\n") + 1
+        self._offset += complete
+        entries = []
+        for line in data[:complete].splitlines():
+            try:
+                kind, key = json.loads(line)
+            except ValueError:
+                logger.warning("Некорректная строка журнала сбросов кэша %s: %r", self.path, line)
+                return None
+            entries.append((kind, key))
+        return entries
+
+
+class ResponseCache:
+    """
+    Кэш тел JSON-ответов по ключу (вид ответа, идентификатор).
+    
+    ETag - хэш тела, поэтому If-None-Match проверяется без обращения к БД,
+    пока ответ в кэше. Код, изменяющий данные, сбрасывает затронутые записи
+    через invalidate. У каждого воркера uvicorn свой кэш: сбросы передаются
+    через журнал (InvalidationLog) и применяются остальными воркерами перед
+    следующим обращением. Время жизни - страховка от записи в БД в обход invalidate.
+    """
+    
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        enabled: Optional[bool] = None,
+        invalidation_log: Optional[str] = None
+    ):
+        """
+        Инициализация кэша.
+        
+        Args:
+            max_entries: Максимум ответов (по умолчанию settings.RESPONSE_CACHE_MAX_ENTRIES)
+            max_bytes: Максимальный суммарный размер тел (по умолчанию settings.RESPONSE_CACHE_MAX_BYTES)
+            ttl: Время жизни ответа, секунд (по умолчанию settings.RESPONSE_CACHE_TTL)
+            enabled: Включен ли кэш (по умолчанию settings.RESPONSE_CACHE_ENABLED)
+            invalidation_log: Файл журнала сбросов (по умолчанию settings.RESPONSE_CACHE_INVALIDATION_LOG)
+        """
+        self.max_entries = settings.RESPONSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_bytes = settings.RESPONSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = settings.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.enabled = settings.RESPONSE_CACHE_ENABLED if enabled is None else enabled
+        self.invalidation_log = InvalidationLog(invalidation_log or settings.RESPONSE_CACHE_INVALIDATION_LOG)
+        self._entries: "OrderedDict[Tuple[str, Hashable], CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        # Растет при каждой инвалидации: ответ, собранный до нее, не кладется в кэш
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+    
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        """ETag тела ответа"""
+        return '"' + hashlib.sha1(body).hexdigest() + '"'
+    
+    @staticmethod
+    def etag_matches(request: Request, etag: str) -> bool:
+        """
+        Проверяет заголовок If-None-Match (список тегов, слабые теги, "*").
+        
+        Args:
+            request: Запрос
+            etag: Текущий ETag ответа
+        
+        Returns:
+            True, если клиент уже имеет этот ответ
+        """
+        header = request.headers.get("if-none-match")
+        if not header:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+        return "*" in tags or etag in tags
+    
+    def _remove(self, cache_key: Tuple[str, Hashable]) -> None:
+        """Удаляет запись (под блокировкой)"""
+        entry = self._entries.pop(cache_key)
+        self._bytes -= len(entry.body)
+    
+    def _invalidate_local(self, kind: str, key: Optional[Hashable]) -> int:
+        """Сбрасывает записи этого процесса (под блокировкой); возвращает их число"""
+        self._generation += 1
+        if key is not None:
+            cache_keys = [(kind, key)] if (kind, key) in self._entries else []
+        else:
+            cache_keys = [cache_key for cache_key in self._entries if cache_key[0] == kind]
+        for cache_key in cache_keys:
+            self._remove(cache_key)
+        return len(cache_keys)
+    
+    def _sync(self) -> None:
+        """Применяет сбросы из журнала, сделанные другими процессами (под блокировкой)"""
+        entries = self.invalidation_log.read_new()
+        if entries is None:
+            self._generation += 1
+            self.remote_invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return
+        for kind, key in entries:
+            self.remote_invalidations += self._invalidate_local(kind, key)
+    
+    def get(self, kind: str, key: Hashable) -> Optional[CachedResponse]:
+        """
+        Ответ из кэша.
+        
+        Args:
+            kind: Вид ответа ("ste", "aggregation", "ratings")
+            key: Идентификатор
+        
+        Returns:
+            Закэшированный ответ или None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._sync()
+            entry = self._entries.get((kind, key))
+            if entry is not None and time.monotonic() - entry.stored_at > self.ttl:
+                self._remove((kind, key))
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((kind, key))
+            self.hits += 1
+            return entry
+    
+    def put(self, kind: str, key: Hashable, body: bytes, generation: Optional[int] = None) -> CachedResponse:
+        """
+        Кладет ответ в кэш (вытесняя самые старые по обращению записи сверх лимитов).
+        
+        Args:
+            kind: Вид ответа
+            key: Идентификатор
+            body: Тело ответа
+            generation: Поколение кэша на момент чтения данных из БД; если с тех пор
+                была инвалидация, ответ мог устареть и не кэшируется
+        
+        Returns:
+            Ответ с ETag
+        """
+        entry = CachedResponse(body=body, etag=self.make_etag(body), stored_at=time.monotonic())
+        if not self.enabled or len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return entry
+            if (kind, key) in self._entries:
+                self._remove((kind, key))
+            self._entries[(kind, key)] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+    
+    def invalidate(self, kind: str, key: Optional[Hashable] = None) -> None:
+        """
+        Сбрасывает ответ (или все ответы вида) в этом процессе и дописывает сброс
+        в журнал для остальных процессов.
+        
+        Args:
+            kind: Вид ответа
+            key: Идентификатор (JSON-совместимый); None - все ответы вида
+        """
+        with self._lock:
+            self.invalidations += self._invalidate_local(kind, key)
+        if not self.enabled:
+            return
+        try:
+            self.invalidation_log.append(kind, key)
+        except OSError as e:
+            logger.error("Не удалось записать сброс кэша ответов в журнал %s: %s", self.invalidation_log.path, e)
+    
+    async def respond(
+        self,
+        request: Request,
+        kind: str,
+        key: Hashable,
+        build: Callable[[], Awaitable[Any]]
+    ) -> Response:
+        """
+        Отдает ответ из кэша или собирает его через build и кэширует.
+        Если If-None-Match совпадает с ETag - 304 без тела.
+        
+        Args:
+            request: Запрос
+            kind: Вид ответа
+            key: Идентификатор
+            build: Корутина, возвращающая содержимое ответа - словарь или модель
+                (исключения, например 404, не кэшируются)
+        
+        Returns:
+            JSON-ответ с ETag или 304
+        """
+        entry = self.get(kind, key)
+        if entry is None:
+            generation = self._generation
+            content = await build()
+            entry = self.put(kind, key, dumps(content), generation)
+        
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if self.etag_matches(request, entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша для /health"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations,
+        }
+
+
+# Глобальный кэш ответов
+response_cache = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    """Получить кэш ответов процесса"""
+    return response_cache
@@ -0,0 +1,274 @@
+"""
+Колоночное хранение строк в массивах numpy: пул символов + смещения, словарное кодирование
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+from pathlib import Path
+import numpy as np
+import shutil
+
+
+def encode_strings(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Кодирует колонку строк (с пропусками) в пул UTF-8 и смещения.
+    
+    Args:
+        values: Строки или None
+    
+    Returns:
+        Кортеж (пул байт uint8, смещения в символах int64 длины n+1, маска None bool)
+    """
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    texts = ["" if value is None else value for value in values]
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in texts], out=offsets[1:])
+    pool = np.frombuffer("".join(texts).encode("utf-8"), dtype=np.uint8)
+    return pool, offsets, nulls
+
+
+def decode_strings(pool: np.ndarray, offsets: np.ndarray, nulls: Optional[np.ndarray] = None) -> List[Optional[str]]:
+    """
+    Обратное к encode_strings: пул декодируется один раз, строки - срезы.
+    
+    Args:
+        pool: Пул байт
+        offsets: Смещения в символах
+        nulls: Маска None (если None - пропусков нет)
+    
+    Returns:
+        Список строк
+    """
+    text = pool.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    values = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+    if nulls is not None and nulls.any():
+        for index in np.flatnonzero(nulls).tolist():
+            values[index] = None
+    return values
+
+
+def encode_byte_strings(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Как encode_strings, но смещения - в байтах UTF-8: любую строку или диапазон строк
+    можно прочитать из пула, не декодируя его целиком.
+    
+    Args:
+        values: Строки или None
+    
+    Returns:
+        Кортеж (пул байт uint8, смещения в байтах int64 длины n+1, маска None bool)
+    """
+    nulls = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    encoded = [b"" if value is None else value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    pool = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return pool, offsets, nulls
+
+
+def decode_byte_strings(
+    pool: np.ndarray,
+    offsets: np.ndarray,
+    nulls: Optional[np.ndarray] = None,
+    start: int = 0,
+    stop: Optional[int] = None
+) -> List[Optional[str]]:
+    """
+    Обратное к encode_byte_strings для строк [start, stop).
+    
+    Args:
+        pool: Пул байт
+        offsets: Смещения в байтах
+        nulls: Маска None (если None - пропусков нет)
+        start: Первая строка
+        stop: Строка, следующая за последней (по умолчанию - до конца)
+    
+    Returns:
+        Список строк
+    """
+    stop = len(offsets) - 1 if stop is None else stop
+    bounds = offsets[start:stop + 1].tolist()
+    if not bounds:
+        return []
+    base = bounds[0]
+    data = pool[base:bounds[-1]].tobytes()
+    values = [data[begin - base:end - base].decode("utf-8") for begin, end in zip(bounds, bounds[1:])]
+    if nulls is not None:
+        for index in np.flatnonzero(nulls[start:stop]).tolist():
+            values[index] = None
+    return values
+
+
+def dictionary_encode(values: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Словарное кодирование: значения заменяются кодами в таблице уникальных значений.
+    
+    Args:
+        values: Строки
+    
+    Returns:
+        Кортеж (коды int32, уникальные значения в порядке первого появления)
+    """
+    table: Dict[str, int] = {}
+    codes = np.fromiter(
+        (table.setdefault(value, len(table)) for value in values),
+        dtype=np.int32,
+        count=len(values)
+    )
+    return codes, list(table)
+
+
+def save_arrays(directory: Path, arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Сохраняет массивы в отдельные .npy файлы (их можно открыть через mmap).
+    
+    Args:
+        directory: Каталог
+        arrays: Словарь {имя: массив}
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(array), allow_pickle=False)
+
+
+def load_array(directory: Path, name: str) -> np.ndarray:
+    """
+    Открывает массив из save_arrays без копирования в память (mmap, только чтение).
+    
+    Args:
+        directory: Каталог
+        name: Имя массива
+    
+    Returns:
+        Массив numpy, отображенный на файл
+    """
+    path = directory / f"{name}.npy"
+    try:
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    except ValueError:
+        # Пустой массив нельзя отобразить в память
+        return np.load(path, allow_pickle=False)
+
+
+class DictionaryEncoder:
+    """
+    Словарное кодирование порциями: таблица уникальных значений общая для всех порций
+    (в памяти растет только она, а не колонка кодов).
+    """
+    
+    def __init__(self):
+        self.table: Dict[str, int] = {}
+    
+    def encode(self, values: Sequence[str]) -> np.ndarray:
+        """
+        Кодирует порцию значений.
+        
+        Args:
+            values: Строки
+        
+        Returns:
+            Коды int32 в общей таблице
+        """
+        table = self.table
+        return np.fromiter(
+            (table.setdefault(value, len(table)) for value in values),
+            dtype=np.int32,
+            count=len(values)
+        )
+    
+    @property
+    def values(self) -> List[str]:
+        """Уникальные значения в порядке первого появления (код - индекс)"""
+        return list(self.table)
+
+
+class ColumnSpool:
+    """
+    Колонки, дописываемые порциями в файлы каталога: в памяти держится только текущая порция.
+    finish превращает файлы в .npy (их открывает load_array), как если бы колонки
+    целиком были сохранены save_arrays.
+    """
+    
+    def __init__(self, directory: Path):
+        """
+        Инициализация.
+        
+        Args:
+            directory: Каталог (создается)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Имя колонки -> [тип, число элементов, открытый файл]
+        self._columns: Dict[str, list] = {}
+        # Последнее смещение колонок смещений (append_lengths)
+        self._offsets: Dict[str, int] = {}
+    
+    def count(self, name: str) -> int:
+        """Число элементов, записанных в колонку"""
+        column = self._columns.get(name)
+        return column[1] if column else 0
+    
+    def append(self, name: str, array: np.ndarray) -> None:
+        """
+        Дописывает порцию одномерного массива (тип задает первая порция).
+        
+        Args:
+            name: Имя колонки (файл {name}.npy)
+            array: Порция
+        """
+        column = self._columns.get(name)
+        if column is None:
+            column = [array.dtype, 0, open(self.directory / f"{name}.raw", "wb")]
+            self._columns[name] = column
+        column[2].write(np.ascontiguousarray(array, dtype=column[0]).tobytes())
+        column[1] += len(array)
+    
+    def append_lengths(self, name: str, lengths: Sequence[int]) -> None:
+        """
+        Дописывает колонку смещений int64 длины n+1: первая порция начинается с 0,
+        следующие продолжают накопленную сумму длин.
+        
+        Args:
+            name: Имя колонки
+            lengths: Длины элементов порции
+        """
+        if name not in self._offsets:
+            self._offsets[name] = 0
+            self.append(name, np.zeros(1, dtype=np.int64))
+        offsets = np.cumsum(np.asarray(lengths, dtype=np.int64)) + self._offsets[name]
+        if len(offsets):
+            self._offsets[name] = int(offsets[-1])
+        self.append(name, offsets)
+    
+    def append_strings(self, name: str, values: Sequence[Optional[str]]) -> None:
+        """
+        Дописывает строки в формате encode_byte_strings: {name}.pool, {name}.offsets, {name}.nulls.
+        
+        Args:
+            name: Имя колонки
+            values: Строки или None
+        """
+        pool, offsets, nulls = encode_byte_strings(values)
+        self.append(f"{name}.pool", pool)
+        self.append_lengths(f"{name}.offsets", np.diff(offsets))
+        self.append(f"{name}.nulls", nulls)
+    
+    def finish(self) -> None:
+        """Превращает записанные колонки в .npy (данные копируются поблочно, без загрузки в память)"""
+        for name, (dtype, count, raw_file) in self._columns.items():
+            raw_file.close()
+            raw_path = self.directory / f"{name}.raw"
+            with open(self.directory / f"{name}.npy", "wb") as npy_file, open(raw_path, "rb") as source:
+                np.lib.format.write_array_header_1_0(npy_file, {
+                    "descr": np.lib.format.dtype_to_descr(dtype),
+                    "fortran_order": False,
+                    "shape": (count,),
+                })
+                shutil.copyfileobj(source, npy_file, 1024 * 1024)
+            raw_path.unlink()
+        self._columns = {}
+    
+    def close(self) -> None:
+        """Закрывает файлы без сохранения (при ошибке записи)"""
+        for _, _, raw_file in self._columns.values():
+            raw_file.close()
+        self._columns = {}
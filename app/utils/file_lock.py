@@ -0,0 +1,111 @@
+"""
+Межпроцессная блокировка через файл (flock): общая для воркеров uvicorn и скриптов
+"""
+from typing import Optional
+from pathlib import Path
+import fcntl
+import os
+import shutil
+import uuid
+
+
+class FileLock:
+    """
+    Эксклюзивная блокировка файла. Снимается при release или при завершении процесса
+    (блокировку держит открытый дескриптор - "зависших" блокировок не бывает).
+    В файл можно записать метку владельца, чтобы другие процессы видели, кто его держит.
+    """
+    
+    def __init__(self, path):
+        """
+        Инициализация блокировки.
+        
+        Args:
+            path: Путь к файлу блокировки (создается при захвате)
+        """
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+    
+    @property
+    def locked(self) -> bool:
+        """Держит ли блокировку этот объект"""
+        return self._fd is not None
+    
+    def acquire(self, blocking: bool = True, owner: Optional[str] = None) -> bool:
+        """
+        Захватывает блокировку.
+        
+        Args:
+            blocking: Ждать, пока блокировку отпустят (иначе сразу вернуть False)
+            owner: Метка владельца, записываемая в файл
+        
+        Returns:
+            True, если блокировка захвачена
+        """
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        if owner is not None:
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, owner.encode("utf-8"), 0)
+        self._fd = fd
+        return True
+    
+    def release(self) -> None:
+        """Отпускает блокировку (если она захвачена)"""
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            os.ftruncate(fd, 0)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+    
+    def owner(self) -> Optional[str]:
+        """Метка владельца из файла блокировки (None, если ее нет)"""
+        try:
+            owner = self.path.read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        return owner or None
+    
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+def replace_directory(staging: Path, target: Path) -> None:
+    """
+    Подменяет каталог target собранным каталогом staging.
+    
+    Подмены одного каталога из разных процессов выполняются по очереди (блокировка
+    {target}.lock); старый каталог сначала переименовывается в сторону и удаляется
+    после подмены - os.replace не падает на непустом каталоге. Процессы, открывшие
+    файлы старого каталога (mmap), дочитывают их: файлы удаляются после закрытия.
+    
+    Args:
+        staging: Собранный каталог (на той же файловой системе)
+        target: Заменяемый каталог (может отсутствовать)
+    """
+    with FileLock(target.with_name(f"{target.name}.lock")):
+        retired = target.with_name(f"{target.name}.old{uuid.uuid4().hex}")
+        try:
+            os.rename(target, retired)
+        except FileNotFoundError:
+            retired = None
+        os.replace(staging, target)
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
@@ -0,0 +1,182 @@
+"""
+Курсорная (keyset) пагинация и кэш общего количества результатов
+"""
+from typing import Any, Hashable, List, Literal, Optional, Sequence, Tuple
+from collections import OrderedDict
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+import base64
+import binascii
+import json
+import threading
+import time
+
+
+# Режим подсчета total: exact - точно (по умолчанию для поиска СТЕ), off - не считать,
+# estimated - до settings.TOTAL_COUNT_LIMIT (дальше total - нижняя граница; только по запросу клиента)
+TotalMode = Literal["off", "exact", "estimated"]
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Кодирует значения колонок сортировки последней строки страницы в непрозрачный курсор.
+    
+    Args:
+        values: Значения (JSON-совместимые)
+    
+    Returns:
+        Курсор (base64url без выравнивания)
+    """
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Обратное к encode_cursor.
+    
+    Args:
+        cursor: Курсор из ответа API
+    
+    Returns:
+        Значения колонок сортировки
+    
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list) or not values:
+        raise ValueError("Некорректный курсор")
+    return values
+
+
+async def count_rows(session: AsyncSession, stmt, limit: Optional[int] = None) -> int:
+    """
+    Считает строки запроса; с limit - не больше limit строк (запрос останавливается раньше).
+    
+    Args:
+        session: Сессия БД
+        stmt: SELECT (лучше с одной колонкой - идентификатором)
+        limit: Верхняя граница подсчета
+    
+    Returns:
+        Число строк (не больше limit)
+    """
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    result = await session.execute(select(func.count()).select_from(stmt.subquery()))
+    return result.scalar() or 0
+
+
+class TotalCountCache:
+    """
+    Кэш посчитанных total по запросам (LRU с временем жизни).
+    
+    Значения сгруппированы по области ("ste", "aggregations"), чтобы изменения
+    данных сбрасывали только свою область.
+    """
+    
+    def __init__(self, ttl: Optional[float] = None, max_size: Optional[int] = None):
+        """
+        Инициализация кэша.
+        
+        Args:
+            ttl: Время жизни значения, секунд (по умолчанию settings.TOTAL_CACHE_TTL)
+            max_size: Максимум значений (по умолчанию settings.TOTAL_CACHE_SIZE)
+        """
+        self.ttl = settings.TOTAL_CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.TOTAL_CACHE_SIZE if max_size is None else max_size
+        self._values: "OrderedDict[Tuple[str, Hashable], Tuple[float, int, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, scope: str, key: Hashable) -> Optional[Tuple[int, bool]]:
+        """
+        Значение из кэша.
+        
+        Returns:
+            Кортеж (total, exact) или None
+        """
+        with self._lock:
+            entry = self._values.get((scope, key))
+            if entry is None:
+                return None
+            stored_at, total, exact = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._values[(scope, key)]
+                return None
+            self._values.move_to_end((scope, key))
+            return total, exact
+    
+    def set(self, scope: str, key: Hashable, total: int, exact: bool) -> None:
+        """Сохраняет total для запроса"""
+        with self._lock:
+            self._values[(scope, key)] = (time.monotonic(), total, exact)
+            self._values.move_to_end((scope, key))
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+    
+    def invalidate(self, scope: Optional[str] = None) -> None:
+        """
+        Сбрасывает значения области (или все).
+        
+        Args:
+            scope: Область; None - весь кэш
+        """
+        with self._lock:
+            if scope is None:
+                self._values.clear()
+                return
+            for cache_key in [cache_key for cache_key in self._values if cache_key[0] == scope]:
+                del self._values[cache_key]
+    
+    async def resolve(
+        self,
+        session: AsyncSession,
+        scope: str,
+        key: Hashable,
+        stmt,
+        mode: TotalMode
+    ) -> Tuple[Optional[int], bool]:
+        """
+        total для запроса в заданном режиме: из кэша или подсчетом.
+        
+        Args:
+            session: Сессия БД
+            scope: Область кэша
+            key: Ключ запроса (параметры фильтрации)
+            stmt: SELECT идентификаторов без сортировки и пагинации
+            mode: Режим подсчета
+        
+        Returns:
+            Кортеж (total или None для off, точное ли значение)
+        """
+        if mode == "off":
+            return None, False
+        
+        cached = self.get(scope, (key, mode))
+        if cached is not None:
+            return cached
+        
+        if mode == "exact":
+            total, exact = await count_rows(session, stmt), True
+        else:
+            limit = settings.TOTAL_COUNT_LIMIT
+            total = await count_rows(session, stmt, limit=limit + 1)
+            total, exact = min(total, limit), total <= limit
+        
+        self.set(scope, (key, mode), total, exact)
+        return total, exact
+
+
+# Глобальный кэш total
+total_count_cache = TotalCountCache()
+
+
+def get_total_count_cache() -> TotalCountCache:
+    """Получить кэш total процесса"""
+    return total_count_cache
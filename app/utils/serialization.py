@@ -0,0 +1,111 @@
+"""
+Быстрая сериализация ответов: словари строятся прямо из ORM-объектов и пишутся через orjson
+"""
+from typing import Any, Dict, Iterable, Optional
+from fastapi import Response
+from pydantic import BaseModel
+from app.models.schemas import STEResponse, AggregationBase
+import orjson
+
+
+# Поля ответов берутся из схем, чтобы быстрый путь отдавал те же ключи, что и response_model
+STE_RESPONSE_FIELDS = tuple(STEResponse.model_fields)
+AGGREGATION_FIELDS = tuple(AggregationBase.model_fields)
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые orjson не сериализует сам (модели pydantic)"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Сериализует ответ в JSON (UTF-8).
+    
+    Args:
+        content: Словари, списки, модели pydantic, datetime, numpy
+    
+    Returns:
+        Тело ответа
+    """
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    JSON-ответ без повторной валидации через response_model.
+    
+    Args:
+        content: Содержимое ответа
+        status_code: HTTP-статус
+        headers: Дополнительные заголовки
+    
+    Returns:
+        Ответ FastAPI
+    """
+    return Response(content=dumps(content), status_code=status_code, media_type="application/json", headers=headers)
+
+
+def _fields_to_dict(obj: Any, fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Значения полей объекта. Загруженные атрибуты ORM-объекта читаются из __dict__
+    (в обход дескрипторов SQLAlchemy), остальные - через getattr.
+    """
+    state = obj.__dict__
+    return {field: state[field] if field in state else getattr(obj, field) for field in fields}
+
+
+def ste_to_dict(ste: Any) -> Dict[str, Any]:
+    """
+    СТЕ в виде словаря STEResponse (без валидации).
+    
+    Args:
+        ste: ORM-объект STE (или объект с теми же атрибутами)
+    
+    Returns:
+        Словарь полей ответа
+    """
+    return _fields_to_dict(ste, STE_RESPONSE_FIELDS)
+
+
+def aggregation_items_to_list(items: Iterable[Any]) -> list:
+    """
+    Элементы агрегации в виде списка AggregationItemResponse, упорядоченные по order.
+    
+    Args:
+        items: ORM-объекты AggregationItem с загруженной ste
+    
+    Returns:
+        Список словарей элементов
+    """
+    return [
+        {
+            "id": item.id,
+            "ste": ste_to_dict(item.ste),
+            "order": item.order,
+            "created_at": item.created_at,
+        }
+        for item in sorted(items, key=lambda x: x.order)
+    ]
+
+
+def aggregation_to_dict(aggregation: Any, with_items_count: bool = True) -> Dict[str, Any]:
+    """
+    Агрегация с элементами в виде словаря AggregationResponse (или AggregationDetailResponse).
+    
+    Args:
+        aggregation: ORM-объект Aggregation с загруженными items
+        with_items_count: Добавить items_count (AggregationResponse)
+    
+    Returns:
+        Словарь полей ответа
+    """
+    data = _fields_to_dict(aggregation, AGGREGATION_FIELDS)
+    data["items"] = aggregation_items_to_list(aggregation.items)
+    if with_items_count:
+        data["items_count"] = len(data["items"])
+    return data
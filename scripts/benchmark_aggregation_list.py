@@ -0,0 +1,109 @@
+"""
+Бенчмарк списка агрегаций (GET /api/v1/grouping/aggregations): view=full против view=summary
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+DEFAULT_FILE = Path(__file__).parent.parent / "data" / "Исходные данные_Хакатон_Казань_20251128_1800.xlsx"
+
+
+def build_database(db_path: str, source_file: Path, n_aggregations: int, group_size: int, seed: int = 42) -> None:
+    """
+    Импортирует СТЕ из файла в БД приложения и создает агрегации из случайных СТЕ одной категории.
+    Заполненная БД используется как есть.
+    """
+    import asyncio
+    from app.database.base import init_db, AsyncSessionLocal
+    from app.models import database  # noqa: F401 - регистрирует модели для init_db
+    from app.parsers.excel_parser import parse_ste_file
+    from app.services.import_service import STEImportService
+    
+    asyncio.run(init_db())
+    
+    connection = sqlite3.connect(db_path)
+    if connection.execute("SELECT count(*) FROM aggregations").fetchone()[0]:
+        connection.close()
+        print("В БД уже есть агрегации - данные не пересоздаются")
+        return
+    
+    async def import_stes():
+        async with AsyncSessionLocal() as session:
+            await STEImportService().import_stes(session, parse_ste_file(str(source_file)))
+    
+    asyncio.run(import_stes())
+    
+    rng = random.Random(seed)
+    by_category = {}
+    for ste_id, category_id in connection.execute("SELECT id, category_id FROM ste"):
+        by_category.setdefault(category_id, []).append(ste_id)
+    categories = [category_id for category_id, ids in by_category.items() if len(ids) >= group_size]
+    
+    for n in range(n_aggregations):
+        category_id = rng.choice(categories)
+        cursor = connection.execute(
+            "INSERT INTO aggregations (name, category_id, grouping_characteristics, status, is_saved, created_at) "
+            "VALUES (?, ?, ?, 'auto', 0, CURRENT_TIMESTAMP)",
+            (f"Агрегация {n}", category_id, '{"Цвет": "синий", "Размер": "XL"}')
+        )
+        connection.executemany(
+            "INSERT INTO aggregation_items (aggregation_id, ste_id, \"order\", created_at) "
+            "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            [(cursor.lastrowid, ste_id, order)
+             for order, ste_id in enumerate(rng.sample(by_category[category_id], group_size))]
+        )
+    connection.commit()
+    connection.close()
+    print(f"Создано {n_aggregations} агрегаций по {group_size} СТЕ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--aggregations", type=int, default=1000)
+    parser.add_argument("--group-size", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=500, help="Размер страницы списка")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE)
+    parser.add_argument("--db", default=None,
+                        help="Путь к БД (по умолчанию временный файл); заполненная БД используется как есть")
+    args = parser.parse_args()
+    
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "aggregation_benchmark.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ["PRELOAD_EMBEDDING_MODEL"] = "false"
+    
+    build_database(db_path, args.file, args.aggregations, args.group_size)
+    
+    from fastapi.testclient import TestClient
+    from app.main import app
+    
+    with TestClient(app) as client:
+        results = {}
+        for view in ("full", "summary"):
+            params = {"view": view, "limit": args.limit}
+            client.get("/api/v1/grouping/aggregations", params=params)
+            latencies = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get("/api/v1/grouping/aggregations", params=params)
+                latencies.append(time.perf_counter() - started)
+            results[view] = (statistics.median(latencies), len(response.content))
+    
+    print(f"{'view':>8} {'latency, ms':>12} {'payload, KB':>12}")
+    for view, (latency, size) in results.items():
+        print(f"{view:>8} {latency * 1000:12.1f} {size / 1024:12.1f}")
+    full, summary = results["full"], results["summary"]
+    print(f"summary: быстрее в {full[0] / summary[0]:.1f} раза, меньше в {full[1] / summary[1]:.1f} раза")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк загрузки СТЕ для группировки: select(STE) всего каталога, CatalogRow по категориям из БД
+и CatalogRow из колоночного снимка каталога
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", required=True, help="БД с импортированными СТЕ")
+    parser.add_argument("--batch-size", type=int, default=None, help="Строк в порции yield_per")
+    parser.add_argument("--snapshot-dir", default=None,
+                        help="Каталог снимка каталога (по умолчанию - временный, собирается заново)")
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+    snapshot_dir = args.snapshot_dir or tempfile.mkdtemp(prefix="catalog_snapshot_")
+    
+    from sqlalchemy import select
+    from app.database.base import AsyncSessionLocal
+    from app.models.database import STE
+    from app.services.catalog_loader import count_category_rows, load_category_rows
+    from app.services.catalog_snapshot import CatalogSnapshotStore
+    
+    store = CatalogSnapshotStore(snapshot_dir, enabled=True)
+    
+    async def load_orm():
+        """Исходный путь: все СТЕ каталога ORM-объектами, затем разбивка по категориям"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(STE))
+            categories = {}
+            for ste in result.scalars().all():
+                categories.setdefault(ste.category_id or "unknown", []).append(ste)
+            return sum(len(stes) for stes in categories.values())
+    
+    async def load_lean():
+        """Новый путь: размеры категорий, затем CatalogRow одной категории за раз"""
+        async with AsyncSessionLocal() as session:
+            total = 0
+            for cat_id in await count_category_rows(session):
+                total += len(await load_category_rows(session, cat_id, batch_size=args.batch_size))
+            return total
+    
+    async def load_snapshot():
+        """Снимок: размеры категорий и CatalogRow из массивов mmap (БД - только отпечаток таблицы)"""
+        async with AsyncSessionLocal() as session:
+            snapshot = await store.get_fresh(session)
+            total = 0
+            for cat_id in snapshot.category_sizes():
+                total += len(snapshot.category_rows(cat_id))
+            return total
+    
+    async def build_snapshot():
+        async with AsyncSessionLocal() as session:
+            if await store.get_fresh(session) is None:
+                await store.build(session)
+    
+    started = time.perf_counter()
+    asyncio.run(build_snapshot())
+    print(f"Снимок: {snapshot_dir} ({time.perf_counter() - started:.2f} с)")
+    
+    # Страницы mmap не учитываются tracemalloc: для снимка пик - декодированные строки и словари
+    print(f"{'loading':>8} {'rows':>8} {'time, s':>8} {'peak, MB':>9}")
+    for label, load in (("orm", load_orm), ("lean", load_lean), ("snapshot", load_snapshot)):
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = asyncio.run(load())
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:>8} {rows:>8} {elapsed:8.2f} {peak / 1024 / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Бенчмарк группировки по точному совпадению: строковые ключи на каждую СТЕ против кодов значений
+(из словарей характеристик и уже закодированных - как в снимке каталога)
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def group_by_string_keys(service, stes, significant_chars):
+    """Исходная группировка: ключ _extract_grouping_key для каждой СТЕ"""
+    groups = defaultdict(list)
+    for ste in stes:
+        groups[service._extract_grouping_key(ste, significant_chars)].append(ste)
+    return dict(groups)
+
+
+def group_signature(groups):
+    """Группы в сравнимом виде: ключ и ID СТЕ в порядке групп"""
+    return [(key, [ste.id for ste in stes]) for key, stes in groups.items()]
+
+
+def edge_case_rows(row_type):
+    """СТЕ, на которых коды и строковые ключи легко разойтись"""
+    rows = [
+        # Разные сочетания значений, дающие одну строку ключа
+        ({"a": "x;b=y"}, "M", None, "Товар один"),
+        ({"a": "x", "b": "y"}, "M", None, "Товар один"),
+        # Число и строка с одинаковой записью
+        ({"a": 1, "b": "2"}, None, None, None),
+        ({"a": "1", "b": 2}, None, None, None),
+        # Пустые и ложные значения не входят в ключ
+        ({"a": "", "b": 0, "c": []}, "", "", "   "),
+        ({"a": None}, None, None, ""),
+        (None, None, None, "Очень длинное название товара"),
+        ("не словарь", "Производитель", "Модель", "Название"),
+        ({}, "Производитель", None, "Короткое"),
+        ({"a": "x"}, None, "Модель", "Название товара с моделью"),
+        ({"a": ["список"], "b": {"вложенный": 1}}, None, None, None),
+    ]
+    return _rows(row_type, rows)
+
+
+def list_value_rows(row_type):
+    """СТЕ, у которых все значения характеристик - списки и словари (JSON-значения снимка)"""
+    rows = [
+        # Списки одной длины не должны превращаться в двумерный массив
+        ({"a": [1, 2], "b": [3, 4]}, None, None, "Товар"),
+        ({"a": [3, 4], "b": [1, 2]}, None, None, "Товар"),
+        ({"a": [1, 2], "b": [3, 4]}, None, None, "Другой товар"),
+        # Пустые списки и словари не входят в ключ
+        ({"a": [], "b": {}}, "M", None, "Товар"),
+        ({"a": []}, "M", None, "Товар"),
+        ({"a": {"k": 1}, "b": {"k": 2}}, None, None, None),
+        ({"a": {"k": 1}, "b": [[1, 2], [3, 4]]}, None, None, None),
+    ]
+    return _rows(row_type, rows)
+
+
+def _rows(row_type, rows):
+    """СТЕ одной категории из кортежей (характеристики, производитель, модель, название)"""
+    return [
+        row_type(index, name, manufacturer, model, "cat", "Категория", characteristics)
+        for index, (characteristics, manufacturer, model, name) in enumerate(rows, start=1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", required=True, help="БД с импортированными СТЕ и значимыми характеристиками")
+    parser.add_argument("--scale", type=int, default=10,
+                        help="Во сколько раз размножить СТЕ каждой категории (перемешанные копии)")
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+    
+    from sqlalchemy import select
+    from app.database.base import AsyncSessionLocal
+    from app.models.database import Category
+    from app.services.catalog_loader import CatalogRow, count_category_rows, load_category_rows
+    from app.services.catalog_snapshot import CatalogSnapshotStore
+    from app.services.exact_match import characteristic_pairs, group_by_exact_match
+    from app.services.grouping_service import GroupingService
+    
+    service = GroupingService()
+    store = CatalogSnapshotStore(tempfile.mkdtemp(prefix="catalog_snapshot_"), enabled=True)
+    
+    for edge_rows in (edge_case_rows(CatalogRow), list_value_rows(CatalogRow)):
+        for significant_chars in ([], ["a"], ["a", "b"], ["b", "a", "c"], ["a", "a"]):
+            expected = group_signature(group_by_string_keys(service, edge_rows, significant_chars))
+            actual = group_signature(group_by_exact_match(edge_rows, significant_chars))
+            assert actual == expected, (significant_chars, expected, actual)
+    print("Граничные случаи: группы совпадают")
+    
+    async def load_categories():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Category.category_id, Category.significant_characteristics))
+            significant = {cat_id: chars or [] for cat_id, chars in result.all()}
+            snapshot = await store.build(session)
+            return snapshot, [
+                (cat_id, await load_category_rows(session, cat_id), significant.get(cat_id, []))
+                for cat_id in await count_category_rows(session)
+            ]
+    
+    snapshot, loaded = asyncio.run(load_categories())
+    categories = [(stes, chars) for _, stes, chars in loaded]
+    
+    # Коды снимка дают те же группы, что и словари характеристик
+    for cat_id, stes, chars in loaded:
+        expected = group_signature(group_by_string_keys(service, stes, chars))
+        actual = group_signature(group_by_exact_match(stes, chars, snapshot.characteristic_pairs(cat_id)))
+        assert actual == expected, cat_id
+    print(f"Снимок каталога: группы совпадают в {len(loaded)} категориях")
+    rng = random.Random(0)
+    scaled = []
+    for stes, significant_chars in categories:
+        copies = [ste._replace(id=ste.id + copy * 10_000_000) for copy in range(args.scale) for ste in stes]
+        rng.shuffle(copies)
+        scaled.append((copies, significant_chars))
+    
+    # coded - характеристики уже в кодах (как из снимка), время кодирования не входит
+    print(
+        f"{'data':>8} {'rows':>9} {'string, s':>10} {'codes, s':>9} {'speedup':>8} "
+        f"{'coded, s':>9} {'speedup':>8} {'groups':>7} {'same':>5}"
+    )
+    for label, data in (("catalog", categories), (f"x{args.scale}", scaled)):
+        rows = sum(len(stes) for stes, _ in data)
+        
+        started = time.perf_counter()
+        expected = [group_by_string_keys(service, stes, chars) for stes, chars in data]
+        string_time = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        actual = [group_by_exact_match(stes, chars) for stes, chars in data]
+        codes_time = time.perf_counter() - started
+        
+        pairs = [characteristic_pairs(stes) for stes, _ in data]
+        started = time.perf_counter()
+        coded = [group_by_exact_match(stes, chars, pair) for (stes, chars), pair in zip(data, pairs)]
+        coded_time = time.perf_counter() - started
+        
+        same = all(
+            group_signature(a) == group_signature(e) == group_signature(c)
+            for a, e, c in zip(actual, expected, coded)
+        )
+        groups = sum(len(category_groups) for category_groups in actual)
+        print(
+            f"{label:>8} {rows:>9} {string_time:10.2f} {codes_time:9.2f} {string_time / codes_time:7.1f}x "
+            f"{coded_time:9.2f} {string_time / coded_time:7.1f}x {groups:>7} {'yes' if same else 'NO':>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Бенчмарк объединения похожих групп: попарный проход против батчевого
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.services.grouping_service import GroupingService
+from app.services.embedding_cache import EmbeddingCache
+
+
+WORDS = [
+    "шина", "куртка", "сорочка", "перчатки", "бумага", "картридж", "кабель",
+    "лампа", "фильтр", "насос", "клапан", "муфта", "болт", "гайка", "шуруп",
+    "краска", "эмаль", "грунтовка", "ткань", "костюм", "брюки", "ботинки",
+    "мужской", "женский", "синий", "черный", "белый", "оранжевый", "зимний",
+    "летний", "стальной", "медный", "пластиковый", "бескамерная", "усиленный",
+]
+
+
+class HashingEncoder:
+    """Детерминированный энкодер без нейросети (для прогона без модели)"""
+
+    def __init__(self, dim: int = 384):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.vectorizer = HashingVectorizer(
+            analyzer="char_wb",
+            ngram_range=(3, 3),
+            n_features=dim,
+            alternate_sign=False
+        )
+
+    def encode(self, texts, **kwargs):
+        return self.vectorizer.transform(texts).toarray().astype(np.float32)
+
+
+def make_groups(n_groups: int, seed: int = 42):
+    """Генерирует синтетические группы СТЕ"""
+    rng = random.Random(seed)
+    groups = {}
+    ste_id = 0
+    for g in range(n_groups):
+        base = rng.sample(WORDS, 3)
+        group = []
+        for _ in range(rng.randint(1, 4)):
+            words = base + rng.sample(WORDS, rng.randint(0, 2))
+            group.append(SimpleNamespace(id=ste_id, name=" ".join(words)))
+            ste_id += 1
+        groups[f"group_{g}"] = group
+    return groups
+
+
+def merge_pairwise(service: GroupingService, groups, similarity_threshold: float):
+    """Исходный жадный попарный проход (по одному encode на пару)"""
+    group_keys = list(groups.keys())
+    merged = {}
+    used_keys = set()
+
+    for i, key1 in enumerate(group_keys):
+        if key1 in used_keys:
+            continue
+
+        merged_group = groups[key1].copy()
+        for j, key2 in enumerate(group_keys):
+            if i >= j or key2 in used_keys:
+                continue
+
+            avg_name1 = " ".join([ste.name for ste in groups[key1]][:3])
+            avg_name2 = " ".join([ste.name for ste in groups[key2]][:3])
+
+            if service._calculate_similarity(avg_name1, avg_name2) >= similarity_threshold:
+                merged_group.extend(groups[key2])
+                used_keys.add(key2)
+
+        merged[key1] = merged_group
+        used_keys.add(key1)
+
+    return merged
+
+
+def absorbed_indices(groups, merged):
+    """Переводит результат объединения в {индекс группы: [индексы поглощенных групп]}"""
+    owner = {}
+    for i, members in enumerate(groups.values()):
+        for ste in members:
+            owner[ste.id] = i
+    result = {}
+    for members in merged.values():
+        head = owner[members[0].id]
+        result[head] = sorted({owner[ste.id] for ste in members} - {head})
+    return result
+
+
+def count_comparisons(n_groups: int, absorbed) -> int:
+    """Число сравнений, которое сделал бы попарный проход при тех же решениях"""
+    used = np.zeros(n_groups, dtype=bool)
+    comparisons = 0
+    for i in range(n_groups):
+        if used[i]:
+            continue
+        comparisons += (n_groups - i - 1) - int(np.count_nonzero(used[i + 1:]))
+        used[i] = True
+        used[absorbed.get(i, [])] = True
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--threshold", type=float, default=settings.SIMILARITY_THRESHOLD)
+    parser.add_argument(
+        "--pairwise-limit", type=int, default=1000,
+        help="Максимальное число групп, для которого попарный проход выполняется целиком; "
+             "для больших размеров время оценивается по замеру на выборке пар"
+    )
+    parser.add_argument("--sample-pairs", type=int, default=2000)
+    parser.add_argument("--hashing-encoder", action="store_true",
+                        help="Использовать хеширующий энкодер вместо модели")
+    parser.add_argument("--ann", action="store_true",
+                        help="Дополнительно замерить объединение через kNN-граф (merge_mode=ann)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Дополнительно проверить, что с кэшем embeddings (запись и чтение) решения те же")
+    args = parser.parse_args()
+
+    # Кэш отключен, чтобы замерять кодирование, а не чтение из кэша
+    service = GroupingService(embedding_cache=EmbeddingCache(enabled=False))
+    if args.hashing_encoder:
+        service.embedding_model = HashingEncoder()
+
+    print(f"{'groups':>8} {'pairwise, s':>14} {'batched, s':>12} {'speedup':>9} {'same':>6}")
+    for n_groups in args.sizes:
+        groups = make_groups(n_groups)
+        keys = list(groups.keys())
+
+        started = time.perf_counter()
+        batched = service._merge_similar_groups(groups, args.threshold)
+        batched_time = time.perf_counter() - started
+
+        if n_groups <= args.pairwise_limit:
+            started = time.perf_counter()
+            pairwise = merge_pairwise(service, groups, args.threshold)
+            pairwise_time = time.perf_counter() - started
+            same = absorbed_indices(groups, pairwise) == absorbed_indices(groups, batched)
+            pairwise_label = f"{pairwise_time:14.2f}"
+            same_label = "yes" if same else "NO"
+        else:
+            texts = [" ".join(ste.name for ste in groups[key][:3]) for key in keys]
+            rng = random.Random(0)
+            started = time.perf_counter()
+            for _ in range(args.sample_pairs):
+                service._calculate_similarity(rng.choice(texts), rng.choice(texts))
+            per_pair = (time.perf_counter() - started) / args.sample_pairs
+            pairwise_time = per_pair * count_comparisons(
+                n_groups, absorbed_indices(groups, batched)
+            )
+            pairwise_label = f"~{pairwise_time:13.2f}"
+            same_label = "n/a"
+
+        print(
+            f"{n_groups:>8} {pairwise_label} {batched_time:12.2f} "
+            f"{pairwise_time / batched_time:8.1f}x {same_label:>6}"
+        )
+        
+        if args.cache:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cached_service = GroupingService(
+                    embedding_cache=EmbeddingCache(path=str(Path(cache_dir) / "cache.db"), enabled=True)
+                )
+                cached_service.embedding_model = service.embedding_model
+                batched_heads = absorbed_indices(groups, batched)
+                same = [
+                    absorbed_indices(groups, cached_service._merge_similar_groups(groups, args.threshold))
+                    == batched_heads
+                    for _ in range(2)
+                ]
+            print(
+                f"{'':>8} cache: промахи - {'yes' if same[0] else 'NO'}, "
+                f"чтение из кэша - {'yes' if same[1] else 'NO'}"
+            )
+        
+        if args.ann:
+            started = time.perf_counter()
+            ann = service._merge_similar_groups_ann(groups, args.threshold, settings.MAX_GROUP_SIZE)
+            print(
+                f"{'':>8} ann: {time.perf_counter() - started:.2f} s, "
+                f"групп после объединения: {len(ann)} (жадный проход: {len(batched)})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Бенчмарк бэкендов модели embeddings на CPU: PyTorch против ONNX (float32 и int8) -
+время импорта, скорость кодирования названий каталога и отклонение векторов от PyTorch
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def import_time(statement: str) -> float:
+    """Время импорта в чистом процессе"""
+    code = f"import time; started = time.perf_counter(); {statement}; print(time.perf_counter() - started)"
+    return float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+
+
+def normalize(vectors):
+    """Векторы единичной длины"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", required=True, help="БД с импортированными СТЕ (кодируются их названия)")
+    parser.add_argument("--model", default=None, help="Модель sentence-transformers (по умолчанию EMBEDDING_MODEL)")
+    parser.add_argument("--limit", type=int, default=5000, help="Число уникальных названий")
+    parser.add_argument("--batch-size", type=int, default=None, help="Размер батча (по умолчанию EMBEDDING_BATCH_SIZE)")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="Числа потоков инференса (по умолчанию 1 и число ядер)")
+    parser.add_argument("--onnx-dir", default=None,
+                        help="Каталог экспорта ONNX (по умолчанию - временный, модель экспортируется заново)")
+    parser.add_argument("--pairs", type=int, default=200_000, help="Случайных пар для сравнения решений по порогу")
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+    
+    from sqlalchemy import select
+    from app.config import settings
+    from app.database.base import AsyncSessionLocal
+    from app.models.database import STE
+    from app.services.onnx_embedding import OnnxEmbeddingModel, export_onnx_model, model_directory
+    
+    model_name = args.model or settings.EMBEDDING_MODEL
+    batch_size = args.batch_size or settings.EMBEDDING_BATCH_SIZE
+    thread_counts = args.threads or sorted({1, os.cpu_count() or 1})
+    onnx_dir = args.onnx_dir or tempfile.mkdtemp(prefix="onnx_models_")
+    
+    async def load_names():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(STE.name).where(STE.name.is_not(None)).distinct().order_by(STE.name).limit(args.limit)
+            )
+            return [name for name in result.scalars().all() if name]
+    
+    texts = asyncio.run(load_names())
+    print(f"Названий: {len(texts)}, модель: {model_name}, батч: {batch_size}, CPU: {os.cpu_count()}")
+    print(
+        f"Импорт: sentence-transformers {import_time('import sentence_transformers'):.2f} с, "
+        f"onnxruntime + tokenizers {import_time('import onnxruntime, tokenizers'):.2f} с"
+    )
+    
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    directory = model_directory(onnx_dir, model_name)
+    started = time.perf_counter()
+    export_onnx_model(model_name, directory, quantize=True)
+    print(f"Экспорт в ONNX и квантование: {time.perf_counter() - started:.2f} с ({directory})")
+    
+    torch_model = SentenceTransformer(model_name, device="cpu")
+    backends = [("torch", None)] + [(f"onnx-{kind}", kind == "int8") for kind in ("fp32", "int8")]
+    
+    rng = np.random.default_rng(0)
+    left = rng.integers(0, len(texts), args.pairs)
+    right = rng.integers(0, len(texts), args.pairs)
+    
+    # drift - косинус между вектором бэкенда и вектором PyTorch того же текста;
+    # flips - доля случайных пар, для которых решение "схожесть >= SIMILARITY_THRESHOLD" другое, чем у PyTorch
+    print(
+        f"{'backend':>10} {'threads':>8} {'size, MB':>9} {'time, s':>8} {'texts/s':>8} {'speedup':>8} "
+        f"{'mean cos':>9} {'min cos':>8} {'flips':>7}"
+    )
+    reference = None
+    for label, quantized in backends:
+        if quantized is None:
+            model = torch_model
+            size = sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024)
+        else:
+            model = OnnxEmbeddingModel(directory, quantized=quantized, inter_op_threads=1)
+            size = model.model_size_mb
+        
+        for threads in thread_counts:
+            if quantized is None:
+                torch.set_num_threads(threads)
+            else:
+                model.set_num_threads(threads)
+            model.encode(texts[:batch_size], batch_size=batch_size)
+            
+            started = time.perf_counter()
+            vectors = normalize(np.asarray(
+                model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+                dtype=np.float32
+            ))
+            elapsed = time.perf_counter() - started
+            if reference is None:
+                reference = (elapsed, vectors, np.einsum("ij,ij->i", vectors[left], vectors[right]))
+            
+            drift = np.einsum("ij,ij->i", vectors, reference[1])
+            pair_cos = np.einsum("ij,ij->i", vectors[left], vectors[right])
+            flips = np.mean(
+                (pair_cos >= settings.SIMILARITY_THRESHOLD) != (reference[2] >= settings.SIMILARITY_THRESHOLD)
+            )
+            print(
+                f"{label:>10} {threads:>8} {size:9.1f} {elapsed:8.2f} {len(texts) / elapsed:8.0f} "
+                f"{reference[0] / elapsed:7.1f}x {drift.mean():9.5f} {drift.min():8.5f} {flips:7.2%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Бенчмарк параллельной группировки по категориям: время и совпадение групп при разном числе процессов
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def group_signature(groups):
+    """Группы в сравнимом виде: категория, ключ и ID СТЕ"""
+    return [(group["category_id"], group["grouping_key"], [ste.id for ste in group["stes"]]) for group in groups]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", required=True, help="БД с импортированными СТЕ (значимые характеристики будут дописаны)")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--category-id", default=None, help="Группировать одну категорию (по умолчанию весь каталог)")
+    parser.add_argument("--merge-mode", choices=["greedy", "ann"], default=None)
+    parser.add_argument("--hashing-encoder", action="store_true",
+                        help="Использовать хеширующий энкодер вместо модели")
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+    
+    from app.config import settings
+    from app.database.base import AsyncSessionLocal
+    from app.services.embedding_cache import EmbeddingCache
+    from app.services.grouping_service import GroupingService
+    from app.services.model_registry import model_registry
+    from benchmark_merge import HashingEncoder
+    
+    if args.hashing_encoder:
+        # Процессы-воркеры наследуют энкодер при fork
+        model_registry._model = HashingEncoder()
+    
+    async def run(processes: int):
+        # Кэш отключен, чтобы замерять кодирование, а не чтение из кэша
+        service = GroupingService(embedding_cache=EmbeddingCache(enabled=False), processes=processes)
+        async with AsyncSessionLocal() as session:
+            started = time.perf_counter()
+            groups = await service.group_stes(
+                session,
+                category_id=args.category_id,
+                similarity_threshold=settings.SIMILARITY_THRESHOLD,
+                min_group_size=settings.MIN_GROUP_SIZE,
+                max_group_size=settings.MAX_GROUP_SIZE,
+                merge_mode=args.merge_mode
+            )
+            return time.perf_counter() - started, groups
+    
+    # Прогрев: значимые характеристики категорий считаются и сохраняются при первом прогоне
+    asyncio.run(run(1))
+    
+    print(f"CPU: {os.cpu_count()}")
+    print(f"{'processes':>10} {'time, s':>9} {'speedup':>8} {'groups':>7} {'same':>5}")
+    baseline = None
+    for processes in args.processes:
+        elapsed, groups = asyncio.run(run(processes))
+        signature = group_signature(groups)
+        if baseline is None:
+            baseline = (elapsed, signature)
+        same = "yes" if signature == baseline[1] else "NO"
+        print(f"{processes:>10} {elapsed:9.2f} {baseline[0] / elapsed:7.1f}x {len(groups):>7} {same:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Бенчмарк поиска СТЕ (GET /api/v1/ste/) на синтетическом каталоге
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+DEFAULT_FILE = Path(__file__).parent.parent / "data" / "Исходные данные_Хакатон_Казань_20251128_1800.xlsx"
+
+
+def build_catalog(db_path: str, n_rows: int, source_file: Path, seed: int = 42) -> list:
+    """
+    Создает БД приложения и заполняет ее синтетическими СТЕ на основе названий из файла
+    (к названию добавляется случайный артикул, чтобы строки различались).
+    
+    Returns:
+        Список названий, из которых генерировались СТЕ
+    """
+    import asyncio
+    from app.database.base import init_db
+    from app.models import database  # noqa: F401 - регистрирует модели для init_db
+    from app.parsers.excel_parser import parse_ste_file
+    
+    asyncio.run(init_db())
+    base = parse_ste_file(str(source_file))
+    
+    connection = sqlite3.connect(db_path)
+    existing = connection.execute("SELECT count(*) FROM ste").fetchone()[0]
+    connection.close()
+    if existing:
+        print(f"В БД уже {existing} СТЕ - каталог не пересоздается")
+        return [ste["name"] for ste in base]
+    
+    rng = random.Random(seed)
+    connection = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    batch = []
+    for i in range(n_rows):
+        ste = base[i % len(base)]
+        article = f"{rng.choice('ABCDEFGHKMPTX')}{rng.randint(100, 99999)}"
+        batch.append((
+            f"syn-{i}", f"{ste['name']} {article}", ste["manufacturer"], article,
+            ste["category_id"], ste["category_name"]
+        ))
+        if len(batch) >= 50_000:
+            connection.executemany(
+                "INSERT INTO ste (ste_id, name, manufacturer, model, category_id, category_name) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            connection.commit()
+            batch = []
+    if batch:
+        connection.executemany(
+            "INSERT INTO ste (ste_id, name, manufacturer, model, category_id, category_name) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            batch
+        )
+        connection.commit()
+    connection.close()
+    print(f"Создано {n_rows} СТЕ за {time.perf_counter() - started:.1f} с (вместе с индексом)")
+    return [ste["name"] for ste in base]
+
+
+def make_queries(names: list, n_queries: int, seed: int = 0) -> list:
+    """Запросы вида: слово, префикс слова, два слова из одного названия"""
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < n_queries:
+        words = [word for word in rng.choice(names).split() if len(word) >= 3 and word.isalpha()]
+        if not words:
+            continue
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(rng.choice(words))
+        elif kind < 0.7:
+            word = rng.choice(words)
+            queries.append(word[:rng.randint(3, max(3, len(word) - 1))])
+        elif len(words) >= 2:
+            queries.append(" ".join(rng.sample(words, 2)))
+    return queries
+
+
+def percentile(values: list, q: float) -> float:
+    """Перцентиль q (0-100)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE)
+    parser.add_argument("--db", default=None,
+                        help="Путь к БД (по умолчанию временный файл); заполненная БД используется как есть")
+    args = parser.parse_args()
+    
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "search_benchmark.db")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ["PRELOAD_EMBEDDING_MODEL"] = "false"
+    
+    names = build_catalog(db_path, args.rows, args.file)
+    queries = make_queries(names, args.queries)
+    
+    from fastapi.testclient import TestClient
+    from app.main import app
+    
+    with TestClient(app) as client:
+        # Прогрев страниц БД
+        for query in queries[:20]:
+            client.get("/api/v1/ste/", params={"query": query})
+        
+        latencies = []
+        totals = []
+        for query in queries:
+            started = time.perf_counter()
+            response = client.get("/api/v1/ste/", params={"query": query, "limit": 20})
+            latencies.append((time.perf_counter() - started) * 1000)
+            totals.append(response.json()["total"])
+    
+    print(f"Запросов: {len(queries)}, найдено СТЕ (медиана): {statistics.median(totals):.0f}")
+    print(
+        f"Задержка, мс: p50 {percentile(latencies, 50):.1f}, p95 {percentile(latencies, 95):.1f}, "
+        f"p99 {percentile(latencies, 99):.1f}, max {max(latencies):.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Бенчмарк сериализации ответа группировки: pydantic + response_model против словарей + orjson
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def legacy_response(aggregations):
+    """Исходный путь: модели на каждую СТЕ, затем валидация и сериализация через response_model"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from app.models.schemas import (
+        GroupingResponse, AggregationResponse, AggregationItemResponse, STEResponse
+    )
+    
+    agg_responses = []
+    total_items = 0
+    for agg in aggregations:
+        items_response = []
+        for item in sorted(agg.items, key=lambda x: x.order):
+            items_response.append(AggregationItemResponse(
+                id=item.id,
+                ste=STEResponse.model_validate(item.ste),
+                order=item.order,
+                created_at=item.created_at
+            ))
+        total_items += len(items_response)
+        agg_responses.append(AggregationResponse(
+            id=agg.id,
+            name=agg.name,
+            category_id=agg.category_id,
+            grouping_characteristics=agg.grouping_characteristics,
+            status=agg.status,
+            rating=agg.rating,
+            is_saved=agg.is_saved,
+            created_at=agg.created_at,
+            updated_at=agg.updated_at,
+            items=items_response,
+            items_count=len(items_response)
+        ))
+    content = GroupingResponse(
+        aggregations=agg_responses,
+        total_groups=len(agg_responses),
+        total_items=total_items
+    )
+    
+    field = create_model_field(name="Response_group_stes", type_=GroupingResponse, mode="serialization")
+    serialized = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(serialized).body
+
+
+def fast_response(aggregations):
+    """Новый путь: словари из ORM-объектов и orjson"""
+    from app.utils.serialization import aggregation_to_dict, dumps
+    
+    agg_responses = [aggregation_to_dict(agg) for agg in aggregations]
+    return dumps({
+        "aggregations": agg_responses,
+        "total_groups": len(agg_responses),
+        "total_items": sum(agg["items_count"] for agg in agg_responses),
+    })
+
+
+def load_aggregations(n_groups: int):
+    """Загружает n_groups агрегаций с СТЕ (как group_stes перед формированием ответа)"""
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app.database.base import AsyncSessionLocal
+    from app.models.database import Aggregation, AggregationItem
+    
+    async def load():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Aggregation)
+                .options(selectinload(Aggregation.items).selectinload(AggregationItem.ste))
+                .order_by(Aggregation.id)
+                .limit(n_groups)
+            )
+            return result.scalars().all()
+    
+    return asyncio.run(load())
+
+
+def measure(function, aggregations, repeat: int) -> float:
+    """Медиана времени, секунд"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(aggregations)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", required=True,
+                        help="БД с агрегациями (например, созданная scripts/benchmark_aggregation_list.py)")
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+    
+    aggregations = load_aggregations(args.groups)
+    n_items = sum(len(agg.items) for agg in aggregations)
+    
+    legacy_body = legacy_response(aggregations)
+    fast_body = fast_response(aggregations)
+    same = json.loads(legacy_body) == json.loads(fast_body)
+    
+    legacy_time = measure(legacy_response, aggregations, args.repeat)
+    fast_time = measure(fast_response, aggregations, args.repeat)
+    
+    print(f"Групп: {len(aggregations)}, СТЕ: {n_items}, ответ {len(fast_body) / 1024:.0f} KB, "
+          f"JSON совпадает: {'да' if same else 'НЕТ'}")
+    print(f"pydantic + response_model: {legacy_time * 1000:.1f} мс")
+    print(f"словари + orjson:          {fast_time * 1000:.1f} мс")
+    print(f"ускорение: {legacy_time / fast_time:.1f}x")
+    
+    sys.exit(0 if same else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Скрипт для расчета векторов СТЕ заранее: названия кодируются батчами в нескольких процессах
+и записываются в хранилище EMBEDDING_STORE_DIR. Группировка читает оттуда векторы групп
+из одной СТЕ по STE.id. Повторный запуск досчитывает прерванную сборку и кодирует только
+новые и измененные СТЕ
+"""
+import argparse
+import os
+import asyncio
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select
+from app.config import settings
+from app.database.base import AsyncSessionLocal
+from app.models.database import STE
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_store import KEY_DTYPE, embedding_store
+from app.services.model_registry import model_registry
+
+
+def init_worker() -> None:
+    """Процесс-воркер кодирует в один поток: параллелизм дают сами процессы"""
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+    model_registry.set_num_threads(1)
+
+
+def encode_texts(texts):
+    """Кодирует тексты моделью реестра (в процессе-воркере или в текущем процессе)"""
+    vectors = model_registry.get_model().encode(
+        texts,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    return np.asarray(vectors, dtype=np.float16)
+
+
+async def load_catalog():
+    """
+    Читает ID и тексты всех СТЕ.
+    
+    Returns:
+        Кортеж (ID СТЕ int64, нормализованные названия)
+    """
+    stmt = select(STE.id, STE.name).order_by(STE.id)
+    stmt = stmt.execution_options(yield_per=settings.GROUPING_LOAD_BATCH_SIZE)
+    ids, texts = [], []
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions():
+            for ste_id, name in partition:
+                ids.append(ste_id)
+                texts.append(EmbeddingCache.normalize_text(name or ""))
+    return np.array(ids, dtype=np.int64), texts
+
+
+def build_embeddings(workers: int, chunk_size: int, rebuild: bool):
+    """
+    Считает векторы СТЕ, которых еще нет в хранилище.
+    
+    Args:
+        workers: Процессов для кодирования (1 - в текущем процессе)
+        chunk_size: Текстов в одной задаче процесса (и между сбросами на диск)
+        rebuild: Пересчитать все векторы
+    """
+    print("Чтение СТЕ...")
+    ste_ids, texts = asyncio.run(load_catalog())
+    print(f"  - СТЕ: {len(ste_ids)}")
+    if not len(ste_ids):
+        return
+    
+    print(f"Загрузка модели {model_registry.model_name} ({model_registry.backend})...")
+    model_registry.load()
+    model_name = model_registry.cache_model_name
+    dimension = encode_texts(["размерность"]).shape[1]
+    
+    keys = np.array(
+        [EmbeddingCache.make_key(text, model_name) if text else b"" for text in texts],
+        dtype=KEY_DTYPE
+    )
+    writer = embedding_store.prepare(model_name, dimension, int(ste_ids.max()) + 1, rebuild=rebuild)
+    
+    pending = np.flatnonzero(writer.pending(ste_ids, keys))
+    print(f"  - Нужно посчитать: {len(pending)} (уже в хранилище: {int(np.count_nonzero(keys != b'')) - len(pending)})")
+    
+    # Одинаковые тексты кодируются один раз; тексты, уже посчитанные для других СТЕ, копируются
+    unique_keys, first, inverse = np.unique(keys[pending], return_index=True, return_inverse=True)
+    known = writer.find(unique_keys)
+    copied = known[inverse] >= 0
+    if copied.any():
+        rows = pending[copied]
+        writer.write(ste_ids[rows], keys[rows], writer.vectors[known[inverse][copied]])
+    
+    to_encode = np.flatnonzero(known < 0)
+    members = [[] for _ in range(len(unique_keys))]
+    for position, unique_index in enumerate(inverse.tolist()):
+        members[unique_index].append(pending[position])
+    print(f"  - Скопировано: {int(copied.sum())}, уникальных текстов для кодирования: {len(to_encode)}")
+    
+    chunks = [to_encode[start:start + chunk_size] for start in range(0, len(to_encode), chunk_size)]
+    chunk_texts = [[texts[pending[first[index]]] for index in chunk.tolist()] for chunk in chunks]
+    
+    def save(chunk, vectors):
+        rows = np.array([row for index in chunk.tolist() for row in members[index]], dtype=np.int64)
+        repeats = [len(members[index]) for index in chunk.tolist()]
+        writer.write(ste_ids[rows], keys[rows], np.repeat(vectors, repeats, axis=0))
+    
+    started = time.perf_counter()
+    done = 0
+    if workers > 1 and len(chunks) > 1:
+        # Модель загружена до fork - воркеры наследуют ее; порядок результатов - порядок задач
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            for chunk, vectors in zip(chunks, pool.map(encode_texts, chunk_texts)):
+                save(chunk, vectors)
+                done += len(chunk)
+                print(f"  - Закодировано {done} из {len(to_encode)} ({time.perf_counter() - started:.1f} с)")
+    else:
+        for chunk, chunk_text in zip(chunks, chunk_texts):
+            save(chunk, encode_texts(chunk_text))
+            done += len(chunk)
+            print(f"  - Закодировано {done} из {len(to_encode)} ({time.perf_counter() - started:.1f} с)")
+    
+    manifest = writer.finalize(ste_ids)
+    print(f"\nХранилище готово: {embedding_store.directory}")
+    print(f"  - Векторов: {manifest['vectors']}, строк: {manifest['rows']}, удалено: {manifest['removed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Процессов для кодирования")
+    parser.add_argument("--chunk-size", type=int, default=4096,
+                        help="Текстов в одной задаче процесса (и между сбросами на диск)")
+    parser.add_argument("--rebuild", action="store_true", help="Пересчитать все векторы")
+    args = parser.parse_args()
+    build_embeddings(args.workers, args.chunk_size, args.rebuild)
@@ -0,0 +1,101 @@
+"""
+Сравнение построчного и колоночного разбора характеристик: результаты и время
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.parsers.excel_parser import ExcelParser
+
+
+DEFAULT_FILE = Path(__file__).parent.parent / "data" / "Исходные данные_Хакатон_Казань_20251128_1800.xlsx"
+
+# Строки, на которых легко разойтись с normalize_text
+EDGE_CASES = [
+    None, "", "   ", "nan", "NULL", 0, 1.5, float("nan"),
+    "Цвет: «синий»; Размер:  XL ;",
+    "Ключ\x00:​значение;Вес: 5\tкг",
+    "a \x00 b: c \x07 d",
+    "без разделителя",
+    "ключ:;:значение;x: y: z",
+    "Ключ1:Значение1, Ключ2:Значение2",
+    "Материал:\n хлопок\r\n;Сезон : лето",
+    ', "\'").replace(: буквально',
+]
+
+
+def load_column(file_path: Path):
+    """Сырые значения колонки характеристик со всех листов"""
+    values = []
+    for sheet_name, df in pd.read_excel(file_path, sheet_name=None, engine="openpyxl").items():
+        df.columns = df.columns.str.strip()
+        for col in df.columns:
+            if ExcelParser.map_column(col) == "characteristics_raw":
+                values.extend(df[col].tolist())
+                break
+    return values
+
+
+def parse_rowwise(values):
+    """Исходный путь: clean_value + parse_characteristics для каждой строки"""
+    raw_values = [ExcelParser.clean_value(value) for value in values]
+    return raw_values, [ExcelParser.parse_characteristics(raw or "") for raw in raw_values]
+
+
+def parse_columnar(values):
+    """Колоночный путь"""
+    raw_values = ExcelParser.clean_value_column(values)
+    return raw_values, ExcelParser.parse_characteristics_column(raw_values)
+
+
+def compare(values, label):
+    """Сравнивает пути (включая порядок ключей) и печатает расхождения"""
+    expected = parse_rowwise(values)
+    actual = parse_columnar(values)
+    mismatches = [
+        i for i in range(len(values))
+        if expected[0][i] != actual[0][i]
+        or list(expected[1][i].items()) != list(actual[1][i].items())
+    ]
+    print(f"{label}: строк {len(values)}, расхождений {len(mismatches)}")
+    for i in mismatches[:5]:
+        print(f"  {values[i]!r}\n    построчно:  {expected[0][i]!r} {expected[1][i]!r}"
+              f"\n    колоночно: {actual[0][i]!r} {actual[1][i]!r}")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE)
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help="Размер выборки для замера (колонка файла повторяется)")
+    args = parser.parse_args()
+
+    ok = compare(EDGE_CASES, "граничные случаи")
+
+    values = load_column(args.file)
+    ok = compare(values, args.file.name) and ok
+
+    sample = (values * (args.rows // max(1, len(values)) + 1))[:args.rows]
+    started = time.perf_counter()
+    parse_rowwise(sample)
+    rowwise_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parse_columnar(sample)
+    columnar_time = time.perf_counter() - started
+
+    print(f"{len(sample)} строк: построчно {rowwise_time:.2f} с, колоночно {columnar_time:.2f} с, "
+          f"ускорение {rowwise_time / columnar_time:.1f}x")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Отчет о согласии движков схожести при объединении групп: модель embeddings (transformer) против
+TF-IDF по символьным n-граммам (tfidf) - время объединения и совпадение получившихся групп
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+def group_labels(merged, ste_ids):
+    """Номер объединенной группы для каждой СТЕ категории (в порядке ste_ids)"""
+    owner = {}
+    for label, members in enumerate(merged.values()):
+        for ste in members:
+            owner[ste.id] = label
+    return np.array([owner[ste_id] for ste_id in ste_ids], dtype=np.int64)
+
+
+def pair_counts(labels_a, labels_b):
+    """Число пар СТЕ в одной группе: в разбиении a, в разбиении b и в обоих"""
+    def pairs(counts):
+        counts = counts.astype(np.int64)
+        return int((counts * (counts - 1) // 2).sum())
+    
+    _, joint = np.unique(np.stack([labels_a, labels_b]), axis=1, return_counts=True)
+    return pairs(np.bincount(labels_a)), pairs(np.bincount(labels_b)), pairs(joint)
+
+
+def identical_groups(merged_a, merged_b):
+    """Число групп разбиения a, которые в точности есть в разбиении b"""
+    groups_b = {frozenset(ste.id for ste in members) for members in merged_b.values()}
+    return sum(frozenset(ste.id for ste in members) in groups_b for members in merged_a.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", required=True, help="БД с импортированными СТЕ и значимыми характеристиками")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Порог схожести модели (по умолчанию SIMILARITY_THRESHOLD)")
+    parser.add_argument("--tfidf-thresholds", type=float, nargs="+", default=None,
+                        help="Пороги TF-IDF (по умолчанию - тот же порог, что у модели)")
+    parser.add_argument("--merge-mode", choices=["greedy", "ann"], default="greedy")
+    parser.add_argument("--top", type=int, default=None, help="Только N самых больших категорий")
+    parser.add_argument("--hashing-encoder", action="store_true",
+                        help="Использовать хеширующий энкодер вместо модели")
+    args = parser.parse_args()
+    
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{args.db}"
+    
+    from sklearn.metrics import adjusted_rand_score
+    from sqlalchemy import select
+    from app.config import settings
+    from app.database.base import AsyncSessionLocal
+    from app.models.database import Category
+    from app.services.catalog_loader import count_category_rows, load_category_rows
+    from app.services.embedding_cache import EmbeddingCache
+    from app.services.grouping_service import GroupingService
+    from app.services.model_registry import model_registry
+    from benchmark_merge import HashingEncoder
+    
+    if args.hashing_encoder:
+        model_registry._model = HashingEncoder()
+    threshold = args.threshold if args.threshold is not None else settings.SIMILARITY_THRESHOLD
+    tfidf_thresholds = args.tfidf_thresholds or [threshold]
+    
+    # Кэш отключен, чтобы замерять кодирование, а не чтение из кэша
+    service = GroupingService(embedding_cache=EmbeddingCache(enabled=False), processes=1)
+    
+    def merge(groups, engine, engine_threshold):
+        if args.merge_mode == "ann":
+            return service._merge_similar_groups_ann(groups, engine_threshold, settings.MAX_GROUP_SIZE, engine)
+        return service._merge_similar_groups(groups, engine_threshold, engine)
+    
+    async def load_categories():
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Category.category_id, Category.significant_characteristics))
+            significant = {cat_id: chars or [] for cat_id, chars in result.all()}
+            sizes = await count_category_rows(session)
+            order = sorted(sizes, key=sizes.get, reverse=True)[:args.top]
+            return [
+                (await load_category_rows(session, cat_id), significant.get(cat_id, []))
+                for cat_id in order
+            ]
+    
+    categories = asyncio.run(load_categories())
+    exact = [service._group_by_exact_match(stes, chars) for stes, chars in categories]
+    ste_ids = [[ste.id for ste in stes] for stes, _ in categories]
+    print(
+        f"Категорий: {len(categories)}, СТЕ: {sum(len(ids) for ids in ste_ids)}, "
+        f"групп точного совпадения: {sum(len(groups) for groups in exact)}, объединение: {args.merge_mode}"
+    )
+    
+    # Прогрев: загрузка модели не входит во время объединения
+    service._encode_texts(["прогрев"])
+    
+    started = time.perf_counter()
+    reference = [merge(groups, "transformer", threshold) for groups in exact]
+    reference_time = time.perf_counter() - started
+    reference_labels = np.concatenate([
+        group_labels(merged, ids) + offset
+        for merged, ids, offset in zip(reference, ste_ids, np.cumsum([0] + [len(ids) for ids in ste_ids]))
+    ])
+    reference_groups = sum(len(merged) for merged in reference)
+    print(f"transformer (порог {threshold}): {reference_time:.2f} с, групп: {reference_groups}")
+    
+    # Пары СТЕ в одной группе: precision - доля пар tfidf, которые есть у модели, recall - наоборот
+    print(
+        f"{'threshold':>10} {'time, s':>8} {'speedup':>8} {'groups':>7} {'ARI':>6} "
+        f"{'precision':>10} {'recall':>7} {'F1':>6} {'same groups':>12}"
+    )
+    for tfidf_threshold in tfidf_thresholds:
+        started = time.perf_counter()
+        candidate = [merge(groups, "tfidf", tfidf_threshold) for groups in exact]
+        elapsed = time.perf_counter() - started
+        labels = np.concatenate([
+            group_labels(merged, ids) + offset
+            for merged, ids, offset in zip(candidate, ste_ids, np.cumsum([0] + [len(ids) for ids in ste_ids]))
+        ])
+        
+        reference_pairs, candidate_pairs, common_pairs = pair_counts(reference_labels, labels)
+        precision = common_pairs / candidate_pairs if candidate_pairs else 1.0
+        recall = common_pairs / reference_pairs if reference_pairs else 1.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        same = sum(identical_groups(a, b) for a, b in zip(reference, candidate))
+        print(
+            f"{tfidf_threshold:>10} {elapsed:8.2f} {reference_time / elapsed:7.1f}x "
+            f"{sum(len(merged) for merged in candidate):>7} {adjusted_rand_score(reference_labels, labels):6.3f} "
+            f"{precision:10.3f} {recall:7.3f} {f1:6.3f} {same / reference_groups:11.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,33 @@
 """
 Скрипт для первичного импорта данных из Excel файла
 """
+import argparse
 import asyncio
+import os
 import sys
 from pathlib import Path
 
 # Добавляем корневую директорию в путь
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from app.config import settings
 from app.database.base import init_db, AsyncSessionLocal
-from app.parsers.excel_parser import parse_ste_file
-from app.models.database import STE, Category
+from app.parsers.excel_parser import ExcelParser, iter_ste_file
+from app.services.catalog_snapshot import catalog_snapshot_store
 from app.services.characteristic_analyzer import CharacteristicAnalyzer
+from app.services.import_service import STEImportService
+from app.services.response_cache import response_cache
+from app.utils.file_lock import FileLock
 
 
-async def import_data():
-    """Импортирует данные из Excel файла"""
+async def import_data(use_cache: bool = True, rebuild_cache: bool = False):
+    """
+    Импортирует данные из Excel файла.
+    
+    Args:
+        use_cache: Использовать кэш разобранного файла
+        rebuild_cache: Разобрать файл заново и перезаписать кэш
+    """
     print("Инициализация базы данных...")
     await init_db()
     
@@ -26,73 +38,45 @@ async def import_data():
         print(f"Ошибка: Файл не найден: {file_path}")
         return
     
-    ste_list = parse_ste_file(str(file_path))
-    print(f"Найдено {len(ste_list)} СТЕ в файле")
+    # Статистика по характеристикам считается на лету - файл читается потоково
+    stats = {"total": 0, "with_chars": 0}
     
-    # Статистика по характеристикам
-    with_chars = sum(1 for ste in ste_list if ste.get('characteristics') and len(ste.get('characteristics', {})) > 0)
-    without_chars = len(ste_list) - with_chars
-    print(f"  - С характеристиками: {with_chars}")
-    print(f"  - Без характеристик: {without_chars}")
+    def counted(ste_stream):
+        for ste in ste_stream:
+            stats["total"] += 1
+            if ste.get('characteristics') and len(ste.get('characteristics', {})) > 0:
+                stats["with_chars"] += 1
+            yield ste
     
     async with AsyncSessionLocal() as session:
-        imported = 0
-        updated = 0
-        errors = []
-        
-        # Создаем уникальный список категорий
-        categories_map = {}
+        # Записываем СТЕ пачками через upsert, отсутствующие категории создаются там же
+        excel_parser = ExcelParser()
+        ste_stream = iter_ste_file(
+            str(file_path), use_cache=use_cache, rebuild_cache=rebuild_cache, parser=excel_parser
+        )
+        report = await STEImportService().import_stes(session, counted(ste_stream))
         
-        for ste_data in ste_list:
-            try:
-                # Добавляем категорию в словарь
-                if ste_data.get("category_id") and ste_data.get("category_name"):
-                    cat_id = ste_data["category_id"]
-                    if cat_id not in categories_map:
-                        categories_map[cat_id] = ste_data["category_name"]
-                
-                # Проверяем, существует ли СТЕ
-                from sqlalchemy import select
-                stmt = select(STE).where(STE.ste_id == ste_data["ste_id"])
-                result = await session.execute(stmt)
-                existing_ste = result.scalar_one_or_none()
-                
-                if existing_ste:
-                    # Обновляем существующую
-                    for key, value in ste_data.items():
-                        if hasattr(existing_ste, key):
-                            setattr(existing_ste, key, value)
-                    updated += 1
-                else:
-                    # Создаем новую
-                    new_ste = STE(**ste_data)
-                    session.add(new_ste)
-                    imported += 1
-            except Exception as e:
-                errors.append(f"Ошибка при импорте СТЕ {ste_data.get('ste_id', 'unknown')}: {str(e)}")
+        if excel_parser.sheet_stats:
+            print(f"Обработано листов: {len(excel_parser.sheet_stats)}")
+            for sheet in excel_parser.sheet_stats:
+                print(f"  - {sheet['sheet']}: строк {sheet['rows']}, СТЕ {sheet['ste']}, {sheet['seconds']:.2f} с")
+        else:
+            print("Файл прочитан из кэша разобранных файлов")
+        print(f"Найдено {stats['total']} СТЕ в файле")
+        print(f"  - С характеристиками: {stats['with_chars']}")
+        print(f"  - Без характеристик: {stats['total'] - stats['with_chars']}")
         
-        # Создаем категории
+        categories_map = report["categories"]
+        affected_categories = report["affected_categories"]
+        errors = report["errors"]
         analyzer = CharacteristicAnalyzer()
-        for cat_id, cat_name in categories_map.items():
-            # Создаем категорию, если её нет
-            from sqlalchemy import select
-            stmt = select(Category).where(Category.category_id == cat_id)
-            result = await session.execute(stmt)
-            category = result.scalar_one_or_none()
-            
-            if not category:
-                category = Category(
-                    category_id=cat_id,
-                    name=cat_name,
-                    significant_characteristics=[]
-                )
-                session.add(category)
-        
-        await session.commit()
         
         print(f"\nИмпорт завершен:")
-        print(f"  - Импортировано: {imported}")
-        print(f"  - Обновлено: {updated}")
+        print(f"  - Импортировано: {report['imported']}")
+        print(f"  - Обновлено: {report['updated']}")
+        print(f"  - Без изменений: {report['unchanged']}")
+        print(f"  - Отсутствуют в файле: {len(report['removed'])}")
+        print(f"  - Затронуто категорий: {len(affected_categories)} из {len(categories_map)}")
         print(f"  - Ошибок: {len(errors)}")
         
         if errors:
@@ -100,18 +84,46 @@ async def import_data():
             for error in errors[:10]:
                 print(f"  - {error}")
         
-        # Анализируем значимые характеристики для категорий
+        # Запущенные воркеры сервиса сбрасывают ответы со СТЕ (через журнал сбросов кэша)
+        response_cache.invalidate("ste")
+        response_cache.invalidate("aggregation")
+        
+        # Снимок каталога для группировки; по нему же считаются значимые характеристики
+        print("\nСборка снимка каталога...")
+        try:
+            snapshot = await catalog_snapshot_store.build(session)
+        except Exception as e:
+            # Импорт выполнен: без снимка группировка и анализ читают СТЕ из БД
+            snapshot = None
+            print(f"  - Ошибка при сборке снимка: {e}")
+        if snapshot is not None:
+            print(f"  - СТЕ: {snapshot.rows}, категорий: {len(snapshot.categories)}")
+        
+        # Пересчитываем значимые характеристики только для категорий с новыми или измененными СТЕ
         print("\nАнализ значимых характеристик...")
-        for cat_id in categories_map.keys():
-            try:
-                await analyzer.get_or_create_category_significant_characteristics(
-                    session, cat_id, categories_map[cat_id]
-                )
+        results = await analyzer.refresh_categories(session, affected_categories, categories_map, snapshot=snapshot)
+        for cat_id, error in results.items():
+            if error:
+                print(f"  - Ошибка при обработке категории {cat_id}: {error}")
+            else:
                 print(f"  - Обработана категория: {categories_map[cat_id]}")
-            except Exception as e:
-                print(f"  - Ошибка при обработке категории {cat_id}: {e}")
 
 
 if __name__ == "__main__":
-    asyncio.run(import_data())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Не использовать кэш разобранного файла")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="Разобрать Excel заново и перезаписать кэш")
+    args = parser.parse_args()
+    
+    # Та же блокировка, что у фонового импорта сервиса: два импорта не пишут в БД одновременно
+    lock = FileLock(settings.IMPORT_LOCK_PATH)
+    if not lock.acquire(blocking=False, owner=f"scripts/import_data.py, pid {os.getpid()}"):
+        print(f"Ошибка: импорт уже выполняется ({lock.owner() or 'в другом процессе'})")
+        sys.exit(1)
+    try:
+        asyncio.run(import_data(use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache))
+    finally:
+        lock.release()
 